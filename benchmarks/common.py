@@ -0,0 +1,94 @@
+import atexit
+import io
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import django
+
+ORDER = {
+    "first_name": "Jane",
+    "last_name": "Doe",
+    "email": "jane@example.com",
+    "primary_phone": "555-555-5555",
+    "address_line_one": "1 Main St",
+    "city": "Springfield",
+    "state_or_region": "IL",
+    "postal_code": "62701",
+    "country": "USA",
+    "print_id": 1,
+    "photo_id": 1,
+}
+# Any well-formed token passes as long as the cookie and header agree.
+CSRF_TOKEN = "a" * 64
+
+
+def setup(settings_module: str) -> None:
+    os.environ["DJANGO_SETTINGS_MODULE"] = settings_module
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    # The migrations seed the sample catalog and print sizes, so a
+    # throwaway test database is enough to serve every endpoint. It is a
+    # file rather than shared memory so concurrent writers wait for the
+    # lock the way they would in production instead of failing.
+    directory = tempfile.mkdtemp(prefix="photo-api-bench-")
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(
+        directory, "db.sqlite3"
+    )
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def wsgi_caller(application) -> Callable[[str, str, bytes], Tuple[int, float]]:
+    def call(method: str, url: str, body: bytes = b"") -> Tuple[int, float]:
+        path, _, query = url.partition("?")
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "HTTP_COOKIE": f"csrftoken={CSRF_TOKEN}",
+            "HTTP_X_CSRFTOKEN": CSRF_TOKEN,
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.url_scheme": "http",
+        }
+        statuses = []
+        start = time.perf_counter()
+        b"".join(
+            application(
+                environ, lambda status, headers: statuses.append(status)
+            )
+        )
+        return int(statuses[0].split()[0]), time.perf_counter() - start
+
+    return call
+
+
+def timed(func: Callable[[], int]) -> Dict[str, float]:
+    start = time.perf_counter()
+    requests = func()
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+    }
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
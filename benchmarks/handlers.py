@@ -0,0 +1,160 @@
+"""
+Compare WSGI and ASGI throughput for the catalog and checkout endpoints.
+
+Each handler runs in its own process against a fresh test database:
+
+    python -m benchmarks.handlers --requests 2000 --concurrency 64
+
+WSGI requests are spread over ``--threads`` worker threads, the way a
+threaded WSGI server would serve them. ASGI requests all run concurrently on
+one event loop, with database work bounded by ``DB_EXECUTOR_WORKERS``.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import common
+
+SETTINGS = {
+    "wsgi": "photocatalog.settings",
+    "asgi": "photocatalog.settings_asgi",
+}
+
+
+def workload(requests):
+    from photocatalog import CURRENT_VERSION
+
+    order = json.dumps(common.ORDER).encode()
+    paths = [
+        ("GET", f"/{CURRENT_VERSION}/catalog/?page_size=20", b""),
+        (
+            "GET",
+            f"/{CURRENT_VERSION}/catalog/?page_size=20&location=Paris",
+            b"",
+        ),
+        ("GET", f"/{CURRENT_VERSION}/checkout/print-sizes", b""),
+        ("POST", f"/{CURRENT_VERSION}/checkout/", order),
+    ]
+    return [paths[i % len(paths)] for i in range(requests)]
+
+
+def run_wsgi(requests, concurrency, threads):
+    from django.core.wsgi import get_wsgi_application
+
+    call_wsgi = common.wsgi_caller(get_wsgi_application())
+    latencies = []
+    errors = []
+
+    def call(request):
+        status, seconds = call_wsgi(*request)
+        latencies.append(seconds)
+        if status >= 300:
+            errors.append(status)
+
+    def serve():
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(call, workload(requests)))
+        return requests
+
+    result = common.timed(serve)
+    result.update(
+        common.summarize(latencies), errors=len(errors), threads=threads
+    )
+    return result
+
+
+def run_asgi(requests, concurrency, threads):
+    from django.conf import settings
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+    latencies = []
+    errors = []
+
+    async def call(request, slots):
+        method, url, body = request
+        path, _, query = url.partition("?")
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": query.encode(),
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"cookie", f"csrftoken={common.CSRF_TOKEN}".encode()),
+                (b"x-csrftoken", common.CSRF_TOKEN.encode()),
+            ],
+            "server": ("testserver", 80),
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": body}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                if message["status"] >= 300:
+                    errors.append(message["status"])
+
+        async with slots:
+            start = time.perf_counter()
+            await application(scope, receive, send)
+            latencies.append(time.perf_counter() - start)
+
+    async def serve_all():
+        slots = asyncio.Semaphore(concurrency)
+        await asyncio.gather(
+            *(call(request, slots) for request in workload(requests))
+        )
+
+    def serve():
+        asyncio.run(serve_all())
+        return requests
+
+    result = common.timed(serve)
+    result.update(
+        common.summarize(latencies),
+        errors=len(errors),
+        threads=settings.DB_EXECUTOR_WORKERS,
+    )
+    return result
+
+
+RUNNERS = {"wsgi": run_wsgi, "asgi": run_asgi}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--handler", choices=sorted(RUNNERS))
+    options = parser.parse_args()
+
+    if options.handler:
+        common.setup(SETTINGS[options.handler])
+        result = RUNNERS[options.handler](
+            options.requests, options.concurrency, options.threads
+        )
+        print(json.dumps(result))
+        return
+
+    for handler in RUNNERS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.handlers"]
+            + ["--handler", handler]
+            + ["--requests", str(options.requests)]
+            + ["--concurrency", str(options.concurrency)]
+            + ["--threads", str(options.threads)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        print(handler, output.strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""
+Drive concurrent HTTP clients at the catalog and checkout endpoints.
+
+``run`` seeds a fresh SQLite database, serves it from a separate process and
+reports throughput and latency percentiles as JSON, overall and for each
+scenario:
+
+    python -m benchmarks.load run --rows 100000 --requests 20000 \\
+        --concurrency 16 --output after.json
+
+Pass ``--url`` to load an already running deployment instead; it is expected
+to serve a catalog of at least ``--rows`` photos. ``compare`` diffs two runs
+and exits with status 1 when throughput drops or p95/p99 latency grows by
+more than ``--threshold`` percent, so it can gate a release:
+
+    python -m benchmarks.load compare before.json after.json --threshold 10
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks import common
+from photocatalog import CURRENT_VERSION
+
+# Relative weight of each scenario in the request mix.
+SCENARIOS = {
+    "catalog-sequential": 30,
+    "catalog-deep": 30,
+    "checkout-valid": 10,
+    "checkout-invalid": 5,
+    "print-sizes": 25,
+}
+# Growth above the threshold fails the comparison for these metrics, a drop
+# below it for the others.
+LOWER_IS_BETTER = ("p95_ms", "p99_ms", "errors")
+COMPARED = ("requests_per_second",) + LOWER_IS_BETTER
+PAGE_SIZE = 50
+SERVER_START_TIMEOUT = 60
+
+
+def seed(database: str, rows: int, orders: int) -> None:
+    os.environ["BENCHMARK_DATABASE"] = database
+    os.environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.settings"
+    import django
+
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    from checkout import prices, sales
+    from checkout.models import Orders, Prints
+    from photos import data
+    from photos.models import Catalog
+
+    call_command("migrate", verbosity=0)
+    Catalog.objects.bulk_create(
+        (
+            Catalog(
+                title=f"Photo {number}",
+                location=("Paris", "Tokyo", "Lima", "Oslo", None)[number % 5],
+                year=1880 + number % 140,
+                path=f"seed/{number}.jpg",
+            )
+            for number in range(rows)
+        ),
+        batch_size=2000,
+    )
+    photo_ids = list(Catalog.objects.values_list("id", flat=True))
+    print_ids = list(Prints.objects.values_list("id", flat=True))
+    billed = prices.price_table().prices
+    order = {
+        name: value
+        for name, value in common.ORDER.items()
+        if name not in ("print_id", "photo_id")
+    }
+    Orders.objects.bulk_create(
+        (
+            Orders(
+                **order,
+                print_id_id=print_ids[number % len(print_ids)],
+                photo_id_id=photo_ids[number % len(photo_ids)],
+                billed_cents=billed[
+                    print_ids[number % len(print_ids)]
+                ].total_cents,
+            )
+            for number in range(orders)
+        ),
+        batch_size=2000,
+    )
+    data.rebuild_facets()
+    sales.rebuild_sales()
+    connection.close()
+
+
+def free_port() -> int:
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        return listener.getsockname()[1]
+
+
+def start_server(database: str) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "manage.py", "runserver", "--noreload", str(port)],
+        env={
+            **os.environ,
+            "BENCHMARK_DATABASE": database,
+            "DJANGO_SETTINGS_MODULE": "benchmarks.settings",
+        },
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("The benchmark server exited on start.")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return server, url
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("The benchmark server did not start in time.")
+
+
+class Client:
+    def __init__(self, url: str, rows: int, seed: int, keep_alive: bool):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.rows = rows
+        self.keep_alive = keep_alive
+        self.random = random.Random(seed)
+        self.connection: Optional[http.client.HTTPConnection] = None
+        self.cursor: Optional[str] = None
+
+    def request(
+        self, method: str, path: str, body: Optional[dict] = None
+    ) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {
+            "Content-Type": "application/json",
+            "Cookie": f"csrftoken={common.CSRF_TOKEN}",
+            "X-CSRFToken": common.CSRF_TOKEN,
+        }
+        if not self.keep_alive:
+            headers["Connection"] = "close"
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=30
+                )
+            try:
+                self.connection.request(
+                    method, self.prefix + path, payload, headers
+                )
+                response = self.connection.getresponse()
+                content = response.read()
+            except (http.client.HTTPException, OSError):
+                # The server closed a kept-alive connection; retry once on a
+                # new one.
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+                continue
+            if response.will_close or not self.keep_alive:
+                self.connection.close()
+                self.connection = None
+            return response.status, content
+        raise AssertionError("unreachable")
+
+    def catalog_sequential(self) -> bool:
+        query = {"page_size": PAGE_SIZE}
+        if self.cursor:
+            query["cursor"] = self.cursor
+        status, content = self.request(
+            "GET",
+            f"/{CURRENT_VERSION}/catalog/?{urllib.parse.urlencode(query)}",
+        )
+        self.cursor = (
+            json.loads(content)["next_cursor"] if status == 200 else None
+        )
+        return status == 200
+
+    def catalog_deep(self) -> bool:
+        last_token = self.random.randrange(self.rows)
+        status, _ = self.request(
+            "GET",
+            f"/{CURRENT_VERSION}/catalog/"
+            f"?page_size={PAGE_SIZE}&last_token={last_token}",
+        )
+        return status == 200
+
+    def checkout_valid(self) -> bool:
+        order = dict(
+            common.ORDER,
+            photo_id=self.random.randrange(1, self.rows),
+            print_id=self.random.randrange(1, 4),
+        )
+        status, _ = self.request(
+            "POST", f"/{CURRENT_VERSION}/checkout/", order
+        )
+        return status in (201, 202)
+
+    def checkout_invalid(self) -> bool:
+        order = dict(common.ORDER, primary_phone="not a phone", print_id=99)
+        status, _ = self.request(
+            "POST", f"/{CURRENT_VERSION}/checkout/", order
+        )
+        return status == 422
+
+    def print_sizes(self) -> bool:
+        status, _ = self.request(
+            "GET", f"/{CURRENT_VERSION}/checkout/print-sizes"
+        )
+        return status == 200
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+
+
+def drive(
+    url: str,
+    rows: int,
+    requests: int,
+    concurrency: int,
+    seed: int,
+    keep_alive: bool,
+) -> Dict:
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name] for name in names]
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    issued = itertools.count()
+
+    def client_loop(number: int) -> None:
+        client = Client(url, rows, seed + number, keep_alive)
+        try:
+            while next(issued) < requests:
+                name = client.random.choices(names, weights)[0]
+                start = time.perf_counter()
+                try:
+                    ok = getattr(client, name.replace("-", "_"))()
+                except (http.client.HTTPException, OSError, ValueError):
+                    ok = False
+                latencies[name].append(time.perf_counter() - start)
+                if not ok:
+                    errors[name] += 1
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client_loop, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    def report(times: List[float], failed: int) -> Dict:
+        result = {
+            "requests": len(times),
+            "requests_per_second": round(len(times) / elapsed, 1),
+            "errors": failed,
+        }
+        if times:
+            result.update(common.summarize(times))
+        return result
+
+    everything = [time for times in latencies.values() for time in times]
+    return {
+        "config": {
+            "url": url,
+            "rows": rows,
+            "requests": requests,
+            "concurrency": concurrency,
+            "seed": seed,
+            "keep_alive": keep_alive,
+            "mix": SCENARIOS,
+        },
+        "seconds": round(elapsed, 3),
+        "total": report(everything, sum(errors.values())),
+        "scenarios": {
+            name: report(latencies[name], errors[name]) for name in names
+        },
+    }
+
+
+def run(options) -> int:
+    directory = tempfile.mkdtemp(prefix="photo-api-load-")
+    server = None
+    try:
+        url = options.url
+        if url is None:
+            database = os.path.join(directory, "db.sqlite3")
+            seed(database, options.rows, options.orders)
+            server, url = start_server(database)
+        result = drive(
+            url,
+            options.rows,
+            options.requests,
+            options.concurrency,
+            options.seed,
+            options.keep_alive,
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(directory, ignore_errors=True)
+    text = json.dumps(result, indent=2)
+    if options.output:
+        with open(options.output, "w") as output:
+            output.write(text + "\n")
+    print(text)
+    return 0
+
+
+def change(before: float, after: float) -> Optional[float]:
+    if before == 0:
+        return None if after == 0 else float("inf")
+    return (after - before) / before * 100
+
+
+def compare(options) -> int:
+    with open(options.before) as before_file, open(options.after) as after:
+        before, after = json.load(before_file), json.load(after)
+    sections = {"total": (before["total"], after["total"])}
+    for name, results in after["scenarios"].items():
+        if name in before["scenarios"]:
+            sections[name] = (before["scenarios"][name], results)
+    differing = sorted(
+        key
+        for key in set(before["config"]) | set(after["config"])
+        if key != "url"
+        and before["config"].get(key) != after["config"].get(key)
+    )
+    if differing:
+        print(f"The runs differ in {', '.join(differing)}.")
+    regressions = []
+    print(f"{'':20} {'metric':20} {'before':>10} {'after':>10} {'change':>9}")
+    for name, (old, new) in sections.items():
+        for metric in COMPARED:
+            if metric not in old or metric not in new:
+                continue
+            delta = change(old[metric], new[metric])
+            worse = delta is not None and (
+                delta > options.threshold
+                if metric in LOWER_IS_BETTER
+                else delta < -options.threshold
+            )
+            flag = "  REGRESSED" if worse else ""
+            shown = "" if delta is None else f"{delta:+.1f}%"
+            print(
+                f"{name:20} {metric:20} {old[metric]:>10} {new[metric]:>10} "
+                f"{shown:>9}{flag}"
+            )
+            if worse:
+                regressions.append(f"{name} {metric}")
+    if regressions:
+        print(
+            f"Regressed beyond {options.threshold}%: {', '.join(regressions)}"
+        )
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    runner = commands.add_parser("run", help="Run the load benchmark.")
+    runner.add_argument(
+        "--url", help="Load this server instead of booting one."
+    )
+    runner.add_argument("--rows", type=int, default=100000)
+    runner.add_argument("--orders", type=int, default=20000)
+    runner.add_argument("--requests", type=int, default=20000)
+    runner.add_argument("--concurrency", type=int, default=16)
+    runner.add_argument("--seed", type=int, default=0)
+    runner.add_argument(
+        "--keep-alive",
+        action="store_true",
+        help="Reuse connections between requests. Leave off against the "
+        "development server, which stalls kept-alive responses on delayed "
+        "ACKs.",
+    )
+    runner.add_argument("--output", help="Also write the results here.")
+    runner.set_defaults(handler=run)
+
+    comparer = commands.add_parser("compare", help="Diff two runs.")
+    comparer.add_argument("before")
+    comparer.add_argument("after")
+    comparer.add_argument("--threshold", type=float, default=10.0)
+    comparer.set_defaults(handler=compare)
+
+    options = parser.parse_args()
+    sys.exit(options.handler(options))
+
+
+if __name__ == "__main__":
+    main()
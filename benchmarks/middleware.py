@@ -0,0 +1,92 @@
+"""
+Compare per-request overhead of the full and API-only settings profiles.
+
+Each profile runs in its own process against a fresh test database:
+
+    python -m benchmarks.middleware --requests 5000
+
+Requests are made one at a time from a single thread. Catalog pages are
+served from the page cache after the first request, so most of the time
+left for a GET is spent in the middleware, URL resolving and response
+handling. Checkout POSTs are reported separately.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from benchmarks import common
+
+SETTINGS = {
+    "full": "photocatalog.settings",
+    "api": "photocatalog.settings_api",
+}
+
+
+def workload(requests):
+    from photocatalog import CURRENT_VERSION
+
+    order = json.dumps(common.ORDER).encode()
+    paths = [
+        ("GET", f"/{CURRENT_VERSION}/catalog/?page_size=20", b""),
+        ("GET", f"/{CURRENT_VERSION}/checkout/print-sizes", b""),
+        ("GET", f"/{CURRENT_VERSION}/catalog/?page_size=20", b""),
+        ("POST", f"/{CURRENT_VERSION}/checkout/", order),
+    ]
+    return [paths[i % len(paths)] for i in range(requests)]
+
+
+def run(requests):
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    call_wsgi = common.wsgi_caller(get_wsgi_application())
+    latencies = {"GET": [], "POST": []}
+    errors = []
+
+    def serve():
+        for method, url, body in workload(requests):
+            status, seconds = call_wsgi(method, url, body)
+            latencies[method].append(seconds)
+            if status >= 300:
+                errors.append(status)
+        return requests
+
+    result = common.timed(serve)
+    for method, times in latencies.items():
+        result[f"{method.lower()}_p50_us"] = round(
+            sorted(times)[len(times) // 2] * 1e6, 1
+        )
+    result.update(
+        errors=len(errors),
+        middleware=len(settings.MIDDLEWARE),
+        apps=len(settings.INSTALLED_APPS),
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--profile", choices=sorted(SETTINGS))
+    options = parser.parse_args()
+
+    if options.profile:
+        common.setup(SETTINGS[options.profile])
+        print(json.dumps(run(options.requests)))
+        return
+
+    for profile in SETTINGS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.middleware"]
+            + ["--profile", profile]
+            + ["--requests", str(options.requests)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        print(profile, output.strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import os
+
+from photocatalog.settings import *  # noqa: F401,F403
+from photocatalog.settings import DATABASES
+
+# The load benchmark seeds its own database and serves it with DEBUG off, so
+# neither the query log nor debug pages skew the numbers.
+DEBUG = False
+ALLOWED_HOSTS = ["127.0.0.1", "localhost"]
+DATABASES["default"]["NAME"] = os.environ["BENCHMARK_DATABASE"]
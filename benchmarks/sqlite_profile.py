@@ -0,0 +1,142 @@
+"""
+Compare the default and performance SQLite profiles under mixed load.
+
+Each profile runs in its own process against a fresh file database seeded
+with extra catalog rows:
+
+    python -m benchmarks.sqlite_profile --requests 4000 --threads 8
+
+Readers page through the catalog from varying offsets, so most pages miss
+the cache and reach the database, while writers place orders at the same
+time. Latencies are reported separately for reads and writes.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import common
+
+PROFILES = ("default", "performance")
+
+
+def seed(rows):
+    from photos.models import Catalog
+
+    Catalog.objects.bulk_create(
+        (
+            Catalog(
+                title=f"Benchmark {number}",
+                location="Paris",
+                year=1900 + number % 120,
+                path=f"benchmark/{number}.jpg",
+            )
+            for number in range(rows)
+        ),
+        batch_size=1000,
+    )
+    return Catalog.objects.count()
+
+
+def workload(requests, write_every, catalog_rows):
+    from photocatalog import CURRENT_VERSION
+
+    order = json.dumps(common.ORDER).encode()
+    for number in range(requests):
+        if number % write_every == 0:
+            yield ("POST", f"/{CURRENT_VERSION}/checkout/", order)
+        else:
+            last_token = number * 7919 % catalog_rows
+            yield (
+                "GET",
+                f"/{CURRENT_VERSION}/catalog/"
+                f"?page_size=50&last_token={last_token}",
+                b"",
+            )
+
+
+def run(requests, threads, write_every, rows):
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    catalog_rows = seed(rows)
+    call_wsgi = common.wsgi_caller(get_wsgi_application())
+    latencies = {"GET": [], "POST": []}
+    errors = []
+
+    def call(request):
+        status, seconds = call_wsgi(*request)
+        latencies[request[0]].append(seconds)
+        if status >= 300:
+            errors.append(status)
+
+    def serve():
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(call, workload(requests, write_every, catalog_rows)))
+        return requests
+
+    result = common.timed(serve)
+    for method, name in (("GET", "reads"), ("POST", "writes")):
+        summary = common.summarize(latencies[method])
+        result.update(
+            {
+                name: len(latencies[method]),
+                f"{name}_p50_ms": summary["p50_ms"],
+                f"{name}_p99_ms": summary["p99_ms"],
+            }
+        )
+    result.update(
+        errors=len(errors),
+        threads=threads,
+        conn_max_age=settings.DATABASES["default"]["CONN_MAX_AGE"],
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument(
+        "--write-every",
+        type=int,
+        default=5,
+        help="Place an order every this many requests.",
+    )
+    parser.add_argument(
+        "--rows", type=int, default=20000, help="Extra catalog rows to seed."
+    )
+    parser.add_argument("--profile", choices=PROFILES)
+    options = parser.parse_args()
+
+    if options.profile:
+        common.setup("photocatalog.settings")
+        result = run(
+            options.requests,
+            options.threads,
+            options.write_every,
+            options.rows,
+        )
+        print(json.dumps(result))
+        return
+
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.sqlite_profile"]
+            + ["--profile", profile]
+            + ["--requests", str(options.requests)]
+            + ["--threads", str(options.threads)]
+            + ["--write-every", str(options.write_every)]
+            + ["--rows", str(options.rows)],
+            check=True,
+            capture_output=True,
+            text=True,
+            env={**os.environ, "SQLITE_PROFILE": profile},
+        ).stdout
+        print(profile, output.strip())
+
+
+if __name__ == "__main__":
+    main()
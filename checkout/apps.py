@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CheckoutConfig(AppConfig):
     name = "checkout"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,6 +1,33 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.core import signing
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from photocatalog import exports
+from photos.data import parse_int
+from photos.models import Catalog
+
+from .forms import OrderValidator, parse_id
+from .models import Orders, Statuses
+from .prices import price_table
+from .sales import record_sales
 
 DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+MAX_BATCH_SIZE = 500
+BULK_BATCH_SIZE = 100
+ORDER_CACHE_TIMEOUT = 300
+FINAL_STATUSES = (Statuses.FULFILLED.value, Statuses.REJECTED.value)
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+ORDERS_CURSOR_SALT = "checkout.orders.cursor"
+EXPORT_FIELDS = tuple(field.name for field in Orders._meta.concrete_fields)
 
 
 def format_address(form) -> str:
@@ -13,39 +40,207 @@ def format_address(form) -> str:
     )
 
 
+def order_details(order) -> Dict[str, Any]:
+    price = price_table().prices[order.print_id_id]
+    return {
+        "id": order.id,
+        "status": order.status,
+        "placed_on": order.time_placed.strftime(DATETIME_FORMAT),
+        "items_ordered": [{"title": order.photo_id.title, "size": price.size}],
+        "shipping_summary": {
+            "ship_to": " ".join([order.first_name, order.last_name]),
+            "email": order.email,
+            "phone": order.primary_phone,
+            "address": format_address(order),
+            "city": order.city,
+            "state_or_region": order.state_or_region,
+            "postal_code": order.postal_code,
+            "country": order.country,
+        },
+        "billing_summary": {
+            "order_total": price.total_cents / 100,
+            "shipping_total": price.shipping_cents / 100,
+            "item_total": price.print_cents / 100,
+        },
+    }
+
+
 def process_order(form):
     if form.is_valid():
-        saved_form = form.save(commit=True)
+        with transaction.atomic():
+            saved_form = form.save(commit=True)
     else:
         raise ValidationError(
             "Order form is invalid. Reason: %(errors)s",
             code="invalid",
             params={"errors": form.errors},
         )
-    details = {
-        "id": saved_form.id,
-        "status": saved_form.status,
-        "placed_on": saved_form.time_placed.strftime(DATETIME_FORMAT),
-        "items_ordered": [
-            {
-                "title": saved_form.photo_id.title,
-                "size": saved_form.print_id.size,
-            }
-        ],
-        "shipping_summary": {
-            "ship_to": " ".join([saved_form.first_name, saved_form.last_name]),
-            "email": saved_form.email,
-            "phone": saved_form.primary_phone,
-            "address": format_address(saved_form),
-            "city": saved_form.city,
-            "state_or_region": saved_form.state_or_region,
-            "postal_code": saved_form.postal_code,
-            "country": saved_form.country,
-        },
-        "billing_summary": {
-            "order_total": float(saved_form.print_id.total_cost()),
-            "shipping_total": float(saved_form.print_id.shipping_cost),
-            "item_total": float(saved_form.print_id.print_cost),
-        },
-    }
+    return order_details(saved_form)
+
+
+def order_cache_key(order_id: uuid.UUID) -> str:
+    return f"checkout:order:{order_id}"
+
+
+def lookup_order(order_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+    key = order_cache_key(order_id)
+    details = cache.get(key)
+    if details is not None:
+        return details
+    order = (
+        Orders.objects.select_related("photo_id").filter(pk=order_id).first()
+    )
+    if order is None:
+        return None
+    details = order_details(order)
+    # Fulfilled and rejected orders never change again.
+    if order.status in FINAL_STATUSES:
+        cache.set(key, details, ORDER_CACHE_TIMEOUT)
     return details
+
+
+def process_orders(orders: List[Any]) -> List[Dict[str, Any]]:
+    photo_ids = {
+        parse_id(order.get("photo_id"))
+        for order in orders
+        if isinstance(order, dict)
+    }
+    photos = Catalog.objects.only("id", "title").in_bulk(
+        [photo_id for photo_id in photo_ids if photo_id is not None]
+    )
+
+    results: List[Dict[str, Any]] = []
+    valid = []
+    for order in orders:
+        validator = OrderValidator(order, photos=photos)
+        if not validator.is_valid():
+            results.append({"status": 422, "errors": validator.errors})
+            continue
+        saved = validator.save(commit=False)
+        valid.append(saved)
+        results.append({"status": 201, "order": saved})
+
+    with transaction.atomic():
+        Orders.objects.bulk_create(valid, batch_size=BULK_BATCH_SIZE)
+        record_sales(valid)
+    for result in results:
+        if result["status"] == 201:
+            result["order"] = order_details(result["order"])
+    return results
+
+
+def parse_time(name: str, value) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError(
+            {name: ["Enter a valid date/time."]}, code="invalid"
+        )
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_order_filters(params) -> Dict[str, Any]:
+    status = params.get("status") or None
+    if status is not None and status not in {s.value for s in Statuses}:
+        message = f"Select a valid choice. {status} is not a status."
+        raise ValidationError({"status": [message]}, code="invalid_choice")
+    filters = {
+        "email": params.get("email") or None,
+        "status": status,
+        "placed_after": parse_time("placed_after", params.get("placed_after")),
+        "placed_before": parse_time(
+            "placed_before", params.get("placed_before")
+        ),
+    }
+    return {
+        name: value for name, value in filters.items() if value is not None
+    }
+
+
+def filter_orders(orders, filters: Dict[str, Any]):
+    if "email" in filters:
+        orders = orders.filter(email=filters["email"])
+    if "status" in filters:
+        orders = orders.filter(status=filters["status"])
+    if "placed_after" in filters:
+        orders = orders.filter(time_placed__gte=filters["placed_after"])
+    if "placed_before" in filters:
+        orders = orders.filter(time_placed__lt=filters["placed_before"])
+    return orders
+
+
+def encode_orders_cursor(order: Orders) -> str:
+    return signing.dumps(
+        [order.time_placed.isoformat(), order.id.hex], salt=ORDERS_CURSOR_SALT
+    )
+
+
+def decode_orders_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        time_placed, order_id = signing.loads(cursor, salt=ORDERS_CURSOR_SALT)
+        return datetime.fromisoformat(time_placed), uuid.UUID(order_id)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise ValidationError({"cursor": ["Invalid cursor."]}, code="invalid")
+
+
+def query_orders(params) -> Dict[str, Any]:
+    filters = parse_order_filters(params)
+    page_size = parse_int("page_size", params.get("page_size"), minimum=1)
+    page_size = min(page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    orders = filter_orders(
+        Orders.objects.select_related("photo_id").order_by(
+            "-time_placed", "-id"
+        ),
+        filters,
+    )
+    if params.get("cursor"):
+        time_placed, order_id = decode_orders_cursor(params["cursor"])
+        # The plain bound lets the index seek; the OR alone scans.
+        orders = orders.filter(
+            Q(time_placed__lt=time_placed)
+            | Q(time_placed=time_placed, id__lt=order_id),
+            time_placed__lte=time_placed,
+        )
+    rows = list(orders[: page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return {
+        "count": len(rows),
+        "has_more": has_more,
+        "next_cursor": encode_orders_cursor(rows[-1]) if has_more else None,
+        "results": [order_details(order) for order in rows],
+    }
+
+
+def export_order_chunks(
+    since: Optional[datetime],
+    chunk_size: int,
+    since_id: Optional[uuid.UUID] = None,
+) -> Iterator[List[tuple]]:
+    ordered = Orders.objects.order_by("time_placed", "id")
+    placed = EXPORT_FIELDS.index("time_placed")
+
+    def following(time_placed, order_id):
+        return ordered.filter(
+            Q(time_placed__gt=time_placed)
+            | Q(time_placed=time_placed, id__gt=order_id),
+            time_placed__gte=time_placed,
+        )
+
+    def after(row):
+        return following(row[placed], row[0])
+
+    orders = ordered
+    if since is not None and since_id is not None:
+        # Resuming from the last exported row keeps the orders placed at
+        # the same time that it had not reached yet.
+        orders = following(since, since_id)
+    elif since is not None:
+        orders = orders.filter(time_placed__gt=since)
+    return exports.keyset_chunks(orders, EXPORT_FIELDS, after, chunk_size)
@@ -1,6 +1,23 @@
-from django.forms import ModelForm
+import re
+from typing import Any, Dict, List, Optional
 
-from .models import Orders
+from django.core import validators
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.core.validators import EMPTY_VALUES
+from django.forms import Field, IntegerField, ModelChoiceField, ModelForm
+
+from photos.models import Catalog
+
+from .models import US_PHONE_REGEX, Orders
+from .prices import price_table
+
+REQUIRED = Field.default_error_messages["required"]
+INVALID_CHOICE = ModelChoiceField.default_error_messages["invalid_choice"]
+INVALID_INTEGER = IntegerField.default_error_messages["invalid"]
+INVALID_PHONE = validators.RegexValidator.message
+NOT_AN_ORDER = "Expected an order object."
+PHONE_PATTERN = re.compile(US_PHONE_REGEX)
+DECIMAL_SUFFIX = re.compile(r"\.0*\s*$")
 
 
 class OrderForm(ModelForm):
@@ -20,3 +37,125 @@ class OrderForm(ModelForm):
             "print_id",
             "photo_id",
         ]
+
+
+def parse_id(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class OrderValidator:
+    text_fields = {
+        name: Orders._meta.get_field(name)
+        for name in OrderForm.Meta.fields
+        if name not in ("postal_code", "print_id", "photo_id")
+    }
+
+    def __init__(self, data, photos: Optional[Dict[int, Catalog]] = None):
+        self.data = data
+        self.photos = photos
+        self.cleaned_data: Dict[str, Any] = {}
+        self._errors: Optional[Dict[str, List[str]]] = None
+
+    @property
+    def errors(self) -> Dict[str, List[str]]:
+        if self._errors is None:
+            self.full_clean()
+        return self._errors
+
+    def is_valid(self) -> bool:
+        return not self.errors
+
+    def full_clean(self) -> None:
+        self._errors = {}
+        if not isinstance(self.data, dict):
+            self._errors[NON_FIELD_ERRORS] = [NOT_AN_ORDER]
+            return
+        for name in OrderForm.Meta.fields:
+            value = self.data.get(name)
+            try:
+                if name in self.text_fields:
+                    value = self.clean_text(self.text_fields[name], value)
+                else:
+                    value = getattr(self, f"clean_{name}")(value)
+            except ValidationError as error:
+                self._errors[name] = error.messages
+            else:
+                self.cleaned_data[name] = value
+
+    def clean_text(self, field, value) -> Optional[str]:
+        if value not in EMPTY_VALUES:
+            value = str(value).strip()
+        if value in EMPTY_VALUES:
+            if not field.blank:
+                raise ValidationError(REQUIRED, code="required")
+            return None if field.null else ""
+        errors = []
+        if field.name == "email":
+            try:
+                validators.validate_email(value)
+            except ValidationError as error:
+                errors.extend(error.messages)
+        if len(value) > field.max_length:
+            try:
+                validators.MaxLengthValidator(field.max_length)(value)
+            except ValidationError as error:
+                errors.extend(error.messages)
+        if not errors and field.name == "primary_phone":
+            if not PHONE_PATTERN.search(value):
+                errors.append(INVALID_PHONE)
+        if errors:
+            raise ValidationError(errors)
+        return value
+
+    def clean_postal_code(self, value) -> int:
+        if value not in EMPTY_VALUES:
+            value = str(value).strip()
+        if value in EMPTY_VALUES:
+            raise ValidationError(REQUIRED, code="required")
+        try:
+            return int(DECIMAL_SUFFIX.sub("", value))
+        except ValueError:
+            raise ValidationError(INVALID_INTEGER, code="invalid")
+
+    def clean_print_id(self, value) -> int:
+        print_id = self._clean_reference(value)
+        if print_id not in price_table().prices:
+            raise ValidationError(INVALID_CHOICE, code="invalid_choice")
+        return print_id
+
+    def clean_photo_id(self, value) -> Catalog:
+        photo_id = self._clean_reference(value)
+        if self.photos is not None:
+            photo = self.photos.get(photo_id)
+        else:
+            photo = (
+                Catalog.objects.only("id", "title").filter(pk=photo_id).first()
+            )
+        if photo is None:
+            raise ValidationError(INVALID_CHOICE, code="invalid_choice")
+        return photo
+
+    def _clean_reference(self, value) -> int:
+        if value in EMPTY_VALUES:
+            raise ValidationError(REQUIRED, code="required")
+        reference = parse_id(value)
+        if reference is None:
+            raise ValidationError(INVALID_CHOICE, code="invalid_choice")
+        return reference
+
+    def save(self, commit: bool = True) -> Orders:
+        if not self.is_valid():
+            raise ValueError("The order could not be saved: it is invalid.")
+        fields = dict(self.cleaned_data)
+        print_id = fields.pop("print_id")
+        order = Orders(
+            print_id_id=print_id,
+            billed_cents=price_table().prices[print_id].total_cents,
+            **fields,
+        )
+        if commit:
+            order.save()
+        return order
@@ -0,0 +1,166 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Collection, Counter, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .data import BULK_BATCH_SIZE
+from .models import Orders, Statuses
+from .sales import is_counted, record_sales
+
+# Orders accepted by the write-behind queue are already pending, and orders
+# whose lease ran out in an interrupted run are picked up again before new
+# ones. Pending orders under a live lease are being sent by another worker.
+CLAIMABLE = (Statuses.PENDING.value, Statuses.CREATED.value)
+OUTCOMES = (Statuses.FULFILLED.value, Statuses.REJECTED.value)
+
+
+class FulfillmentBackend:
+    def fulfill(self, orders: List[Orders]) -> Dict[uuid.UUID, str]:
+        raise NotImplementedError
+
+
+class LocalBackend(FulfillmentBackend):
+    def __init__(
+        self, delay: float = 0.0, rejected_countries: Collection[str] = ()
+    ):
+        self.delay = delay
+        self.rejected_countries = set(rejected_countries)
+
+    def fulfill(self, orders: List[Orders]) -> Dict[uuid.UUID, str]:
+        if self.delay:
+            time.sleep(self.delay)
+        return {
+            order.id: Statuses.REJECTED.value
+            if order.country in self.rejected_countries
+            else Statuses.FULFILLED.value
+            for order in orders
+        }
+
+
+def get_backend(path: Optional[str] = None) -> FulfillmentBackend:
+    return import_string(path or settings.FULFILLMENT_BACKEND)()
+
+
+def unclaimed(now: datetime) -> Q:
+    return Q(claimed_until__isnull=True) | Q(claimed_until__lt=now)
+
+
+def claimable_orders(
+    status: str, after: Optional[Tuple] = None, now: Optional[datetime] = None
+):
+    orders = Orders.objects.filter(
+        unclaimed(now or timezone.now()), status=status
+    )
+    if after is not None:
+        time_placed, order_id = after
+        # The plain bound lets the index seek; the OR alone scans.
+        orders = orders.filter(
+            Q(time_placed__gt=time_placed)
+            | Q(time_placed=time_placed, id__gt=order_id),
+            time_placed__gte=time_placed,
+        )
+    return orders.order_by("time_placed", "id")
+
+
+def claim(candidates: List[Orders], now: datetime) -> List[Orders]:
+    # The UPDATE only takes orders nobody claimed since they were read, and
+    # the fresh token tells which of them this worker got.
+    token = uuid.uuid4()
+    lease = now + timedelta(seconds=settings.FULFILLMENT_LEASE)
+    Orders.objects.filter(
+        unclaimed(now),
+        id__in=[order.id for order in candidates],
+        status__in=CLAIMABLE,
+    ).update(status=Statuses.PENDING.value, claim=token, claimed_until=lease)
+    claimed = set(
+        Orders.objects.filter(
+            id__in=[order.id for order in candidates], claim=token
+        ).values_list("id", flat=True)
+    )
+    batch = [order for order in candidates if order.id in claimed]
+    for order in batch:
+        order.status = Statuses.PENDING.value
+        order.claim, order.claimed_until = token, lease
+    return batch
+
+
+def claim_batches(count: int, batch_size: int) -> List[List[Orders]]:
+    batches: List[List[Orders]] = []
+    now = timezone.now()
+    for status in CLAIMABLE:
+        after = None
+        while len(batches) < count:
+            candidates = list(
+                claimable_orders(status, after, now)[:batch_size]
+            )
+            if not candidates:
+                break
+            after = (candidates[-1].time_placed, candidates[-1].id)
+            batch = claim(candidates, now)
+            if batch:
+                batches.append(batch)
+    return batches
+
+
+def record_outcomes(
+    batch: List[Orders], outcomes: Dict[uuid.UUID, str]
+) -> List[Orders]:
+    with transaction.atomic():
+        # A worker that outlived its lease may have lost orders to another.
+        held = set(
+            Orders.objects.filter(
+                id__in=[order.id for order in batch], claim=batch[0].claim
+            ).values_list("id", flat=True)
+        )
+        batch = [order for order in batch if order.id in held]
+        finished = []
+        for order in batch:
+            status = outcomes.get(order.id)
+            if status in OUTCOMES:
+                order.status = status
+                finished.append(order)
+            # Orders the backend did not answer for stay pending, and giving
+            # up their lease lets the next run retry them.
+            order.claim = order.claimed_until = None
+        Orders.objects.bulk_update(
+            batch,
+            ["status", "claim", "claimed_until"],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        record_sales(
+            [order for order in finished if not is_counted(order.status)],
+            sign=-1,
+        )
+    return finished
+
+
+def fulfill_orders(
+    backend: FulfillmentBackend, batch_size: int, concurrency: int
+) -> Counter[str]:
+    totals: Counter[str] = Counter()
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="fulfillment"
+    ) as pool:
+        while True:
+            batches = claim_batches(concurrency, batch_size)
+            if not batches:
+                return totals
+            # Only the backend calls run concurrently; status writes stay on
+            # this thread because SQLite has a single writer anyway.
+            finished = 0
+            for batch, outcomes in zip(
+                batches, pool.map(backend.fulfill, batches)
+            ):
+                for order in record_outcomes(batch, outcomes):
+                    totals[order.status] += 1
+                    finished += 1
+            claimed = sum(len(batch) for batch in batches)
+            if not finished or claimed < concurrency * batch_size:
+                return totals
@@ -0,0 +1,40 @@
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import CommandError
+
+from checkout import data
+from photocatalog.exports import ExportCommand
+
+
+class Command(ExportCommand):
+    help = "Export orders as CSV or JSON lines in the order they were placed."
+    fields = data.EXPORT_FIELDS
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--since-time",
+            help="Only export orders placed after this ISO 8601 time.",
+        )
+        parser.add_argument(
+            "--since-id",
+            type=uuid.UUID,
+            help="With --since-time, also export orders placed at that time "
+            "whose id sorts after this one.",
+        )
+
+    def chunks(self, options):
+        try:
+            since = data.parse_time("since_time", options["since_time"])
+        except ValidationError as error:
+            raise CommandError(error.message_dict["since_time"][0])
+        if options["since_id"] is not None and since is None:
+            raise CommandError("--since-id needs --since-time.")
+        return data.export_order_chunks(
+            since, options["chunk_size"], options["since_id"]
+        )
+
+    def describe_last(self, row):
+        placed = row[self.fields.index("time_placed")]
+        return f"time {placed.isoformat()} and id {row[0]}"
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from checkout import fulfillment
+
+
+class Command(BaseCommand):
+    help = "Claim created and pending orders and send them to fulfillment."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Orders claimed and updated per batch.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Batches sent to the fulfillment backend at once.",
+        )
+        parser.add_argument(
+            "--backend",
+            help="Dotted path to a backend, defaults to FULFILLMENT_BACKEND.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep polling for new orders every INTERVAL seconds.",
+        )
+
+    def handle(self, *args, **options):
+        backend = fulfillment.get_backend(options["backend"])
+        while True:
+            start = time.perf_counter()
+            totals = fulfillment.fulfill_orders(
+                backend, options["batch_size"], options["concurrency"]
+            )
+            if totals or options["interval"] is None:
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Fulfilled {totals['fulfilled']} and rejected "
+                        f"{totals['rejected']} orders in {elapsed:.2f}s."
+                    )
+                )
+            if options["interval"] is None:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from checkout import sales
+
+
+class Command(BaseCommand):
+    help = "Recount the daily sales rollup from the orders table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=sales.BACKFILL_DAYS,
+            help="Days of orders aggregated per query.",
+        )
+
+    def handle(self, *args, **options):
+        buckets = sales.rebuild_sales(days=options["days"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {buckets} daily sales buckets.")
+        )
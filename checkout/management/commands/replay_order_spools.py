@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from checkout import writebehind
+
+
+class Command(BaseCommand):
+    help = "Write the orders in spool files left behind by stopped workers."
+
+    def handle(self, *args, **options):
+        if not writebehind.enabled():
+            raise CommandError("ORDER_SPOOL_DIR is not set.")
+        recovered = writebehind.recover_spools(
+            settings.ORDER_SPOOL_DIR, settings.ORDER_WRITE_BATCH_SIZE
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Replayed {recovered} spooled orders.")
+        )
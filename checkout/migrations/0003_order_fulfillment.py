@@ -0,0 +1,63 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:55
+
+import django.core.validators
+from django.db import migrations, models
+
+import checkout.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checkout", "0002_import_sample_data"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="orders",
+            name="id",
+            field=models.UUIDField(
+                default=checkout.models.generate_uuid,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="orders",
+            name="primary_phone",
+            field=models.CharField(
+                max_length=20,
+                validators=[
+                    django.core.validators.RegexValidator(
+                        regex="(\\+1\\s)?[2-9][0-9]{2}-[2-9][0-9]{2}-[0-9]{4}"
+                    )
+                ],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="orders",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("created", "created"),
+                    ("pending", "pending"),
+                    ("fulfilled", "fulfilled"),
+                    ("rejected", "rejected"),
+                ],
+                default="created",
+                max_length=10,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="orders",
+            name="time_placed",
+            field=models.DateTimeField(default=checkout.models.generate_now),
+        ),
+        migrations.AddIndex(
+            model_name="orders",
+            index=models.Index(
+                fields=["status", "time_placed"], name="orders_status_placed"
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checkout", "0003_order_fulfillment"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="orders",
+            index=models.Index(
+                fields=["time_placed", "id"], name="orders_placed"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orders",
+            index=models.Index(
+                fields=["email", "time_placed"], name="orders_email_placed"
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:59
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def populate_sales(apps, schema_editor):
+    Orders = apps.get_model("checkout", "Orders")
+    Prints = apps.get_model("checkout", "Prints")
+    DailySales = apps.get_model("checkout", "DailySales")
+    prices = {
+        row.id: (
+            row.size,
+            int(row.print_cost * 100) + int(row.shipping_cost * 100),
+        )
+        for row in Prints.objects.all()
+    }
+    rows = (
+        Orders.objects.exclude(status="rejected")
+        .annotate(day=TruncDate("time_placed"))
+        .values_list("day", "print_id", "country")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    orders, revenue = Counter(), Counter()
+    for day, print_id, country, count in rows:
+        size, total_cents = prices[print_id]
+        orders[(day, size, country)] += count
+        revenue[(day, size, country)] += count * total_cents
+    DailySales.objects.bulk_create(
+        DailySales(
+            day=day,
+            size=size,
+            country=country,
+            orders=count,
+            revenue_cents=revenue[(day, size, country)],
+        )
+        for (day, size, country), count in orders.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checkout", "0004_order_history_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySales",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("size", models.CharField(max_length=10)),
+                ("country", models.CharField(max_length=3)),
+                ("orders", models.IntegerField(default=0)),
+                ("revenue_cents", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="dailysales",
+            constraint=models.UniqueConstraint(
+                fields=("day", "size", "country"), name="daily_sales_bucket"
+            ),
+        ),
+        migrations.RunPython(populate_sales, migrations.RunPython.noop),
+    ]
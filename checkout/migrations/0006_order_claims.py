@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checkout", "0005_daily_sales"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orders",
+            name="claim",
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="orders",
+            name="claimed_until",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:53
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_billed_cents(apps, schema_editor):
+    # What orders were charged was never stored, so existing orders are
+    # billed at the current prices, and the rollup is recounted from them.
+    Orders = apps.get_model("checkout", "Orders")
+    Prints = apps.get_model("checkout", "Prints")
+    DailySales = apps.get_model("checkout", "DailySales")
+    sizes = {}
+    for row in Prints.objects.all():
+        sizes[row.id] = row.size
+        Orders.objects.filter(print_id=row.id).update(
+            billed_cents=int(row.print_cost * 100)
+            + int(row.shipping_cost * 100)
+        )
+    rows = (
+        Orders.objects.exclude(status="rejected")
+        .annotate(day=TruncDate("time_placed"))
+        .values_list("day", "print_id", "country")
+        .annotate(count=Count("id"), revenue=Sum("billed_cents"))
+        .order_by()
+    )
+    orders, revenue = Counter(), Counter()
+    for day, print_id, country, count, revenue_cents in rows:
+        orders[(day, sizes[print_id], country)] += count
+        revenue[(day, sizes[print_id], country)] += revenue_cents
+    DailySales.objects.all().delete()
+    DailySales.objects.bulk_create(
+        DailySales(
+            day=day,
+            size=size,
+            country=country,
+            orders=count,
+            revenue_cents=revenue[(day, size, country)],
+        )
+        for (day, size, country), count in orders.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checkout", "0006_order_claims"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orders",
+            name="billed_cents",
+            field=models.IntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_billed_cents, migrations.RunPython.noop),
+    ]
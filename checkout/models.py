@@ -64,3 +64,42 @@ class Orders(models.Model):
         choices=[(s.value, s.value) for s in Statuses],
         default=Statuses.CREATED.value,
     )
+    # Print and shipping cost charged when the order was placed; revenue is
+    # summed from it so later price changes do not rewrite past sales.
+    billed_cents = models.IntegerField(editable=False)
+    # Set by the fulfillment worker that is sending the order, until the
+    # lease runs out.
+    claim = models.UUIDField(null=True, blank=True, editable=False)
+    claimed_until = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["time_placed", "id"], name="orders_placed"),
+            models.Index(
+                fields=["email", "time_placed"], name="orders_email_placed"
+            ),
+            models.Index(
+                fields=["status", "time_placed"], name="orders_status_placed"
+            ),
+        ]
+
+
+class DailySales(models.Model):
+    def __str__(self) -> str:
+        return (
+            f"{self.day} {self.size} {self.country}: "
+            f"{self.orders} orders, {self.revenue_cents} cents"
+        )
+
+    day = models.DateField()
+    size = models.CharField(max_length=10)
+    country = models.CharField(max_length=3)
+    orders = models.IntegerField(default=0)
+    revenue_cents = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "size", "country"], name="daily_sales_bucket"
+            ),
+        ]
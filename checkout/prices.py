@@ -0,0 +1,82 @@
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+from photocatalog import versions
+from photocatalog.routers import PRIMARY
+
+from .models import Prints
+
+PRINTS_VERSION_KEY = "checkout:prints:version"
+
+
+def prints_version() -> int:
+    return versions.current(PRINTS_VERSION_KEY)
+
+
+def bump_prints_version() -> None:
+    versions.bump(PRINTS_VERSION_KEY)
+
+
+def prints_etag() -> str:
+    return f'"prints-{prints_version()}"'
+
+
+class Price(NamedTuple):
+    id: int
+    size: str
+    print_cents: int
+    shipping_cents: int
+    total_cents: int
+
+
+class PriceTable(NamedTuple):
+    version: int
+    prices: Mapping[int, Price]
+    sizes: Mapping[int, str]
+
+
+_price_table: Optional[PriceTable] = None
+
+
+def to_cents(amount) -> int:
+    return int(amount * 100)
+
+
+def load_price_table(version: int) -> PriceTable:
+    prices = {}
+    # Orders are billed from this table, so it must not be built from a
+    # replica that has not caught up with the prints yet.
+    for row in Prints.objects.using(PRIMARY).order_by("id"):
+        print_cents = to_cents(row.print_cost)
+        shipping_cents = to_cents(row.shipping_cost)
+        prices[row.id] = Price(
+            id=row.id,
+            size=row.size,
+            print_cents=print_cents,
+            shipping_cents=shipping_cents,
+            total_cents=print_cents + shipping_cents,
+        )
+    return PriceTable(
+        version=version,
+        prices=MappingProxyType(prices),
+        sizes=MappingProxyType({p.id: p.size for p in prices.values()}),
+    )
+
+
+def current_price_table() -> Optional[PriceTable]:
+    table = _price_table
+    if table is None or table.version != prints_version():
+        return None
+    return table
+
+
+def cached_price_table() -> Tuple[str, Optional[PriceTable]]:
+    return prints_etag(), current_price_table()
+
+
+def price_table() -> PriceTable:
+    global _price_table
+    table = current_price_table()
+    if table is None:
+        table = _price_table = load_price_table(prints_version())
+    return table
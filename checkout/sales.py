@@ -0,0 +1,163 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DailySales, Orders, Statuses
+from .prices import price_table
+
+DEFAULT_STATS_DAYS = 30
+MAX_STATS_DAYS = 366
+BACKFILL_DAYS = 30
+
+
+def is_counted(status: str) -> bool:
+    return status != Statuses.REJECTED.value
+
+
+def sales_day(time_placed: datetime) -> date:
+    if timezone.is_aware(time_placed):
+        time_placed = timezone.localtime(time_placed)
+    return time_placed.date()
+
+
+def adjust_sales(
+    day: date, size: str, country: str, orders: int, revenue_cents: int
+) -> None:
+    updated = DailySales.objects.filter(
+        day=day, size=size, country=country
+    ).update(
+        orders=F("orders") + orders,
+        revenue_cents=F("revenue_cents") + revenue_cents,
+    )
+    if not updated:
+        DailySales.objects.create(
+            day=day,
+            size=size,
+            country=country,
+            orders=orders,
+            revenue_cents=revenue_cents,
+        )
+
+
+def record_sales(orders: Iterable[Orders], sign: int = 1) -> None:
+    sizes = price_table().sizes
+    buckets: Dict[Tuple[date, str, str], List[int]] = defaultdict(
+        lambda: [0, 0]
+    )
+    for order in orders:
+        size = sizes[order.print_id_id]
+        bucket = buckets[(sales_day(order.time_placed), size, order.country)]
+        bucket[0] += sign
+        bucket[1] += sign * order.billed_cents
+    for (day, size, country), (count, revenue_cents) in buckets.items():
+        adjust_sales(day, size, country, count, revenue_cents)
+
+
+def count_sales(orders, buckets: Dict[Tuple[date, str, str], List[int]]):
+    sizes = price_table().sizes
+    rows = (
+        orders.exclude(status=Statuses.REJECTED.value)
+        .annotate(day=TruncDate("time_placed"))
+        .values_list("day", "print_id", "country")
+        .annotate(count=Count("id"), revenue_cents=Sum("billed_cents"))
+        .order_by()
+    )
+    for day, print_id, country, count, revenue_cents in rows:
+        bucket = buckets[(day, sizes[print_id], country)]
+        bucket[0] += count
+        bucket[1] += revenue_cents
+
+
+def rebuild_sales(days: int = BACKFILL_DAYS) -> int:
+    bounds = Orders.objects.aggregate(
+        first=Min("time_placed"), last=Max("time_placed")
+    )
+    buckets: Dict[Tuple[date, str, str], List[int]] = defaultdict(
+        lambda: [0, 0]
+    )
+    start = bounds["first"]
+    while start is not None and start <= bounds["last"]:
+        end = start + timedelta(days=days)
+        count_sales(
+            Orders.objects.filter(time_placed__gte=start, time_placed__lt=end),
+            buckets,
+        )
+        start = end
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        DailySales.objects.bulk_create(
+            DailySales(
+                day=day,
+                size=size,
+                country=country,
+                orders=count,
+                revenue_cents=revenue_cents,
+            )
+            for (day, size, country), (count, revenue_cents) in buckets.items()
+        )
+    return len(buckets)
+
+
+def parse_day(name: str, value) -> Optional[date]:
+    if value in (None, ""):
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: ["Enter a valid date."]}, code="invalid")
+    return parsed
+
+
+def query_sales(params) -> Dict[str, Any]:
+    until = parse_day("until", params.get("until")) or timezone.localdate()
+    since = parse_day("since", params.get("since")) or until - timedelta(
+        days=DEFAULT_STATS_DAYS - 1
+    )
+    if since > until:
+        raise ValidationError(
+            {"since": ["Ensure this date is not after until."]},
+            code="invalid",
+        )
+    if (until - since).days >= MAX_STATS_DAYS:
+        message = f"Ensure the range covers at most {MAX_STATS_DAYS} days."
+        raise ValidationError({"since": [message]}, code="invalid")
+    rows = DailySales.objects.filter(
+        day__gte=since, day__lte=until, orders__gt=0
+    )
+    if params.get("size"):
+        rows = rows.filter(size=params["size"])
+    if params.get("country"):
+        rows = rows.filter(country=params["country"])
+    rows = rows.order_by("day", "size", "country").values_list(
+        "day", "size", "country", "orders", "revenue_cents"
+    )
+    results = []
+    total_orders = total_cents = 0
+    for day, size, country, orders, revenue_cents in rows:
+        results.append(
+            {
+                "day": day.isoformat(),
+                "size": size,
+                "country": country,
+                "orders": orders,
+                "revenue": revenue_cents / 100,
+            }
+        )
+        total_orders += orders
+        total_cents += revenue_cents
+    return {
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "orders": total_orders,
+        "revenue": total_cents / 100,
+        "results": results,
+    }
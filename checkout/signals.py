@@ -0,0 +1,40 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import prices, sales
+from .models import Orders, Prints
+
+
+@receiver(post_save, sender=Prints)
+@receiver(post_delete, sender=Prints)
+def invalidate_prints(sender, **kwargs):
+    prices.bump_prints_version()
+
+
+@receiver(pre_save, sender=Orders)
+def remember_sales_bucket(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._sold_before = (
+        Orders.objects.filter(pk=instance.pk)
+        .only("time_placed", "country", "print_id", "status", "billed_cents")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Orders)
+def update_sales(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, "_sold_before", None)
+    instance._sold_before = None
+    if before is not None and sales.is_counted(before.status):
+        sales.record_sales([before], sign=-1)
+    if sales.is_counted(instance.status):
+        sales.record_sales([instance])
+
+
+@receiver(post_delete, sender=Orders)
+def remove_from_sales(sender, instance, **kwargs):
+    if sales.is_counted(instance.status):
+        sales.record_sales([instance], sign=-1)
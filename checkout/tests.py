@@ -1,19 +1,31 @@
+import csv
+import fcntl
+import gzip
+import io
 import json
+import os
 import re
+import time
 import uuid
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta
 from unittest import mock
 
 import pytest
-from django.core.exceptions import ValidationError
-from django.test import Client
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from photocatalog import CURRENT_VERSION
 from photos.models import Catalog
 
-from . import data
+from . import data, forms, fulfillment, prices, sales, writebehind
 from .data import DATETIME_FORMAT
-from .models import US_PHONE_REGEX, Orders, Prints, Statuses
+from .models import US_PHONE_REGEX, DailySales, Orders, Prints, Statuses
 
 
 @pytest.mark.parametrize(
@@ -309,3 +321,1340 @@ def test_list_sizes_returns_expected():
     response = client.get(f"/{CURRENT_VERSION}/checkout/print-sizes")
 
     assert expected == json.loads(response.content)
+
+
+@pytest.mark.django_db
+def test_list_sizes_matching_etag_returns_304_without_queries(
+    django_assert_num_queries,
+):
+    client = Client()
+    url = f"/{CURRENT_VERSION}/checkout/print-sizes"
+    tag = client.get(url)["ETag"]
+    expected = 304
+
+    with django_assert_num_queries(0):
+        response = client.get(url, HTTP_IF_NONE_MATCH=tag)
+
+    assert expected == response.status_code
+
+
+@pytest.mark.django_db
+def test_list_sizes_etag_changes_when_prints_change():
+    client = Client()
+    url = f"/{CURRENT_VERSION}/checkout/print-sizes"
+    tag = client.get(url)["ETag"]
+    print_size = Prints.objects.get(size="sml")
+    print_size.print_cost = 11
+    print_size.save()
+    expected = 200
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=tag)
+
+    assert expected == response.status_code
+    assert tag != response["ETag"]
+
+
+@pytest.mark.django_db
+def test_list_sizes_is_served_from_price_table_without_queries(
+    django_assert_num_queries,
+):
+    client = Client()
+    client.get(f"/{CURRENT_VERSION}/checkout/print-sizes")
+
+    with django_assert_num_queries(0):
+        prices.price_table()
+
+
+@pytest.mark.django_db
+def test_price_table_stores_costs_in_cents():
+    row = Prints.objects.get(size="med")
+
+    price = prices.price_table().prices[row.id]
+
+    assert prices.to_cents(row.print_cost) == price.print_cents
+    assert prices.to_cents(row.shipping_cost) == price.shipping_cents
+    assert prices.to_cents(row.total_cost()) == price.total_cents
+
+
+@pytest.mark.django_db
+def test_price_table_is_immutable():
+    table = prices.price_table()
+
+    with pytest.raises(TypeError):
+        table.prices[0] = None
+
+
+@pytest.mark.django_db
+def test_price_table_is_rebuilt_when_prints_change():
+    row = Prints.objects.get(size="lrg")
+    prices.price_table()
+    row.print_cost = 25
+    row.save()
+    expected = 2500
+
+    actual = prices.price_table().prices[row.id].print_cents
+
+    assert expected == actual
+
+
+@pytest.mark.django_db
+def test_price_table_is_rebuilt_when_prints_are_deleted():
+    row = Prints.objects.create(size="sml", print_cost=1, shipping_cost=1)
+    prices.price_table()
+
+    row.delete()
+
+    assert row.id not in prices.price_table().prices
+
+
+@pytest.mark.django_db
+def test_price_table_sees_prints_edits_from_other_processes(
+    settings, tmp_path
+):
+    settings.CACHES = {
+        **settings.CACHES,
+        "versions": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path),
+            "TIMEOUT": None,
+        },
+    }
+    row = Prints.objects.get(size="lrg")
+    prices.price_table()
+    # Another worker saves the row and bumps the stamp in the shared cache.
+    Prints.objects.filter(id=row.id).update(print_cost=30)
+    FileBasedCache(str(tmp_path), {"TIMEOUT": None}).incr(
+        prices.PRINTS_VERSION_KEY
+    )
+
+    assert 3000 == prices.price_table().prices[row.id].print_cents
+
+
+class ReplicaReadsRouter:
+    def db_for_read(self, model, **hints):
+        return "replica"
+
+
+@pytest.mark.django_db
+def test_price_table_is_read_from_the_primary(settings):
+    # There is no replica in the tests, so any read routed to it fails.
+    settings.DATABASE_ROUTERS = [f"{__name__}.ReplicaReadsRouter"]
+
+    table = prices.price_table()
+
+    assert {"sml", "med", "lrg"} == set(table.sizes.values())
+
+
+@pytest.mark.django_db
+def test_checkout_batch_returns_results_in_input_order(order_form):
+    client = Client()
+    invalid = dict(order_form, email="not-an-email")
+    expected = [201, 422, 201]
+
+    response = client.post(
+        f"/{CURRENT_VERSION}/checkout/batch",
+        [order_form, invalid, order_form],
+        content_type="application/json",
+    )
+
+    response = json.loads(response.content)
+    assert expected == [item["status"] for item in response["results"]]
+    assert "email" in response["results"][1]["errors"]
+
+
+@pytest.mark.django_db
+def test_checkout_batch_saves_only_valid_orders(order_form):
+    client = Client()
+    invalid = dict(order_form, primary_phone="not-valid-number")
+    expected = Orders.objects.count() + 2
+
+    response = client.post(
+        f"/{CURRENT_VERSION}/checkout/batch",
+        [order_form, invalid, order_form],
+        content_type="application/json",
+    )
+
+    response = json.loads(response.content)
+    assert expected == Orders.objects.count()
+    for item in response["results"]:
+        if item["status"] == 201:
+            assert Orders.objects.filter(id=item["order"]["id"]).exists()
+
+
+@pytest.mark.django_db
+def test_checkout_batch_order_details_match_single_checkout(order_form):
+    client = Client()
+    single = client.post(
+        f"/{CURRENT_VERSION}/checkout/",
+        order_form,
+        content_type="application/json",
+    )
+    expected = json.loads(single.content)
+
+    response = client.post(
+        f"/{CURRENT_VERSION}/checkout/batch",
+        [order_form],
+        content_type="application/json",
+    )
+
+    actual = json.loads(response.content)["results"][0]["order"]
+    for details in (expected, actual):
+        details.pop("id")
+        details.pop("placed_on")
+    assert expected == actual
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "field,value,message",
+    [
+        ("print_id", "extra extra large", forms.INVALID_CHOICE),
+        ("print_id", None, forms.REQUIRED),
+        ("photo_id", 0, forms.INVALID_CHOICE),
+        ("photo_id", "", forms.REQUIRED),
+    ],
+)
+def test_checkout_batch_rejects_unknown_references(
+    order_form, field, value, message
+):
+    client = Client()
+    order_form[field] = value
+
+    response = client.post(
+        f"/{CURRENT_VERSION}/checkout/batch",
+        [order_form],
+        content_type="application/json",
+    )
+
+    result = json.loads(response.content)["results"][0]
+    assert 422 == result["status"]
+    assert [message] == result["errors"][field]
+
+
+@pytest.mark.django_db
+def test_checkout_batch_query_count_does_not_grow_with_batch(
+    order_form, django_assert_max_num_queries
+):
+    client = Client()
+    url = f"/{CURRENT_VERSION}/checkout/batch"
+    client.post(url, [order_form], content_type="application/json")
+    with CaptureQueriesContext(connection) as small:
+        client.post(url, [order_form] * 2, content_type="application/json")
+
+    with django_assert_max_num_queries(len(small)):
+        client.post(url, [order_form] * 50, content_type="application/json")
+
+
+@pytest.mark.django_db
+def test_checkout_batch_rejects_items_that_are_not_objects(order_form):
+    client = Client()
+
+    response = client.post(
+        f"/{CURRENT_VERSION}/checkout/batch",
+        [order_form, "order"],
+        content_type="application/json",
+    )
+
+    results = json.loads(response.content)["results"]
+    assert [201, 422] == [item["status"] for item in results]
+
+
+@pytest.mark.parametrize(
+    "body", [{"orders": []}, [{}] * (data.MAX_BATCH_SIZE + 1)]
+)
+def test_checkout_batch_invalid_body_returns_422(body):
+    client = Client()
+    expected = 422
+
+    response = client.post(
+        f"/{CURRENT_VERSION}/checkout/batch",
+        body,
+        content_type="application/json",
+    )
+
+    assert expected == response.status_code
+
+
+def test_checkout_batch_invalid_content_type_returns_415():
+    client = Client()
+    expected = 415
+
+    response = client.post(
+        f"/{CURRENT_VERSION}/checkout/batch", "[]", content_type="text/plain"
+    )
+
+    assert expected == response.status_code
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {},
+        {"first_name": None},
+        {"first_name": "   "},
+        {"last_name": "x" * 51},
+        {"email": "not-an-email"},
+        {"email": "a" * 45 + "@b.com"},
+        {"email": "a" * 60},
+        {"primary_phone": "not-valid-number"},
+        {"primary_phone": "555-555-5555-555-555-5555"},
+        {"primary_phone": "call 555-555-5555"},
+        {"address_line_two": ""},
+        {"address_line_two": "y" * 101},
+        {"postal_code": "2000.0"},
+        {"postal_code": "twenty"},
+        {"postal_code": ""},
+        {"country": "Australia"},
+        {"print_id": "extra extra large"},
+        {"print_id": 99},
+        {"print_id": None},
+        {"photo_id": "a-non-existent-photo"},
+        {"photo_id": 0},
+        {"photo_id": ""},
+        {"city": 12345},
+    ],
+)
+def test_order_validator_matches_order_form(order_form, changes):
+    order_form.update(changes)
+    form = forms.OrderForm(order_form)
+    expected = {name: list(errors) for name, errors in form.errors.items()}
+    expected_data = {
+        name: getattr(value, "pk", value)
+        for name, value in form.cleaned_data.items()
+    }
+
+    validator = forms.OrderValidator(order_form)
+
+    assert expected == validator.errors
+    assert expected_data == {
+        name: getattr(value, "pk", value)
+        for name, value in validator.cleaned_data.items()
+    }
+
+
+def test_order_validator_rejects_non_object_body():
+    validator = forms.OrderValidator(["not", "an", "order"])
+
+    assert not validator.is_valid()
+    assert NON_FIELD_ERRORS in validator.errors
+
+
+@pytest.mark.django_db
+def test_order_validator_validates_once(order_form, django_assert_num_queries):
+    validator = forms.OrderValidator(order_form)
+    validator.is_valid()
+
+    with django_assert_num_queries(0):
+        validator.is_valid()
+        validator.errors
+
+
+@pytest.mark.django_db
+def test_checkout_saves_order_with_three_queries(order_form):
+    client = Client()
+    url = f"/{CURRENT_VERSION}/checkout/"
+    client.post(url, order_form, content_type="application/json")
+
+    with CaptureQueriesContext(connection) as queries:
+        client.post(url, order_form, content_type="application/json")
+
+    # Photo lookup, order insert and sales rollup update; the savepoints
+    # only appear because the test itself runs in a transaction.
+    statements = [
+        query["sql"].split()[0]
+        for query in queries
+        if "SAVEPOINT" not in query["sql"]
+    ]
+    assert ["SELECT", "INSERT", "UPDATE"] == statements
+
+
+@pytest.mark.django_db
+def test_order_validator_benchmark_against_order_form(order_form):
+    iterations = 200
+    prices.price_table()
+
+    def run(validator_class):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.process_time()
+            for _ in range(iterations):
+                validator = validator_class(order_form)
+                validator.is_valid()
+                validator.is_valid()
+            elapsed = time.process_time() - started
+        return elapsed / iterations, len(queries) / iterations
+
+    form_cpu, form_queries = run(forms.OrderForm)
+    lean_cpu, lean_queries = run(forms.OrderValidator)
+    print(
+        f"\nper order: OrderForm {form_cpu * 1e6:.0f}us "
+        f"{form_queries:.0f} queries, OrderValidator {lean_cpu * 1e6:.0f}us "
+        f"{lean_queries:.0f} queries"
+    )
+
+    assert lean_queries < form_queries
+    assert lean_cpu < form_cpu
+
+
+@pytest.fixture
+def order_queue(settings, tmp_path, monkeypatch):
+    settings.ORDER_SPOOL_DIR = str(tmp_path)
+    queue = writebehind.OrderQueue(str(tmp_path), batch_size=2, interval=0)
+    queue.open_spool()
+    monkeypatch.setattr(writebehind, "_order_queue", queue)
+    yield queue
+    queue.close()
+
+
+def spool_lines(queue):
+    with open(queue.spool_path(), "rb") as spool:
+        return spool.readlines()
+
+
+@pytest.mark.django_db
+def test_write_behind_checkout_returns_202_pending(order_form, order_queue):
+    client = Client()
+
+    response = client.post(
+        f"/{CURRENT_VERSION}/checkout/",
+        order_form,
+        content_type="application/json",
+    )
+
+    assert 202 == response.status_code
+    response = json.loads(response.content)
+    assert Statuses.PENDING.value == response["status"]
+    assert not Orders.objects.filter(id=response["id"]).exists()
+    assert 1 == len(spool_lines(order_queue))
+
+
+@pytest.mark.django_db
+def test_write_behind_invalid_order_is_not_queued(order_form, order_queue):
+    client = Client()
+    order_form.pop("first_name")
+
+    response = client.post(
+        f"/{CURRENT_VERSION}/checkout/",
+        order_form,
+        content_type="application/json",
+    )
+
+    assert 422 == response.status_code
+    assert [] == spool_lines(order_queue)
+
+
+@pytest.mark.django_db
+def test_write_behind_writes_batches_and_truncates_spool(
+    order_form, order_queue
+):
+    client = Client()
+    ids = [
+        json.loads(
+            client.post(
+                f"/{CURRENT_VERSION}/checkout/",
+                order_form,
+                content_type="application/json",
+            ).content
+        )["id"]
+        for _ in range(3)
+    ]
+
+    assert 2 == order_queue.write_pending()
+    assert [ids[2]] == [
+        json.loads(line)["id"] for line in spool_lines(order_queue)
+    ]
+    assert 1 == order_queue.write_pending()
+    assert [] == spool_lines(order_queue)
+    assert [Statuses.PENDING.value] * 3 == list(
+        Orders.objects.filter(id__in=ids).values_list("status", flat=True)
+    )
+
+
+@pytest.mark.django_db
+def test_write_behind_failed_write_keeps_orders(
+    order_form, order_queue, monkeypatch
+):
+    order_queue.put(forms.OrderValidator(order_form).save(commit=False))
+    monkeypatch.setattr(
+        writebehind, "write_orders", mock.Mock(side_effect=RuntimeError)
+    )
+
+    with pytest.raises(RuntimeError):
+        order_queue.write_pending()
+
+    assert 1 == order_queue.pending.qsize()
+    assert 1 == len(spool_lines(order_queue))
+
+
+@pytest.mark.django_db
+def test_write_behind_close_flushes_pending_orders(order_form, order_queue):
+    order = forms.OrderValidator(order_form).save(commit=False)
+    order_queue.put(order)
+
+    order_queue.close()
+
+    assert Orders.objects.filter(id=order.id).exists()
+
+
+@pytest.mark.django_db
+def test_write_behind_compacted_spool_stays_locked(order_form, order_queue):
+    for _ in range(3):
+        order_queue.put(forms.OrderValidator(order_form).save(commit=False))
+    order_queue.write_pending()
+
+    assert 0 == writebehind.recover_spools(order_queue.spool_dir, 2)
+    assert 1 == len(spool_lines(order_queue))
+    assert [os.path.basename(order_queue.spool_path())] == os.listdir(
+        order_queue.spool_dir
+    )
+
+
+@pytest.mark.django_db
+def test_write_behind_recovers_spooled_orders(order_form, tmp_path):
+    orders = [
+        forms.OrderValidator(order_form).save(commit=False) for _ in range(2)
+    ]
+    orders[0].save()
+    spool = tmp_path / "orders-1.jsonl"
+    spool.write_bytes(
+        b"".join(writebehind.dump_order(order) for order in orders)
+        + b'{"id": "torn'
+    )
+
+    assert 2 == writebehind.recover_spools(str(tmp_path), 2)
+
+    assert 2 == Orders.objects.filter(id__in=[o.id for o in orders]).count()
+    assert not spool.exists()
+
+
+@pytest.mark.django_db
+def test_write_behind_recovery_skips_spools_in_use(order_form, tmp_path):
+    spool = tmp_path / "orders-1.jsonl"
+    order = forms.OrderValidator(order_form).save(commit=False)
+    spool.write_bytes(writebehind.dump_order(order))
+
+    with open(spool, "rb") as owner:
+        fcntl.flock(owner, fcntl.LOCK_EX)
+        recovered = writebehind.recover_spools(str(tmp_path), 2)
+
+    assert 0 == recovered
+    assert os.path.exists(spool)
+    assert not Orders.objects.filter(id=order.id).exists()
+
+
+def write_spool(order_form, path):
+    order = forms.OrderValidator(order_form).save(commit=False)
+    path.write_bytes(writebehind.dump_order(order))
+    return order
+
+
+@pytest.mark.django_db
+def test_write_behind_start_leaves_other_spools(order_form, tmp_path):
+    order = write_spool(order_form, tmp_path / "orders-1.jsonl")
+    queue = writebehind.OrderQueue(str(tmp_path), batch_size=2, interval=0)
+
+    queue.start()
+    queue.close()
+
+    assert not Orders.objects.filter(id=order.id).exists()
+
+
+@pytest.mark.django_db
+def test_replay_spools_writes_crashed_spools(order_form, settings, tmp_path):
+    settings.ORDER_SPOOL_DIR = str(tmp_path)
+    order = write_spool(order_form, tmp_path / "orders-1.jsonl")
+
+    assert 1 == writebehind.replay_spools()
+    assert Orders.objects.filter(id=order.id).exists()
+
+
+@pytest.mark.django_db
+def test_replay_order_spools_command(order_form, settings, tmp_path):
+    settings.ORDER_SPOOL_DIR = str(tmp_path)
+    order = write_spool(order_form, tmp_path / "orders-1.jsonl")
+    out = io.StringIO()
+
+    call_command("replay_order_spools", stdout=out)
+
+    assert "Replayed 1 spooled orders." in out.getvalue()
+    assert Orders.objects.filter(id=order.id).exists()
+
+
+def test_replay_order_spools_needs_a_spool_dir(settings):
+    settings.ORDER_SPOOL_DIR = None
+
+    with pytest.raises(CommandError):
+        call_command("replay_order_spools")
+
+
+def test_write_behind_spool_round_trips_orders():
+    order = Orders(
+        id=uuid.uuid4(),
+        time_placed=datetime(2020, 1, 1, 12, 30, 15, 123456),
+        first_name="John",
+        postal_code=2000,
+        print_id_id=1,
+        photo_id_id=10,
+        status=Statuses.PENDING.value,
+        billed_cents=2499,
+    )
+
+    (loaded,) = writebehind.load_orders([writebehind.dump_order(order)])
+
+    assert order.id == loaded.id
+    assert order.time_placed == loaded.time_placed
+    assert (1, 10, 2000) == (
+        loaded.print_id_id,
+        loaded.photo_id_id,
+        loaded.postal_code,
+    )
+
+
+def place_orders(order_form, count, **changes):
+    orders = []
+    for _ in range(count):
+        order = forms.OrderValidator(order_form).save(commit=False)
+        for name, value in changes.items():
+            setattr(order, name, value)
+        orders.append(order)
+    return Orders.objects.bulk_create(orders)
+
+
+def order_statuses(orders):
+    return list(
+        Orders.objects.filter(id__in=[order.id for order in orders])
+        .order_by("status")
+        .values_list("status", flat=True)
+    )
+
+
+@pytest.mark.django_db
+def test_fulfill_orders_moves_created_and_pending_orders(order_form):
+    orders = place_orders(order_form, 5) + place_orders(
+        order_form, 2, status=Statuses.PENDING.value
+    )
+
+    totals = fulfillment.fulfill_orders(
+        fulfillment.LocalBackend(), batch_size=2, concurrency=2
+    )
+
+    assert {Statuses.FULFILLED.value: 7} == totals
+    assert [Statuses.FULFILLED.value] * 7 == order_statuses(orders)
+
+
+@pytest.mark.django_db
+def test_fulfill_orders_records_rejections(order_form):
+    fulfilled = place_orders(order_form, 2)
+    rejected = place_orders(order_form, 3, country="XXX")
+
+    totals = fulfillment.fulfill_orders(
+        fulfillment.LocalBackend(rejected_countries=["XXX"]),
+        batch_size=10,
+        concurrency=1,
+    )
+
+    assert {"fulfilled": 2, "rejected": 3} == totals
+    assert [Statuses.REJECTED.value] * 3 == order_statuses(rejected)
+    assert [Statuses.FULFILLED.value] * 2 == order_statuses(fulfilled)
+
+
+@pytest.mark.django_db
+def test_fulfill_orders_leaves_unanswered_orders_pending(order_form):
+    orders = place_orders(order_form, 3)
+    backend = mock.Mock(spec=fulfillment.FulfillmentBackend)
+    backend.fulfill.return_value = {}
+
+    totals = fulfillment.fulfill_orders(backend, batch_size=2, concurrency=2)
+
+    assert not totals
+    assert [Statuses.PENDING.value] * 3 == order_statuses(orders)
+
+
+@pytest.mark.django_db
+def test_fulfill_orders_skips_finished_orders(order_form):
+    place_orders(order_form, 2, status=Statuses.REJECTED.value)
+    backend = mock.Mock(spec=fulfillment.FulfillmentBackend)
+
+    totals = fulfillment.fulfill_orders(backend, batch_size=2, concurrency=2)
+
+    assert not totals
+    backend.fulfill.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_fulfill_orders_query_count_does_not_grow_with_orders(order_form):
+    def count_queries(orders):
+        place_orders(order_form, orders)
+        with CaptureQueriesContext(connection) as queries:
+            fulfillment.fulfill_orders(
+                fulfillment.LocalBackend(), batch_size=100, concurrency=1
+            )
+        return len(queries)
+
+    assert count_queries(5) == count_queries(50)
+
+
+@pytest.mark.django_db
+def test_claimed_orders_are_not_claimed_by_another_worker(order_form):
+    place_orders(order_form, 3)
+    place_orders(order_form, 2, status=Statuses.PENDING.value)
+
+    first = fulfillment.claim_batches(count=2, batch_size=10)
+    second = fulfillment.claim_batches(count=2, batch_size=10)
+
+    assert [2, 3] == [len(batch) for batch in first]
+    assert [] == second
+
+
+@pytest.mark.django_db
+def test_claim_keeps_only_the_orders_it_updated(order_form):
+    place_orders(order_form, 4)
+    now = timezone.now()
+    candidates = list(
+        fulfillment.claimable_orders(Statuses.CREATED.value, now=now)
+    )
+    taken = fulfillment.claim(candidates[:2], now)
+
+    batch = fulfillment.claim(candidates, now)
+
+    assert {order.id for order in candidates[2:]} == {o.id for o in batch}
+    assert not {order.id for order in taken} & {o.id for o in batch}
+
+
+@pytest.mark.django_db
+def test_expired_leases_are_claimed_again(order_form, settings):
+    settings.FULFILLMENT_LEASE = -1
+    orders = place_orders(order_form, 2)
+    (lapsed,) = fulfillment.claim_batches(count=1, batch_size=10)
+
+    (batch,) = fulfillment.claim_batches(count=1, batch_size=10)
+    finished = fulfillment.record_outcomes(
+        lapsed, {order.id: Statuses.REJECTED.value for order in lapsed}
+    )
+
+    assert {order.id for order in orders} == {order.id for order in batch}
+    assert [] == finished
+    assert [Statuses.PENDING.value] * 2 == order_statuses(orders)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("status", fulfillment.CLAIMABLE)
+def test_claimable_orders_use_status_index(status):
+    orders = fulfillment.claimable_orders(
+        status, (timezone.now(), uuid.uuid4())
+    )
+
+    assert "orders_status_placed (status=? AND time_placed>?)" in (
+        orders.explain()
+    )
+
+
+@pytest.mark.django_db
+def test_fulfill_orders_command_reports_totals(order_form, settings):
+    settings.FULFILLMENT_BACKEND = "checkout.fulfillment.LocalBackend"
+    place_orders(order_form, 3)
+    output = io.StringIO()
+
+    call_command("fulfill_orders", "--batch-size", "2", stdout=output)
+
+    assert "Fulfilled 3 and rejected 0 orders" in output.getvalue()
+
+
+def post_order(order_form):
+    response = Client().post(
+        f"/{CURRENT_VERSION}/checkout/",
+        order_form,
+        content_type="application/json",
+    )
+    return json.loads(response.content)
+
+
+@pytest.mark.django_db
+def test_order_status_returns_checkout_details(order_form):
+    client = Client()
+    expected = post_order(order_form)
+
+    response = client.get(f"/{CURRENT_VERSION}/checkout/{expected['id']}")
+
+    assert 200 == response.status_code
+    assert expected == json.loads(response.content)
+
+
+@pytest.mark.django_db
+def test_order_status_reads_order_in_one_query(
+    order_form, django_assert_num_queries
+):
+    client = Client()
+    order_id = post_order(order_form)["id"]
+
+    with django_assert_num_queries(1):
+        client.get(f"/{CURRENT_VERSION}/checkout/{order_id}")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("status", data.FINAL_STATUSES)
+def test_order_status_caches_finished_orders(
+    order_form, status, django_assert_num_queries
+):
+    client = Client()
+    order_id = post_order(order_form)["id"]
+    Orders.objects.filter(id=order_id).update(status=status)
+    client.get(f"/{CURRENT_VERSION}/checkout/{order_id}")
+
+    with django_assert_num_queries(0):
+        response = client.get(f"/{CURRENT_VERSION}/checkout/{order_id}")
+
+    assert status == json.loads(response.content)["status"]
+
+
+@pytest.mark.django_db
+def test_order_status_does_not_cache_open_orders(order_form):
+    client = Client()
+    order_id = post_order(order_form)["id"]
+    client.get(f"/{CURRENT_VERSION}/checkout/{order_id}")
+    Orders.objects.filter(id=order_id).update(status=Statuses.FULFILLED.value)
+
+    response = client.get(f"/{CURRENT_VERSION}/checkout/{order_id}")
+
+    assert Statuses.FULFILLED.value == json.loads(response.content)["status"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("order_id", [uuid.uuid4(), "not-a-uuid"])
+def test_order_status_unknown_order_returns_404(order_id):
+    client = Client()
+    expected = 404
+
+    response = client.get(f"/{CURRENT_VERSION}/checkout/{order_id}")
+
+    assert expected == response.status_code
+
+
+def test_order_status_rejects_post():
+    client = Client()
+    expected = 405
+
+    response = client.post(f"/{CURRENT_VERSION}/checkout/{uuid.uuid4()}")
+
+    assert expected == response.status_code
+
+
+ORDERS_TOKEN = "orders-token"
+
+
+def list_orders(**params):
+    with override_settings(ORDERS_API_TOKEN=ORDERS_TOKEN):
+        response = Client().get(
+            f"/{CURRENT_VERSION}/checkout/orders",
+            params,
+            HTTP_AUTHORIZATION=f"Bearer {ORDERS_TOKEN}",
+        )
+    return response.status_code, json.loads(response.content)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "token,authorization,status",
+    [
+        (None, f"Bearer {ORDERS_TOKEN}", 403),
+        (ORDERS_TOKEN, None, 401),
+        (ORDERS_TOKEN, "Bearer wrong", 401),
+        (ORDERS_TOKEN, f"Basic {ORDERS_TOKEN}", 401),
+        (ORDERS_TOKEN, f"Bearer {ORDERS_TOKEN}", 200),
+    ],
+)
+def test_list_orders_requires_the_api_token(
+    settings, token, authorization, status
+):
+    settings.ORDERS_API_TOKEN = token
+    headers = {"HTTP_AUTHORIZATION": authorization} if authorization else {}
+
+    response = Client().get(f"/{CURRENT_VERSION}/checkout/orders", **headers)
+
+    assert status == response.status_code
+
+
+@pytest.fixture
+def order_history(order_form):
+    start = timezone.now().replace(microsecond=0)
+    orders = []
+    for i, email in enumerate(["a@example.com", "b@example.com"] * 3):
+        orders += place_orders(
+            order_form,
+            1,
+            email=email,
+            time_placed=start + timedelta(hours=i),
+            status=Statuses.FULFILLED.value if i % 3 else "created",
+        )
+    return orders
+
+
+@pytest.mark.django_db
+def test_list_orders_returns_newest_first(order_history):
+    expected = [str(order.id) for order in reversed(order_history)]
+
+    status, page = list_orders()
+
+    assert 200 == status
+    assert expected == [order["id"] for order in page["results"]]
+    assert not page["has_more"]
+
+
+@pytest.mark.django_db
+def test_list_orders_filters_by_email_and_status(order_history):
+    expected = [
+        str(order.id)
+        for order in reversed(order_history)
+        if order.email == "a@example.com"
+        and order.status == Statuses.FULFILLED.value
+    ]
+
+    _, page = list_orders(email="a@example.com", status="fulfilled")
+
+    assert expected == [order["id"] for order in page["results"]]
+
+
+@pytest.mark.django_db
+def test_list_orders_filters_by_half_open_time_range(order_history):
+    expected = [str(order.id) for order in reversed(order_history[1:4])]
+
+    _, page = list_orders(
+        placed_after=order_history[1].time_placed.isoformat(),
+        placed_before=order_history[4].time_placed.isoformat(),
+    )
+
+    assert expected == [order["id"] for order in page["results"]]
+
+
+@pytest.mark.django_db
+def test_list_orders_cursor_pages_through_equal_times(order_form):
+    orders = place_orders(order_form, 5, time_placed=timezone.now())
+    expected = sorted(str(order.id) for order in orders)
+    seen = []
+    params = {"page_size": 2}
+
+    while True:
+        _, page = list_orders(**params)
+        seen += [order["id"] for order in page["results"]]
+        if not page["has_more"]:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert expected == sorted(seen)
+    assert len(expected) == len(seen)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "params,index",
+    [
+        ({}, "orders_placed (time_placed<?)"),
+        ({"email": "a@example.com"}, "(email=? AND time_placed<?)"),
+        ({"status": "created"}, "(status=? AND time_placed<?)"),
+    ],
+)
+def test_query_orders_cursor_seeks_the_index(order_history, params, index):
+    cursor = data.encode_orders_cursor(order_history[2])
+
+    with CaptureQueriesContext(connection) as captured:
+        data.query_orders(dict(params, cursor=cursor))
+    with connection.cursor() as plan:
+        plan.execute("EXPLAIN QUERY PLAN " + captured[0]["sql"])
+        plan = " ".join(row[-1] for row in plan.fetchall())
+
+    assert index in plan
+
+
+@pytest.mark.django_db
+def test_list_orders_reads_a_page_in_one_query(
+    order_history, django_assert_num_queries
+):
+    prices.price_table()
+
+    with django_assert_num_queries(1):
+        list_orders(page_size=3)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "filters,index",
+    [
+        ({}, "orders_placed"),
+        ({"email": "a@example.com"}, "orders_email_placed"),
+        ({"status": "created"}, "orders_status_placed"),
+        ({"placed_after": timezone.now()}, "orders_placed"),
+    ],
+)
+def test_filter_orders_uses_index(filters, index):
+    orders = data.filter_orders(
+        Orders.objects.order_by("-time_placed", "-id"), filters
+    )
+
+    assert index in orders.explain()
+
+
+@pytest.mark.parametrize(
+    "params,field",
+    [
+        ({"status": "lost"}, "status"),
+        ({"placed_after": "yesterday"}, "placed_after"),
+        ({"placed_before": "2020-13-01"}, "placed_before"),
+        ({"page_size": "0"}, "page_size"),
+        ({"cursor": "bad"}, "cursor"),
+    ],
+)
+def test_list_orders_invalid_params_return_400(params, field):
+    status, errors = list_orders(**params)
+
+    assert 400 == status
+    assert field in errors
+
+
+def sales_rollup():
+    return {
+        (row.day, row.size, row.country): (row.orders, row.revenue_cents)
+        for row in DailySales.objects.filter(orders__gt=0)
+    }
+
+
+def recounted_sales():
+    buckets = defaultdict(lambda: [0, 0])
+    sales.count_sales(Orders.objects.all(), buckets)
+    return {bucket: tuple(totals) for bucket, totals in buckets.items()}
+
+
+@pytest.mark.django_db
+def test_sales_rollup_counts_single_and_batch_checkouts(order_form):
+    client = Client()
+    client.post(
+        f"/{CURRENT_VERSION}/checkout/",
+        order_form,
+        content_type="application/json",
+    )
+    client.post(
+        f"/{CURRENT_VERSION}/checkout/batch",
+        [order_form, dict(order_form, print_id=2, country="USA")],
+        content_type="application/json",
+    )
+    price = prices.price_table().prices[1]
+    today = timezone.localdate()
+
+    rollup = sales_rollup()
+
+    assert (2, 2 * price.total_cents) == rollup[(today, price.size, "AUS")]
+    assert recounted_sales() == rollup
+
+
+@pytest.mark.django_db
+def test_sales_rollup_follows_status_changes_and_deletes(order_form):
+    order = forms.OrderValidator(order_form).save()
+    assert recounted_sales() == sales_rollup()
+
+    order.status = Statuses.REJECTED.value
+    order.save()
+    assert {} == sales_rollup()
+
+    order.status = Statuses.FULFILLED.value
+    order.country = "USA"
+    order.save()
+    assert recounted_sales() == sales_rollup()
+
+    order.delete()
+    assert {} == sales_rollup()
+
+
+@pytest.mark.django_db
+def test_sales_rollup_drops_orders_rejected_by_fulfillment(order_form):
+    client = Client()
+    for country in ["AUS", "XXX", "XXX"]:
+        client.post(
+            f"/{CURRENT_VERSION}/checkout/",
+            dict(order_form, country=country),
+            content_type="application/json",
+        )
+
+    fulfillment.fulfill_orders(
+        fulfillment.LocalBackend(rejected_countries=["XXX"]),
+        batch_size=10,
+        concurrency=1,
+    )
+
+    assert recounted_sales() == sales_rollup()
+    assert {"AUS"} == {country for _, _, country in sales_rollup()}
+
+
+@pytest.mark.django_db
+def test_sales_rollup_counts_write_behind_orders_once(order_form, order_queue):
+    order = forms.OrderValidator(order_form).save(commit=False)
+
+    writebehind.write_orders([order])
+    writebehind.write_orders([order])
+
+    assert recounted_sales() == sales_rollup()
+    assert [(1, mock.ANY)] == list(sales_rollup().values())
+
+
+@pytest.mark.django_db
+def test_sales_rollup_keeps_billed_prices_after_price_changes(order_form):
+    order = forms.OrderValidator(order_form).save()
+    billed = order.billed_cents
+    row = Prints.objects.get(id=order.print_id_id)
+    row.print_cost += 5
+    row.save()
+    kept = forms.OrderValidator(order_form).save()
+
+    order.status = Statuses.REJECTED.value
+    order.save()
+
+    assert {(1, kept.billed_cents)} == set(sales_rollup().values())
+    assert kept.billed_cents == billed + 500
+    assert recounted_sales() == sales_rollup()
+
+
+@pytest.mark.django_db
+def test_rebuild_sales_rollup_command_matches_incremental_counts(order_form,):
+    now = timezone.now()
+    for days in [0, 1, 45, 90]:
+        place_orders(order_form, 2, time_placed=now - timedelta(days=days))
+    place_orders(order_form, 1, status=Statuses.REJECTED.value)
+    expected = recounted_sales()
+    DailySales.objects.all().delete()
+
+    call_command("rebuild_sales_rollup", "--days", "7", stdout=io.StringIO())
+
+    assert expected == sales_rollup()
+    assert 4 == len(expected)
+
+
+def sales_stats(**params):
+    with override_settings(ORDERS_API_TOKEN=ORDERS_TOKEN):
+        response = Client().get(
+            f"/{CURRENT_VERSION}/checkout/stats",
+            params,
+            HTTP_AUTHORIZATION=f"Bearer {ORDERS_TOKEN}",
+        )
+    return response.status_code, json.loads(response.content)
+
+
+@pytest.mark.parametrize("token,status", [(None, 403), (ORDERS_TOKEN, 401)])
+def test_sales_stats_requires_the_api_token(settings, token, status):
+    settings.ORDERS_API_TOKEN = token
+
+    response = Client().get(f"/{CURRENT_VERSION}/checkout/stats")
+
+    assert status == response.status_code
+
+
+@pytest.mark.django_db
+def test_sales_stats_returns_rollup_rows_in_range(order_form):
+    now = timezone.now()
+    for days in [0, 1, 2, 40]:
+        place_orders(order_form, 1, time_placed=now - timedelta(days=days))
+    sales.rebuild_sales()
+    price = prices.price_table().prices[order_form["print_id"]]
+    today = timezone.localdate()
+
+    status, stats = sales_stats(
+        since=(today - timedelta(days=1)).isoformat(), until=today.isoformat()
+    )
+
+    assert 200 == status
+    assert 2 == stats["orders"]
+    assert 2 * price.total_cents / 100 == stats["revenue"]
+    assert [
+        {
+            "day": day.isoformat(),
+            "size": price.size,
+            "country": order_form["country"],
+            "orders": 1,
+            "revenue": price.total_cents / 100,
+        }
+        for day in [today - timedelta(days=1), today]
+    ] == stats["results"]
+
+
+@pytest.mark.django_db
+def test_sales_stats_defaults_to_last_30_days(order_form):
+    now = timezone.now()
+    for days in [0, 29, 30]:
+        place_orders(order_form, 1, time_placed=now - timedelta(days=days))
+    sales.rebuild_sales()
+
+    _, stats = sales_stats()
+
+    assert 2 == stats["orders"]
+
+
+@pytest.mark.django_db
+def test_sales_stats_filters_by_size_and_country(order_form):
+    place_orders(order_form, 1)
+    place_orders(order_form, 1, country="USA")
+    place_orders(order_form, 1, print_id_id=2)
+    sales.rebuild_sales()
+    size = prices.price_table().prices[1].size
+
+    _, stats = sales_stats(size=size, country="USA")
+
+    assert 1 == stats["orders"]
+
+
+@pytest.mark.django_db
+def test_sales_stats_reads_rollup_in_one_query(django_assert_num_queries):
+    with django_assert_num_queries(1):
+        sales_stats()
+
+
+@pytest.mark.parametrize(
+    "params,field",
+    [
+        ({"since": "yesterday"}, "since"),
+        ({"until": "2020-02-30"}, "until"),
+        ({"since": "2020-02-02", "until": "2020-02-01"}, "since"),
+        ({"since": "2018-12-31", "until": "2020-01-01"}, "since"),
+    ],
+)
+def test_sales_stats_invalid_params_return_400(params, field):
+    status, errors = sales_stats(**params)
+
+    assert 400 == status
+    assert field in errors
+
+
+@pytest.mark.django_db
+def test_export_orders_walks_equal_times_in_chunks(order_form, tmp_path):
+    now = timezone.now()
+    older = place_orders(order_form, 2, time_placed=now - timedelta(days=1))
+    newer = place_orders(order_form, 5, time_placed=now)
+    output = tmp_path / "orders.jsonl"
+    report = io.StringIO()
+
+    call_command(
+        "export_orders",
+        str(output),
+        "--chunk-size",
+        "2",
+        "--since-time",
+        older[0].time_placed.isoformat(),
+        stdout=report,
+    )
+
+    with open(output) as export:
+        rows = [json.loads(line) for line in export]
+    assert sorted(str(order.id) for order in newer) == sorted(
+        row["id"] for row in rows
+    )
+    assert list(data.EXPORT_FIELDS) == list(rows[0])
+    assert now.isoformat() == rows[-1]["time_placed"]
+    last = f"time {now.isoformat()} and id {rows[-1]['id']}"
+    assert f"Exported 5 rows up to {last}." in report.getvalue()
+
+
+@pytest.mark.django_db
+def test_export_orders_resumes_within_equal_times(order_form, tmp_path):
+    now = timezone.now()
+    orders = place_orders(order_form, 5, time_placed=now)
+    first = list(data.export_order_chunks(None, 2))[0]
+    output = tmp_path / "orders.jsonl"
+
+    call_command(
+        "export_orders",
+        str(output),
+        "--since-time",
+        now.isoformat(),
+        "--since-id",
+        str(first[-1][0]),
+        stdout=io.StringIO(),
+    )
+
+    with open(output) as export:
+        rows = [json.loads(line) for line in export]
+    exported = {str(row[0]) for row in first}
+    assert sorted(
+        str(order.id) for order in orders if str(order.id) not in exported
+    ) == sorted(row["id"] for row in rows)
+
+
+def test_export_orders_since_id_needs_since_time(tmp_path):
+    output = tmp_path / "orders.jsonl"
+
+    with pytest.raises(CommandError):
+        call_command(
+            "export_orders", str(output), "--since-id", str(uuid.uuid4())
+        )
+
+
+@pytest.mark.django_db
+def test_export_order_chunks_seek_the_time_index(order_form):
+    place_orders(order_form, 3)
+
+    with CaptureQueriesContext(connection) as captured:
+        list(data.export_order_chunks(None, 2))
+    with connection.cursor() as plan:
+        plan.execute("EXPLAIN QUERY PLAN " + captured[-1]["sql"])
+        plan = " ".join(row[-1] for row in plan.fetchall())
+
+    assert "orders_placed (time_placed>?)" in plan
+
+
+@pytest.mark.django_db
+def test_export_orders_writes_gzipped_csv(order_form, tmp_path):
+    orders = place_orders(order_form, 3)
+    output = tmp_path / "orders.csv.gz"
+
+    call_command("export_orders", str(output), stdout=io.StringIO())
+
+    with gzip.open(output, "rt", newline="") as export:
+        rows = list(csv.DictReader(export))
+    assert sorted(str(order.id) for order in orders) == sorted(
+        row["id"] for row in rows
+    )
+    assert {str(order_form["photo_id"])} == {row["photo_id"] for row in rows}
+
+
+def test_export_orders_invalid_since_time_raises(tmp_path):
+    output = tmp_path / "orders.jsonl"
+
+    with pytest.raises(CommandError):
+        call_command("export_orders", str(output), "--since-time", "yesterday")
+
+    assert not output.exists()
+
+
+def test_checkout_within_budget(budget, large_catalog, order_form):
+    client = Client()
+    url = f"/{CURRENT_VERSION}/checkout/"
+    client.post(url, order_form, content_type="application/json")
+
+    with budget("checkout"):
+        response = client.post(
+            url, order_form, content_type="application/json"
+        )
+
+    assert 201 == response.status_code
+
+
+def test_checkout_batch_within_budget(budget, large_catalog, order_form):
+    client = Client()
+    url = f"/{CURRENT_VERSION}/checkout/batch"
+    orders = [
+        dict(order_form, photo_id=photo_id, print_id=photo_id % 3 + 1)
+        for photo_id in range(1, 101)
+    ]
+    client.post(url, orders[:1], content_type="application/json")
+
+    with budget("checkout-batch"):
+        response = client.post(url, orders, content_type="application/json")
+
+    results = json.loads(response.content)["results"]
+    assert 100 == sum(result["status"] == 201 for result in results)
+
+
+def test_list_sizes_within_budget(budget, large_catalog):
+    client = Client()
+    url = f"/{CURRENT_VERSION}/checkout/print-sizes"
+    client.get(url)
+
+    with budget("print-sizes"):
+        response = client.get(url)
+
+    assert 200 == response.status_code
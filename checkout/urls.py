@@ -4,5 +4,9 @@ from . import views
 
 urlpatterns = [
     path("", views.purchase_print, name="purchase-print"),
+    path("batch", views.purchase_prints, name="purchase-prints"),
     path("print-sizes", views.list_sizes, name="list-sizes"),
+    path("orders", views.list_orders, name="list-orders"),
+    path("stats", views.sales_stats, name="sales-stats"),
+    path("<uuid:order_id>", views.order_status, name="order-status"),
 ]
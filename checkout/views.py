@@ -1,22 +1,133 @@
+import hmac
 import json
+from functools import wraps
 
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import etag, require_GET, require_POST
 
-from . import data
-from .forms import OrderForm
-from .models import Prints
+from photocatalog import executors, metrics, versions
+
+from . import data, prices, sales, writebehind
+from .forms import OrderValidator
 
 
 def purchase_print(request):
     if request.content_type != "application/json":
         return HttpResponse(status=415)
-    form = OrderForm(json.loads(request.body))
+    form = OrderValidator(json.loads(request.body))
+    status, details = place_order(form)
+    with metrics.serializing():
+        return JsonResponse(status=status, data=details)
+
+
+def place_order(form):
     if not form.is_valid():
-        return JsonResponse(status=422, data=form.errors)
-    details = data.process_order(form)
-    return JsonResponse(status=201, data=details)
+        return 422, form.errors
+    if writebehind.enabled():
+        return 202, writebehind.accept_order(form)
+    return 201, data.process_order(form)
+
+
+async def purchase_print_async(request):
+    if request.content_type != "application/json":
+        return HttpResponse(status=415)
+    form = OrderValidator(json.loads(request.body))
+    status, details = await executors.run_in_db_executor(place_order, form)
+    return JsonResponse(status=status, data=details)
+
+
+@require_POST
+def purchase_prints(request):
+    if request.content_type != "application/json":
+        return HttpResponse(status=415)
+    orders = json.loads(request.body)
+    if not isinstance(orders, list):
+        return JsonResponse(
+            status=422, data={"orders": ["Expected a list of orders."]}
+        )
+    if len(orders) > data.MAX_BATCH_SIZE:
+        return JsonResponse(
+            status=422,
+            data={
+                "orders": [
+                    f"Ensure this list has at most {data.MAX_BATCH_SIZE} "
+                    f"orders (it has {len(orders)})."
+                ]
+            },
+        )
+    results = data.process_orders(orders)
+    return JsonResponse(status=200, data={"results": results})
+
 
+def require_orders_token(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = settings.ORDERS_API_TOKEN
+        if not token:
+            return HttpResponse(status=403)
+        authorization = request.headers.get("Authorization", "")
+        scheme, _, given = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(
+            given.encode(), token.encode()
+        ):
+            response = HttpResponse(status=401)
+            response["WWW-Authenticate"] = "Bearer"
+            return response
+        return view(request, *args, **kwargs)
 
+    return wrapper
+
+
+@require_GET
+@require_orders_token
+def list_orders(request):
+    try:
+        orders = data.query_orders(request.GET)
+    except ValidationError as error:
+        return JsonResponse(status=400, data=error.message_dict)
+    return JsonResponse(status=200, data=orders)
+
+
+@require_GET
+@require_orders_token
+def sales_stats(request):
+    try:
+        stats = sales.query_sales(request.GET)
+    except ValidationError as error:
+        return JsonResponse(status=400, data=error.message_dict)
+    return JsonResponse(status=200, data=stats)
+
+
+@require_GET
+def order_status(request, order_id):
+    details = data.lookup_order(order_id)
+    if details is None:
+        return HttpResponse(status=404)
+    return JsonResponse(status=200, data=details)
+
+
+def prints_etag(request):
+    return prices.prints_etag()
+
+
+@etag(prints_etag)
 def list_sizes(request):
-    available_sizes = {row.id: row.size for row in Prints.objects.all()}
+    available_sizes = dict(prices.price_table().sizes)
     return JsonResponse(status=200, data=available_sizes)
+
+
+async def list_sizes_async(request):
+    tag, table = await executors.run_lookup(
+        versions.is_shared(), prices.cached_price_table
+    )
+    response = get_conditional_response(request, etag=tag)
+    if response is not None:
+        return response
+    if table is None:
+        table = await executors.run_in_db_executor(prices.price_table)
+    response = JsonResponse(status=200, data=dict(table.sizes))
+    response["ETag"] = tag
+    return response
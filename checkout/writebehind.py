@@ -0,0 +1,264 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .data import BULK_BATCH_SIZE, order_details
+from .models import Orders, Statuses
+from .prices import price_table
+from .sales import record_sales
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PATTERN = "orders-*.jsonl"
+
+
+def enabled() -> bool:
+    return bool(settings.ORDER_SPOOL_DIR)
+
+
+def dump_order(order: Orders) -> bytes:
+    fields = {
+        field.attname: getattr(order, field.attname)
+        for field in Orders._meta.concrete_fields
+    }
+    return json.dumps(fields, default=str).encode() + b"\n"
+
+
+def load_orders(lines: Iterable[bytes]) -> List[Orders]:
+    orders = []
+    for line in lines:
+        try:
+            fields = json.loads(line)
+        except ValueError:
+            # Only the last line can be torn by a crash, and the client was
+            # never told that order had been accepted.
+            continue
+        order = Orders(
+            **{
+                field.attname: field.to_python(fields[field.attname])
+                for field in Orders._meta.concrete_fields
+                # Spools written before a field was added leave it at its
+                # default.
+                if field.attname in fields
+            }
+        )
+        if order.billed_cents is None:
+            prices = price_table().prices
+            order.billed_cents = prices[order.print_id_id].total_cents
+        orders.append(order)
+    return orders
+
+
+def write_orders(orders: List[Orders]) -> None:
+    # Spooled orders may already have been written before a crash, so
+    # replaying them must neither fail on their primary keys nor count
+    # their sales twice.
+    with transaction.atomic():
+        written = set(
+            Orders.objects.filter(
+                id__in=[order.id for order in orders]
+            ).values_list("id", flat=True)
+        )
+        orders = [order for order in orders if order.id not in written]
+        Orders.objects.bulk_create(orders, batch_size=BULK_BATCH_SIZE)
+        record_sales(orders)
+
+
+def same_file(spool: BinaryIO, path: str) -> bool:
+    try:
+        current = os.stat(path)
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(spool.fileno())
+    return (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino)
+
+
+def recover_spools(spool_dir: str, batch_size: int) -> int:
+    recovered = 0
+    pattern = os.path.join(spool_dir, SPOOL_PATTERN)
+    for path in sorted(glob.glob(pattern)):
+        try:
+            spool = open(path, "rb")
+        except FileNotFoundError:
+            continue
+        with spool:
+            try:
+                fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # The spool belongs to a worker process that is running.
+                continue
+            if not same_file(spool, path):
+                # The owner compacted it and unlocked the old copy.
+                continue
+            orders = load_orders(spool)
+            for start in range(0, len(orders), batch_size):
+                end = start + batch_size
+                write_orders(orders[start:end])
+            os.remove(path)
+        recovered += len(orders)
+    return recovered
+
+
+def replay_spools() -> int:
+    # Run when a worker process starts, before it opens its own spool, so
+    # orders left by a crashed process are written before any request.
+    if not enabled():
+        return 0
+    try:
+        return recover_spools(
+            settings.ORDER_SPOOL_DIR, settings.ORDER_WRITE_BATCH_SIZE
+        )
+    except Exception:
+        # The spools stay in place for the next start or replay_order_spools.
+        logger.exception("Replaying order spools failed.")
+        return 0
+
+
+class OrderQueue:
+    def __init__(self, spool_dir: str, batch_size: int, interval: float):
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending: "queue.Queue[Orders]" = queue.Queue()
+        # The spool lines of accepted orders not yet in the database.
+        self.unwritten: Dict[Any, bytes] = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.spool: Optional[BinaryIO] = None
+        self.writer: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.open_spool()
+        self.writer = threading.Thread(
+            target=self.run, name="order-writer", daemon=True
+        )
+        self.writer.start()
+        atexit.register(self.close)
+
+    def spool_path(self) -> str:
+        return os.path.join(self.spool_dir, f"orders-{os.getpid()}.jsonl")
+
+    def open_spool(self) -> None:
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.spool = open(self.spool_path(), "ab")
+        fcntl.flock(self.spool, fcntl.LOCK_EX)
+
+    def compact_spool(self) -> None:
+        # Called with the lock held. The replacement is locked and synced
+        # before it takes the spool's name, so recovery never sees it
+        # unlocked or missing orders.
+        path = self.spool_path()
+        staging = path + ".compact"
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND
+        compacted = os.fdopen(os.open(staging, flags, 0o666), "ab")
+        fcntl.flock(compacted, fcntl.LOCK_EX)
+        compacted.write(b"".join(self.unwritten.values()))
+        compacted.flush()
+        os.fsync(compacted.fileno())
+        os.replace(staging, path)
+        directory = os.open(self.spool_dir, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self.spool.close()
+        self.spool = compacted
+
+    def put(self, order: Orders) -> None:
+        line = dump_order(order)
+        with self.lock:
+            self.spool.write(line)
+            self.spool.flush()
+            os.fsync(self.spool.fileno())
+            self.unwritten[order.id] = line
+        self.pending.put(order)
+
+    def take_batch(self, timeout: float) -> List[Orders]:
+        try:
+            batch = [self.pending.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def write_pending(self, timeout: float = 0) -> int:
+        batch = self.take_batch(timeout)
+        if not batch:
+            return 0
+        try:
+            write_orders(batch)
+        except Exception:
+            for order in batch:
+                self.pending.put(order)
+            raise
+        with self.lock:
+            for order in batch:
+                self.unwritten.pop(order.id, None)
+            if self.unwritten:
+                # Under sustained load the queue never drains, so drop the
+                # written orders' lines rather than wait to truncate.
+                self.compact_spool()
+            else:
+                self.spool.truncate(0)
+        return len(batch)
+
+    def run(self) -> None:
+        try:
+            while not self.stopping.is_set():
+                try:
+                    self.write_pending(self.interval)
+                except Exception:
+                    logger.exception("Writing pending orders failed.")
+                    self.stopping.wait(self.interval)
+        finally:
+            connection.close()
+
+    def close(self) -> None:
+        self.stopping.set()
+        if self.writer is not None:
+            self.writer.join()
+        try:
+            while self.write_pending():
+                pass
+        except Exception:
+            # The spool keeps the orders for the next process to recover.
+            logger.exception("Flushing pending orders failed.")
+        if self.spool is not None:
+            self.spool.close()
+
+
+_order_queue: Optional[OrderQueue] = None
+_order_queue_lock = threading.Lock()
+
+
+def order_queue() -> OrderQueue:
+    global _order_queue
+    with _order_queue_lock:
+        if _order_queue is None:
+            _order_queue = OrderQueue(
+                settings.ORDER_SPOOL_DIR,
+                settings.ORDER_WRITE_BATCH_SIZE,
+                settings.ORDER_WRITE_INTERVAL,
+            )
+            _order_queue.start()
+    return _order_queue
+
+
+def accept_order(form) -> Dict[str, Any]:
+    order = form.save(commit=False)
+    order.status = Statuses.PENDING.value
+    order_queue().put(order)
+    return order_details(order)
@@ -1,6 +1,29 @@
+import difflib
+import json
+import os
+import time
+from contextlib import contextmanager
+from textwrap import shorten
 from typing import Dict
 
 import pytest
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+BUDGETS_FILE = os.path.join(os.path.dirname(__file__), "budgets.json")
+# Scales every time budget, for machines slower than the ones they were
+# measured on. Query budgets are exact and never scaled.
+BUDGET_TIME_FACTOR = float(os.environ.get("BUDGET_TIME_FACTOR", 1))
+LARGE_CATALOG_SIZE = 5000
+QUERY_REPORT_WIDTH = 160
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
 
 
 @pytest.fixture
@@ -21,3 +44,72 @@ def order_form(**kwargs) -> Dict:
     }
     body.update(kwargs)
     return body
+
+
+@pytest.fixture(scope="session")
+def budgets() -> Dict[str, Dict[str, float]]:
+    with open(BUDGETS_FILE) as source:
+        return json.load(source)
+
+
+def budget_report(name, allowed, actual, queries) -> str:
+    diff = difflib.unified_diff(
+        json.dumps(allowed, indent=2).splitlines(),
+        json.dumps(actual, indent=2).splitlines(),
+        f"budgets.json [{name}]",
+        "measured",
+        lineterm="",
+    )
+    lines = [f"{name} is over budget:", *diff, "Queries:"]
+    lines += [
+        f"{number:4}. {shorten(sql, QUERY_REPORT_WIDTH, placeholder=' ...')}"
+        for number, sql in enumerate(queries, 1)
+    ]
+    return "\n".join(lines)
+
+
+@pytest.fixture
+def budget(budgets):
+    @contextmanager
+    def check(name):
+        allowed = dict(budgets[name])
+        allowed["milliseconds"] *= BUDGET_TIME_FACTOR
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - start
+        # Savepoints only appear because every test runs in a transaction.
+        queries = [
+            query["sql"]
+            for query in captured
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        actual = {
+            "queries": len(queries),
+            "milliseconds": round(elapsed * 1000, 1),
+        }
+        if any(actual[key] > allowed[key] for key in allowed):
+            pytest.fail(
+                budget_report(name, allowed, actual, queries), pytrace=False
+            )
+
+    return check
+
+
+@pytest.fixture
+def large_catalog(db):
+    from photos.models import Catalog
+
+    Catalog.objects.bulk_create(
+        (
+            Catalog(
+                title=f"Photo {number}",
+                location=("Paris", "Tokyo", "Lima", None)[number % 4],
+                year=1900 + number % 120,
+                path=f"large/{number}.jpg",
+            )
+            for number in range(LARGE_CATALOG_SIZE)
+        ),
+        batch_size=1000,
+    )
+    return Catalog.objects.count()
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class PhotocatalogConfig(AppConfig):
+    name = "photocatalog"
+
+    def ready(self):
+        from .db import apply_sqlite_pragmas
+        from .metrics import install_query_recorder
+
+        connection_created.connect(apply_sqlite_pragmas)
+        connection_created.connect(install_query_recorder)
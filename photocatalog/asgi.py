@@ -2,6 +2,8 @@
 ASGI config for photocatalog project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Catalog and checkout requests are served by native async views, see
+``photocatalog.urls_async``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -11,6 +13,10 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "photocatalog.settings")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "photocatalog.settings_asgi")
 
 application = get_asgi_application()
+
+from checkout import writebehind  # noqa: E402 isort:skip
+
+writebehind.replay_spools()
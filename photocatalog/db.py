@@ -0,0 +1,52 @@
+import os
+import sqlite3
+from typing import Dict, Optional, Union
+
+from django.conf import settings
+from django.db import connections
+
+from .routers import PRIMARY
+
+
+def apply_sqlite_pragmas(
+    sender,
+    connection,
+    pragmas: Optional[Dict[str, Union[int, str]]] = None,
+    **kwargs,
+) -> None:
+    if connection.vendor != "sqlite":
+        return
+    if pragmas is None:
+        pragmas = settings.SQLITE_PRAGMAS
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def replica_generation() -> str:
+    # Identifies the replica file in place, so anything cached from it can
+    # be told apart from what is cached after the next refresh replaces it.
+    if not settings.CATALOG_REPLICA:
+        return "0"
+    try:
+        stat = os.stat(settings.CATALOG_REPLICA)
+    except FileNotFoundError:
+        return "0"
+    return f"{stat.st_ino}.{stat.st_mtime_ns}"
+
+
+def refresh_replica(path: str, source=None, pages: int = -1) -> int:
+    source = source or connections[PRIMARY]
+    source.ensure_connection()
+    partial = f"{path}.partial"
+    target = sqlite3.connect(partial)
+    try:
+        source.connection.backup(target, pages=pages)
+        # Replica connections are immutable and never read a WAL file.
+        target.execute("PRAGMA journal_mode = delete")
+    finally:
+        target.close()
+    # Connections already reading the old copy keep it until they close; new
+    # connections open the new one.
+    os.replace(partial, path)
+    return os.path.getsize(path)
@@ -0,0 +1,54 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_db_executor: Optional[ThreadPoolExecutor] = None
+
+
+def db_executor() -> ThreadPoolExecutor:
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(
+            max_workers=settings.DB_EXECUTOR_WORKERS, thread_name_prefix="db",
+        )
+    return _db_executor
+
+
+def _call_with_connection(func, *args, **kwargs):
+    # Worker threads outlive requests, so apply the same connection
+    # housekeeping Django does around every synchronous request.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_db_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not carry the context over, and with it the
+    # timing its queries are recorded against.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        db_executor(),
+        functools.partial(
+            context.run, _call_with_connection, func, *args, **kwargs
+        ),
+    )
+
+
+async def run_lookup(blocks: bool, func, *args, **kwargs):
+    # Cache lookups that only touch memory stay on the loop; ones that may
+    # block on the filesystem go to the default executor, since they need
+    # no database connection.
+    if not blocks:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(func, *args, **kwargs)
+    )
@@ -0,0 +1,122 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import uuid
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+FORMATS = ("csv", "jsonl")
+DEFAULT_CHUNK_SIZE = 2000
+BUFFER_SIZE = 1 << 20
+
+
+def guess_format(path: str) -> str:
+    if path.endswith(".gz"):
+        path = path[:-3]
+    return "csv" if path.endswith(".csv") else "jsonl"
+
+
+@contextmanager
+def open_output(
+    path: str, compress: bool, stdout: Optional[TextIO] = None
+) -> Iterator[TextIO]:
+    if path == "-":
+        yield stdout
+        return
+    with open(path, "wb", buffering=BUFFER_SIZE) as raw:
+        binary = gzip.GzipFile(fileobj=raw, mode="wb") if compress else raw
+        with io.TextIOWrapper(binary, encoding="utf-8", newline="") as out:
+            yield out
+
+
+def to_text(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, (datetime.date, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def keyset_chunks(
+    queryset,
+    fields: Sequence[str],
+    after,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[List[tuple]]:
+    # queryset must be ordered by a unique key; after(row) narrows it to the
+    # rows that follow row, so every chunk is an index range scan.
+    rows = list(queryset.values_list(*fields)[:chunk_size])
+    while rows:
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        rows = list(after(rows[-1]).values_list(*fields)[:chunk_size])
+
+
+def write_rows(
+    out: TextIO, fmt: str, fields: Sequence[str], chunks: Iterator[List[tuple]]
+) -> Tuple[int, Optional[tuple]]:
+    count, last = 0, None
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(fields)
+    for rows in chunks:
+        values = [[to_text(value) for value in row] for row in rows]
+        if fmt == "csv":
+            writer.writerows(values)
+        else:
+            out.writelines(
+                json.dumps(dict(zip(fields, row))) + "\n" for row in values
+            )
+        count, last = count + len(rows), rows[-1]
+    return count, last
+
+
+class ExportCommand(BaseCommand):
+    fields: Sequence[str] = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="File to write, or - for stdout.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Output format, guessed from the file name by default.",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Compress the output, implied by a .gz file name.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Rows read per query.",
+        )
+
+    def chunks(self, options) -> Iterator[List[tuple]]:
+        raise NotImplementedError
+
+    def describe_last(self, row: tuple) -> str:
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        fmt = options["format"] or guess_format(output)
+        compress = options["gzip"] or output.endswith(".gz")
+        if output == "-" and compress:
+            raise CommandError("Compressed output needs a file name.")
+        chunks = self.chunks(options)
+        with open_output(output, compress, self.stdout) as out:
+            count, last = write_rows(out, fmt, self.fields, chunks)
+        if output != "-":
+            message = f"Exported {count} rows."
+            if last is not None:
+                message = (
+                    f"Exported {count} rows up to {self.describe_last(last)}."
+                )
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from photocatalog import db
+
+
+class Command(BaseCommand):
+    help = "Copy the primary database to the read-only catalog replica."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            help="Replica file, CATALOG_REPLICA by default.",
+        )
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=-1,
+            help="Pages copied per step, letting writers in between steps. "
+            "All pages are copied in one step by default.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.CATALOG_REPLICA
+        if not path:
+            raise CommandError("Give a replica path or set CATALOG_REPLICA.")
+        size = db.refresh_replica(path, pages=options["pages"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Refreshed {path} ({size} bytes).")
+        )
@@ -0,0 +1,219 @@
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PREFIX = "photo_api"
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    float("inf"),
+)
+# Counters kept per view, with their help text.
+VIEW_COUNTERS = {
+    "db_queries_total": "Database queries run.",
+    "db_query_seconds_total": "Time spent running database queries.",
+    "serialize_seconds_total": "Time spent encoding response bodies.",
+    "response_bytes_total": "Response body bytes sent, streams excluded.",
+}
+
+# Every thread adds to its own shard, so recording a request takes no lock;
+# the shards are only summed when /metrics is read. When a thread ends its
+# shard is folded into _retired, so short-lived threads do not pile up.
+_shards: List[Dict[tuple, float]] = []
+_retired: Dict[tuple, float] = defaultdict(float)
+_retire_lock = threading.Lock()
+_local = threading.local()
+# A context variable rather than a thread local, so the timing follows an
+# async request across the event loop and onto the threads that run its
+# queries.
+_timing: "ContextVar[Optional[RequestTiming]]" = ContextVar(
+    "request_timing", default=None
+)
+
+
+class RequestTiming:
+    __slots__ = ("queries", "db", "serialize")
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - start
+
+    def server_timing(self, total: float) -> str:
+        return (
+            f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries", '
+            f"serialize;dur={self.serialize * 1000:.2f}, "
+            f"total;dur={total * 1000:.2f}"
+        )
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _timing.get()
+
+
+def set_current_timing(timing: Optional[RequestTiming]) -> None:
+    _timing.set(timing)
+
+
+def record_query(execute, sql, params, many, context):
+    timing = current_timing()
+    if timing is None:
+        return execute(sql, params, many, context)
+    return timing.record_query(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs) -> None:
+    # Installed once per connection, whichever thread opens it. It goes
+    # first so execute_wrapper() blocks, which pop the last wrapper, leave
+    # it in place; a reconnect fires the signal again for the same list.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def serializing() -> Iterator[None]:
+    timing = current_timing()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timing is not None:
+            timing.serialize += time.perf_counter() - start
+
+
+def _shard() -> Dict[tuple, float]:
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = defaultdict(float)
+        with _retire_lock:
+            _shards.append(shard)
+        weakref.finalize(threading.current_thread(), _retire, shard)
+    return shard
+
+
+def _retire(shard: Dict[tuple, float]) -> None:
+    with _retire_lock:
+        for key, value in shard.items():
+            _retired[key] += value
+        # By identity: after reset() every shard compares equal to {}.
+        for index, candidate in enumerate(_shards):
+            if candidate is shard:
+                del _shards[index]
+                break
+
+
+def observe(
+    view: str,
+    method: str,
+    status: int,
+    timing: RequestTiming,
+    total: float,
+    size: Optional[int],
+) -> None:
+    shard = _shard()
+    labels = (view, method, str(status))
+    bound = next(bound for bound in LATENCY_BUCKETS if total <= bound)
+    shard["bucket", labels, bound] += 1
+    shard["sum", labels] += total
+    shard["db_queries_total", view] += timing.queries
+    shard["db_query_seconds_total", view] += timing.db
+    shard["serialize_seconds_total", view] += timing.serialize
+    if size is not None:
+        shard["response_bytes_total", view] += size
+
+
+def collect() -> Dict[tuple, float]:
+    with _retire_lock:
+        totals: Dict[tuple, float] = defaultdict(float, _retired)
+        shards = list(_shards)
+    for shard in shards:
+        # dict.copy() runs without releasing the GIL, so the owning thread
+        # can keep writing while it is read.
+        for key, value in shard.copy().items():
+            totals[key] += value
+    return totals
+
+
+def reset() -> None:
+    with _retire_lock:
+        _retired.clear()
+        for shard in _shards:
+            shard.clear()
+
+
+def _labels(**labels: str) -> str:
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render() -> str:
+    totals = collect()
+    name = f"{PREFIX}_request_duration_seconds"
+    lines = [
+        f"# HELP {name} Time spent serving requests.",
+        f"# TYPE {name} histogram",
+    ]
+    counts: Dict[Tuple[str, str, str], List[float]] = defaultdict(
+        lambda: [0.0] * len(LATENCY_BUCKETS)
+    )
+    for key, value in totals.items():
+        if key[0] == "bucket":
+            counts[key[1]][LATENCY_BUCKETS.index(key[2])] += value
+    for labels, buckets in sorted(counts.items()):
+        view, method, status = labels
+        cumulative = 0.0
+        for bound, count in zip(LATENCY_BUCKETS, buckets):
+            cumulative += count
+            label_text = _labels(
+                view=view, method=method, status=status, le=_number(bound)
+            )
+            lines.append(f"{name}_bucket{label_text} {_number(cumulative)}")
+        label_text = _labels(view=view, method=method, status=status)
+        lines.append(
+            f"{name}_sum{label_text} {_number(totals['sum', labels])}"
+        )
+        lines.append(f"{name}_count{label_text} {_number(cumulative)}")
+    for counter, help_text in VIEW_COUNTERS.items():
+        name = f"{PREFIX}_{counter}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for key, value in sorted(totals.items()):
+            if key[0] == counter:
+                lines.append(f"{name}{_labels(view=key[1])} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+from . import metrics
+
+
+def view_name(request) -> str:
+    # Label by route name rather than path so ids and unknown URLs do not
+    # create a series each.
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "unmatched"
+
+
+class TimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function for Django, as
+            # MiddlewareMixin does, so an async chain stays on the loop.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timing = metrics.RequestTiming()
+        metrics.set_current_timing(timing)
+        try:
+            start = time.perf_counter()
+            response = self.get_response(request)
+            total = time.perf_counter() - start
+        finally:
+            metrics.set_current_timing(None)
+        return self.finish(request, response, timing, total)
+
+    async def __acall__(self, request):
+        # Queries run on other threads, sync views' and the database
+        # executor's, are recorded against the timing in the context.
+        timing = metrics.RequestTiming()
+        metrics.set_current_timing(timing)
+        try:
+            start = time.perf_counter()
+            response = await self.get_response(request)
+            total = time.perf_counter() - start
+        finally:
+            metrics.set_current_timing(None)
+        return self.finish(request, response, timing, total)
+
+    def finish(self, request, response, timing, total):
+        size = None if response.streaming else len(response.content)
+        metrics.observe(
+            view_name(request),
+            request.method,
+            response.status_code,
+            timing,
+            total,
+            size,
+        )
+        response["Server-Timing"] = timing.server_timing(total)
+        return response
@@ -0,0 +1,31 @@
+from django.db import connections
+
+PRIMARY = "default"
+REPLICA = "replica"
+REPLICA_APPS = {"photos"}
+REPLICA_MODELS = {"checkout.prints"}
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Reads inside a write transaction must see its own writes, which the
+        # replica only gets at the next refresh.
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        meta = model._meta
+        if (
+            meta.app_label in REPLICA_APPS
+            or meta.label_lower in REPLICA_MODELS
+        ):
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return {obj1._state.db, obj2._state.db} <= {PRIMARY, REPLICA}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary, schema included.
+        return db != REPLICA
@@ -31,6 +31,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    "photocatalog.apps.PhotocatalogConfig",
     "photos.apps.PhotosConfig",
     "checkout.apps.CheckoutConfig",
     "django.contrib.admin",
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "photocatalog.middleware.TimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -71,6 +73,30 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "photocatalog.wsgi.application"
 
+# Size of the thread pool that runs database work for the async views.
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", 8))
+
+# Set ORDER_SPOOL_DIR to answer checkouts with 202 and write orders to the
+# database in batches from a background thread. Accepted orders are appended
+# to a spool file in this directory first so they survive a crash.
+ORDER_SPOOL_DIR = os.environ.get("ORDER_SPOOL_DIR")
+ORDER_WRITE_BATCH_SIZE = int(os.environ.get("ORDER_WRITE_BATCH_SIZE", 100))
+ORDER_WRITE_INTERVAL = float(os.environ.get("ORDER_WRITE_INTERVAL", 0.05))
+
+# Bearer token required by GET /v1/checkout/orders and /v1/checkout/stats,
+# which return customers' details and revenue. They answer 403 while it is
+# unset.
+ORDERS_API_TOKEN = os.environ.get("ORDERS_API_TOKEN")
+
+# Dotted path to the checkout.fulfillment.FulfillmentBackend subclass used by
+# the fulfill_orders command.
+FULFILLMENT_BACKEND = os.environ.get(
+    "FULFILLMENT_BACKEND", "checkout.fulfillment.LocalBackend"
+)
+# Seconds a fulfill_orders worker holds the orders it claimed. Orders still
+# unanswered when the lease runs out, say after a crash, are claimed again.
+FULFILLMENT_LEASE = float(os.environ.get("FULFILLMENT_LEASE", 300))
+
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
@@ -82,6 +108,86 @@ DATABASES = {
     }
 }
 
+# SQLITE_PROFILE=performance switches the database to write-ahead logging so
+# readers no longer wait for writers, relaxes fsyncs to checkpoints, gives
+# each connection a larger page cache and memory map, and keeps connections
+# open between requests. photocatalog.db applies SQLITE_PRAGMAS to every new
+# connection.
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "default")
+SQLITE_PRAGMAS = {}
+
+if SQLITE_PROFILE == "performance":
+    SQLITE_PRAGMAS = {
+        "busy_timeout": 5000,
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "memory",
+    }
+    DATABASES["default"]["CONN_MAX_AGE"] = int(
+        os.environ.get("CONN_MAX_AGE", 600)
+    )
+
+# Set CATALOG_REPLICA to the path of a copy of the database, refreshed with
+# the refresh_replica command, to serve catalog reads from it while orders
+# are written to the primary. The copy is opened read-only and
+# immutable, so its connections are never kept between requests and pick up
+# a refreshed file on the next request.
+CATALOG_REPLICA = os.environ.get("CATALOG_REPLICA")
+
+if CATALOG_REPLICA:
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": f"file:{CATALOG_REPLICA}?mode=ro&immutable=1",
+        "OPTIONS": {"uri": True},
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS = ["photocatalog.routers.ReplicaRouter"]
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+# Catalog pages are kept in an LRU-evicting in-memory cache; MAX_ENTRIES
+# together with photos.data.MAX_PAGE_SIZE bounds its memory use. Set
+# CATALOG_CACHE_DIR to share pages between worker processes on disk.
+#
+# The versions cache holds the stamps that invalidate catalog pages and the
+# in-process price table. In memory they are private to each process, so an
+# edit made in one worker, a shell or a management command only reaches the
+# other workers when CATALOG_CACHE_DIR is set; otherwise restart them.
+CATALOG_CACHE_DIR = os.environ.get("CATALOG_CACHE_DIR")
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "catalog": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "catalog",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 256},
+    },
+    "versions": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "versions",
+        "TIMEOUT": None,
+    },
+}
+
+if CATALOG_CACHE_DIR:
+    CACHES["catalog"].update(
+        {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": CATALOG_CACHE_DIR,
+        }
+    )
+    CACHES["versions"].update(
+        {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.path.join(CATALOG_CACHE_DIR, "versions"),
+        }
+    )
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
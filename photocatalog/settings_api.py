@@ -0,0 +1,18 @@
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS
+
+# API-only workers serve the /v1 endpoints and nothing else. Without the
+# admin there are no sessions, logins, messages or cookies to look after, and
+# no cookie-based credentials for CSRF protection to guard, so requests only
+# pass through the middleware the JSON endpoints use.
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS if not app.startswith("django.contrib.")
+]
+
+MIDDLEWARE = [
+    "photocatalog.middleware.TimingMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+
+ROOT_URLCONF = "photocatalog.urls_api"
@@ -0,0 +1,3 @@
+from .settings import *  # noqa: F401,F403
+
+ROOT_URLCONF = "photocatalog.urls_async"
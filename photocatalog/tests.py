@@ -1,9 +1,27 @@
+import asyncio
+import gc
 import json
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
-
-from checkout.models import Orders
-from photocatalog import CURRENT_VERSION
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import AsyncClient, AsyncRequestFactory, Client
+
+from checkout import prices
+from checkout.models import Orders, Prints
+from photocatalog import CURRENT_VERSION, db, executors, metrics, settings_api
+from photocatalog.middleware import TimingMiddleware
+from photocatalog.routers import PRIMARY, REPLICA, ReplicaRouter
+from photos import data as photos_data
+from photos import views as photos_views
 from photos.models import IMAGE_NOT_AVAILABLE_PATH, Catalog
 
 
@@ -66,6 +84,8 @@ def test_list_catalog_with_no_query_params_returns_expected(django_app):
     expected = {
         "count": items,
         "last_token": last_row.id + items,
+        "has_more": False,
+        "next_cursor": None,
         "results": [
             {
                 "id": last_row.id + i,
@@ -244,3 +264,503 @@ def test_list_sizes_returns_expected(django_app):
     )
 
     assert expected == json.loads(response.content)
+
+
+@pytest.fixture
+def async_client(settings, monkeypatch):
+    settings.ROOT_URLCONF = "photocatalog.urls_async"
+
+    # The test database only exists inside the test's transaction, so run
+    # database work on the test thread instead of the executor's threads.
+    async def run_on_test_thread(func, *args, **kwargs):
+        return await sync_to_async(func)(*args, **kwargs)
+
+    monkeypatch.setattr(executors, "run_in_db_executor", run_on_test_thread)
+    client = AsyncClient()
+    return client
+
+
+def test_run_in_db_executor_uses_bounded_db_threads(settings):
+    thread_name = asyncio.run(
+        executors.run_in_db_executor(lambda: threading.current_thread().name)
+    )
+
+    assert thread_name.startswith("db")
+    assert settings.DB_EXECUTOR_WORKERS == executors.db_executor()._max_workers
+
+
+@pytest.mark.django_db
+def test_async_list_catalog_matches_sync_view(django_app, async_client):
+    url = f"/{CURRENT_VERSION}/catalog/?page_size=10&location=Paris"
+    expected = json.loads(django_app.get(url).content)
+
+    response = async_to_sync(async_client.get)(url)
+
+    assert 200 == response.status_code
+    assert expected == json.loads(response.content)
+
+
+@pytest.mark.django_db
+def test_async_list_catalog_cache_hit_skips_executor(
+    async_client, monkeypatch
+):
+    url = f"/{CURRENT_VERSION}/catalog/?page_size=10"
+    expected = async_to_sync(async_client.get)(url).content
+
+    async def fail(func, *args, **kwargs):
+        raise AssertionError(f"{func.__name__} was sent to the executor")
+
+    monkeypatch.setattr(executors, "run_in_db_executor", fail)
+    response = async_to_sync(async_client.get)(url)
+
+    assert expected == response.content
+
+
+def record_loop(module, name, monkeypatch):
+    calls = []
+    lookup = getattr(module, name)
+
+    def record(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            calls.append("loop")
+        except RuntimeError:
+            calls.append("thread")
+        return lookup(*args, **kwargs)
+
+    monkeypatch.setattr(module, name, record)
+    return calls
+
+
+def use_file_caches(settings, tmp_path):
+    settings.CACHES = {
+        **settings.CACHES,
+        "catalog": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path),
+        },
+        "versions": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path / "versions"),
+            "TIMEOUT": None,
+        },
+    }
+
+
+@pytest.mark.django_db
+def test_async_list_catalog_reads_memory_caches_on_the_loop(
+    async_client, monkeypatch
+):
+    calls = record_loop(photos_data, "cached_catalog_page", monkeypatch)
+
+    async_to_sync(async_client.get)(f"/{CURRENT_VERSION}/catalog/")
+
+    assert ["loop"] == calls
+
+
+@pytest.mark.django_db
+def test_async_list_catalog_reads_file_caches_off_the_loop(
+    async_client, settings, tmp_path, monkeypatch
+):
+    use_file_caches(settings, tmp_path)
+    calls = record_loop(photos_data, "cached_catalog_page", monkeypatch)
+
+    async_to_sync(async_client.get)(f"/{CURRENT_VERSION}/catalog/")
+
+    assert ["thread"] == calls
+
+
+@pytest.mark.django_db
+def test_async_list_sizes_reads_file_caches_off_the_loop(
+    async_client, settings, tmp_path, monkeypatch
+):
+    use_file_caches(settings, tmp_path)
+    calls = record_loop(prices, "cached_price_table", monkeypatch)
+
+    async_to_sync(async_client.get)(f"/{CURRENT_VERSION}/checkout/print-sizes")
+
+    assert ["thread"] == calls
+
+
+@pytest.mark.django_db
+def test_async_list_catalog_matching_etag_returns_304(async_client):
+    url = f"/{CURRENT_VERSION}/catalog/"
+    tag = async_to_sync(async_client.get)(url)["ETag"]
+    expected = 304
+
+    # Django 3.1's AsyncClient can't send extra headers with a GET.
+    request = AsyncRequestFactory().get(url)
+    request.META["HTTP_IF_NONE_MATCH"] = tag
+    response = async_to_sync(photos_views.list_catalog_async)(request)
+
+    assert expected == response.status_code
+
+
+def test_async_list_catalog_invalid_cursor_returns_400(async_client):
+    expected = 400
+
+    response = async_to_sync(async_client.get)(
+        f"/{CURRENT_VERSION}/catalog/?cursor=bad"
+    )
+
+    assert expected == response.status_code
+
+
+def test_async_list_catalog_rejects_post(async_client):
+    expected = 405
+
+    response = async_to_sync(async_client.post)(f"/{CURRENT_VERSION}/catalog/")
+
+    assert expected == response.status_code
+
+
+@pytest.mark.django_db
+def test_async_list_sizes_returns_expected(async_client):
+    expected = {"1": "sml", "2": "med", "3": "lrg"}
+
+    response = async_to_sync(async_client.get)(
+        f"/{CURRENT_VERSION}/checkout/print-sizes"
+    )
+
+    assert expected == json.loads(response.content)
+
+
+@pytest.mark.django_db
+def test_async_checkout_valid_form_saves_order(async_client, order_form):
+    response = async_to_sync(async_client.post)(
+        f"/{CURRENT_VERSION}/checkout/",
+        order_form,
+        content_type="application/json",
+    )
+
+    assert 201 == response.status_code
+    response = json.loads(response.content)
+    assert Orders.objects.filter(id=response["id"]).exists()
+
+
+@pytest.mark.django_db
+def test_async_checkout_invalid_form_returns_422(async_client, order_form):
+    order_form.pop("first_name")
+
+    response = async_to_sync(async_client.post)(
+        f"/{CURRENT_VERSION}/checkout/",
+        order_form,
+        content_type="application/json",
+    )
+
+    assert 422 == response.status_code
+    assert "first_name" in json.loads(response.content)
+
+
+def test_async_checkout_invalid_content_type_returns_415(async_client):
+    expected = 415
+
+    response = async_to_sync(async_client.post)(
+        f"/{CURRENT_VERSION}/checkout/", "", content_type="text/plain"
+    )
+
+    assert expected == response.status_code
+
+
+@pytest.mark.django_db
+def test_async_routes_fall_back_to_sync_views(async_client):
+    expected = 200
+
+    response = async_to_sync(async_client.get)(
+        f"/{CURRENT_VERSION}/catalog/facets"
+    )
+
+    assert expected == response.status_code
+
+
+@pytest.fixture
+def file_connection(tmp_path):
+    wrapper = DatabaseWrapper(
+        {**connection.settings_dict, "NAME": str(tmp_path / "db.sqlite3")},
+        alias="file",
+    )
+    yield wrapper
+    wrapper.close()
+
+
+def read_pragma(wrapper, name):
+    with wrapper.cursor() as cursor:
+        cursor.execute(f"PRAGMA {name}")
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.django_db
+def test_performance_profile_pragmas_apply_to_new_connections(
+    settings, file_connection
+):
+    settings.SQLITE_PRAGMAS = {
+        "busy_timeout": 1234,
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "temp_store": "memory",
+    }
+
+    assert "wal" == read_pragma(file_connection, "journal_mode")
+    assert 1234 == read_pragma(file_connection, "busy_timeout")
+    assert 1 == read_pragma(file_connection, "synchronous")
+    assert 2 == read_pragma(file_connection, "temp_store")
+
+
+@pytest.mark.django_db
+def test_default_profile_leaves_sqlite_defaults(settings, file_connection):
+    settings.SQLITE_PRAGMAS = {}
+
+    assert "delete" == read_pragma(file_connection, "journal_mode")
+
+
+def test_replica_router_reads_catalog_and_prints_from_replica():
+    router = ReplicaRouter()
+
+    assert REPLICA == router.db_for_read(Catalog)
+    assert REPLICA == router.db_for_read(Prints)
+    assert PRIMARY == router.db_for_read(Orders)
+
+
+def test_replica_router_writes_to_primary():
+    router = ReplicaRouter()
+
+    assert PRIMARY == router.db_for_write(Catalog)
+    assert PRIMARY == router.db_for_write(Orders)
+    assert router.allow_migrate(PRIMARY, "photos")
+    assert not router.allow_migrate(REPLICA, "photos")
+
+
+@pytest.mark.django_db
+def test_replica_router_reads_primary_inside_transactions():
+    # Every django_db test runs inside a transaction on the primary.
+    assert PRIMARY == ReplicaRouter().db_for_read(Catalog)
+
+
+def read_replica(path, sql):
+    replica = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+    try:
+        return replica.execute(sql).fetchone()[0]
+    finally:
+        replica.close()
+
+
+@pytest.mark.django_db
+def test_refresh_replica_copies_primary(tmp_path, file_connection):
+    path = tmp_path / "replica.sqlite3"
+    with file_connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode = wal")
+        cursor.execute("CREATE TABLE photos (id INTEGER PRIMARY KEY)")
+        cursor.execute("INSERT INTO photos VALUES (1)")
+    db.refresh_replica(str(path), file_connection)
+    with file_connection.cursor() as cursor:
+        cursor.execute("INSERT INTO photos VALUES (2)")
+
+    assert 1 == read_replica(path, "SELECT COUNT(*) FROM photos")
+    db.refresh_replica(str(path), file_connection, pages=1)
+    assert 2 == read_replica(path, "SELECT COUNT(*) FROM photos")
+    assert "delete" == read_replica(path, "PRAGMA journal_mode")
+    assert not (tmp_path / "replica.sqlite3.partial").exists()
+
+
+@pytest.mark.django_db
+def test_replica_generation_changes_on_refresh(
+    settings, tmp_path, file_connection
+):
+    path = tmp_path / "replica.sqlite3"
+    settings.CATALOG_REPLICA = str(path)
+    missing = db.replica_generation()
+    db.refresh_replica(str(path), file_connection)
+    first = db.replica_generation()
+    db.refresh_replica(str(path), file_connection)
+
+    assert "0" == missing != first
+    assert first != db.replica_generation()
+
+
+def test_refresh_replica_needs_a_path(settings):
+    settings.CATALOG_REPLICA = None
+
+    with pytest.raises(CommandError):
+        call_command("refresh_replica")
+
+
+@pytest.fixture
+def api_client(settings):
+    settings.MIDDLEWARE = settings_api.MIDDLEWARE
+    settings.ROOT_URLCONF = settings_api.ROOT_URLCONF
+    return Client(enforce_csrf_checks=True)
+
+
+def test_api_profile_drops_admin_and_session_apps():
+    assert not [
+        app
+        for app in settings_api.INSTALLED_APPS
+        if app.startswith("django.contrib.")
+    ]
+    assert "photos.apps.PhotosConfig" in settings_api.INSTALLED_APPS
+    assert "checkout.apps.CheckoutConfig" in settings_api.INSTALLED_APPS
+
+
+@pytest.mark.django_db
+def test_api_profile_checkout_needs_no_csrf_token_or_cookies(
+    api_client, order_form
+):
+    response = api_client.post(
+        f"/{CURRENT_VERSION}/checkout/",
+        order_form,
+        content_type="application/json",
+    )
+
+    assert 201 == response.status_code
+    assert not response.cookies
+
+
+@pytest.mark.django_db
+def test_api_profile_serves_catalog_without_admin(api_client):
+    assert 200 == api_client.get(f"/{CURRENT_VERSION}/catalog/").status_code
+    assert 404 == api_client.get("/admin/").status_code
+
+
+@pytest.fixture
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_metrics_histogram_buckets_are_cumulative(fresh_metrics):
+    timing = metrics.RequestTiming()
+    timing.queries, timing.db = 2, 0.001
+    metrics.observe("catalog", "GET", 200, timing, 0.003, 10)
+    metrics.observe("catalog", "GET", 200, metrics.RequestTiming(), 7, None)
+
+    text = metrics.render()
+
+    labels = 'view="catalog",method="GET",status="200"'
+    name = "photo_api_request_duration_seconds"
+    assert f'{name}_bucket{{{labels},le="0.001"}} 0' in text
+    assert f'{name}_bucket{{{labels},le="0.005"}} 1' in text
+    assert f'{name}_bucket{{{labels},le="5"}} 1' in text
+    assert f'{name}_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"{name}_sum{{{labels}}} 7.003" in text
+    assert f"{name}_count{{{labels}}} 2" in text
+    assert 'photo_api_db_queries_total{view="catalog"} 2' in text
+    assert 'photo_api_response_bytes_total{view="catalog"} 10' in text
+
+
+def test_metrics_sum_every_thread(fresh_metrics):
+    def record():
+        for _ in range(100):
+            metrics.observe(
+                "catalog", "GET", 200, metrics.RequestTiming(), 0.01, 1
+            )
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert 400 == metrics.collect()["response_bytes_total", "catalog"]
+
+
+def test_metrics_keep_totals_of_finished_threads(fresh_metrics):
+    shards = len(metrics._shards)
+
+    for _ in range(50):
+        thread = threading.Thread(
+            target=metrics.observe,
+            args=("catalog", "GET", 200, metrics.RequestTiming(), 0.01, 1),
+        )
+        thread.start()
+        thread.join()
+    del thread
+    gc.collect()
+
+    assert shards == len(metrics._shards)
+    assert 50 == metrics.collect()["response_bytes_total", "catalog"]
+
+
+def test_metrics_retire_the_finished_threads_own_shard(fresh_metrics):
+    metrics.observe("catalog", "GET", 200, metrics.RequestTiming(), 0.01, 1)
+    thread = threading.Thread(
+        target=metrics.observe,
+        args=("catalog", "GET", 200, metrics.RequestTiming(), 0.01, 1),
+    )
+    thread.start()
+    thread.join()
+    # Every shard is now empty and so equal to the finished thread's.
+    metrics.reset()
+    del thread
+    gc.collect()
+
+    metrics.observe("catalog", "GET", 200, metrics.RequestTiming(), 0.01, 1)
+
+    assert 1 == metrics.collect()["response_bytes_total", "catalog"]
+
+
+@pytest.mark.django_db
+def test_responses_carry_server_timing(django_app):
+    response = django_app.get(f"/{CURRENT_VERSION}/catalog/?page_size=5")
+
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    assert "serialize;dur=" in timing
+    assert "total;dur=" in timing
+    assert '"0 queries"' not in timing
+
+
+@pytest.mark.django_db
+def test_async_requests_count_queries_run_in_the_executor(
+    fresh_metrics, monkeypatch
+):
+    # A pool of its own, so the connection it opens ends with its thread.
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(executors, "_db_executor", pool)
+
+    def query():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    async def view(request):
+        await executors.run_in_db_executor(query)
+        return HttpResponse()
+
+    middleware = TimingMiddleware(view)
+
+    response = async_to_sync(middleware)(AsyncRequestFactory().get("/"))
+    pool.shutdown()
+
+    assert asyncio.iscoroutinefunction(middleware)
+    assert '"1 queries"' in response["Server-Timing"]
+    assert 1 == metrics.collect()["db_queries_total", "unmatched"]
+
+
+@pytest.mark.django_db
+def test_async_requests_count_queries_of_sync_views(fresh_metrics):
+    client = AsyncClient()
+
+    response = async_to_sync(client.get)(
+        f"/{CURRENT_VERSION}/checkout/{uuid.uuid4()}"
+    )
+
+    assert 404 == response.status_code
+    assert '"0 queries"' not in response["Server-Timing"]
+    assert metrics.collect()["db_queries_total", "order-status"] >= 1
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_reports_requests_by_view(django_app, fresh_metrics):
+    django_app.get(f"/{CURRENT_VERSION}/catalog/?page_size=5")
+    django_app.get("/no-such-page", status=404)
+
+    response = django_app.get("/metrics")
+
+    assert response.content_type == "text/plain"
+    assert (
+        "photo_api_request_duration_seconds_count"
+        '{view="catalog",method="GET",status="200"} 1'
+    ) in response.text
+    assert 'view="unmatched",method="GET",status="404"' in response.text
+    queries = metrics.collect()["db_queries_total", "catalog"]
+    assert queries >= 1
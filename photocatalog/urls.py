@@ -1,11 +1,9 @@
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import path
 
-from photocatalog import CURRENT_VERSION, views
+from photocatalog import urls_api, views
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", views.hello),
-    path(f"{CURRENT_VERSION}/checkout/", include("checkout.urls")),
-    path(f"{CURRENT_VERSION}/catalog/", include("photos.urls")),
-]
+] + urls_api.urlpatterns
@@ -0,0 +1,9 @@
+from django.urls import include, path
+
+from photocatalog import CURRENT_VERSION, views
+
+urlpatterns = [
+    path(f"{CURRENT_VERSION}/checkout/", include("checkout.urls")),
+    path(f"{CURRENT_VERSION}/catalog/", include("photos.urls")),
+    path("metrics", views.export_metrics, name="metrics"),
+]
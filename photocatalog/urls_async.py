@@ -0,0 +1,23 @@
+from django.urls import path
+
+from checkout import views as checkout_views
+from photocatalog import CURRENT_VERSION, urls
+from photos import views as photos_views
+
+urlpatterns = [
+    path(
+        f"{CURRENT_VERSION}/catalog/",
+        photos_views.list_catalog_async,
+        name="catalog",
+    ),
+    path(
+        f"{CURRENT_VERSION}/checkout/",
+        checkout_views.purchase_print_async,
+        name="purchase-print",
+    ),
+    path(
+        f"{CURRENT_VERSION}/checkout/print-sizes",
+        checkout_views.list_sizes_async,
+        name="list-sizes",
+    ),
+] + urls.urlpatterns
@@ -0,0 +1,29 @@
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+VERSIONS_CACHE = "versions"
+
+
+def current(key: str) -> int:
+    cache = caches[VERSIONS_CACHE]
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted or restarted counter never
+        # reuses a version that may still have data cached against it.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump(key: str) -> None:
+    try:
+        caches[VERSIONS_CACHE].incr(key)
+    except ValueError:
+        current(key)
+
+
+def is_shared() -> bool:
+    # Only a local memory cache is certain to be private to this process.
+    return not isinstance(caches[VERSIONS_CACHE], LocMemCache)
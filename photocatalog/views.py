@@ -1,5 +1,15 @@
 from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from photocatalog import metrics
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
 
 
 def hello(request):
     return HttpResponse("Hello, World!")
+
+
+@require_GET
+def export_metrics(request):
+    return HttpResponse(metrics.render(), content_type=METRICS_CONTENT_TYPE)
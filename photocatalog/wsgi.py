@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "photocatalog.settings")
 
 application = get_wsgi_application()
+
+from checkout import writebehind  # noqa: E402 isort:skip
+
+writebehind.replay_spools()
@@ -1,34 +1,451 @@
-from typing import Any, Dict
+import hashlib
+import json
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from .models import Catalog
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, router, transaction
+from django.db.models import Count, ExpressionWrapper, F, IntegerField
+
+from photocatalog import exports, metrics, versions
+from photocatalog.db import replica_generation
+
+from .models import Catalog, CatalogFacet
 
 DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+CATALOG_FIELDS = ("id", "title", "location", "year", "path")
+CATALOG_CACHE = "catalog"
+CATALOG_VERSION_KEY = "catalog:version"
+MAX_ROW_FRAGMENTS = 100000
+
+page_cache_stats: Counter = Counter()
+row_fragments: "OrderedDict[int, Tuple[tuple, bytes]]" = OrderedDict()
+CURSOR_SALT = "photos.catalog.cursor"
+SEARCH_CURSOR_SALT = "photos.catalog.search.cursor"
+SEARCH_TABLE = "photos_catalog_search"
+
+
+def encode_cursor(last_id: int) -> str:
+    return signing.dumps(last_id, salt=CURSOR_SALT)
+
 
+def decode_cursor(cursor: str) -> int:
+    try:
+        last_id = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise ValidationError({"cursor": ["Invalid cursor."]}, code="invalid")
+    if not isinstance(last_id, int):
+        raise ValidationError({"cursor": ["Invalid cursor."]}, code="invalid")
+    return last_id
 
-def query_catalog(page_size, last_token) -> Dict[str, Any]:
-    if not last_token and not page_size:
-        photos = Catalog.objects.all()
-    elif not last_token and page_size:
-        photos = Catalog.objects.filter(id__lte=int(page_size))
+
+def parse_int(name: str, value, minimum: int = 0) -> Optional[int]:
+    if value in (None, ""):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(
+            {name: ["Enter a whole number."]}, code="invalid"
+        )
+    if number < minimum:
+        message = f"Ensure this value is greater than or equal to {minimum}."
+        raise ValidationError({name: [message]}, code="min_value")
+    return number
+
+
+def parse_filters(params) -> Dict[str, Any]:
+    filters = {
+        "location": params.get("location") or None,
+        "year_min": parse_int("year_min", params.get("year_min")),
+        "year_max": parse_int("year_max", params.get("year_max")),
+        "title_prefix": params.get("title_prefix") or None,
+    }
+    return {
+        name: value for name, value in filters.items() if value is not None
+    }
+
+
+def filter_catalog(photos, filters: Optional[Dict[str, Any]]):
+    if not filters:
+        return photos
+    if "location" in filters:
+        photos = photos.filter(location=filters["location"])
+    if "year_min" in filters:
+        photos = photos.filter(year__gte=filters["year_min"])
+    if "year_max" in filters:
+        photos = photos.filter(year__lte=filters["year_max"])
+    if "title_prefix" in filters:
+        # A half-open range instead of LIKE so SQLite can use the index.
+        prefix = filters["title_prefix"]
+        upper = prefix_upper_bound(prefix)
+        if upper is None:
+            photos = photos.filter(title__startswith=prefix)
+        else:
+            photos = photos.filter(title__gte=prefix, title__lt=upper)
+    return photos
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    # The smallest string above every string that starts with prefix.
+    # Surrogates cannot be encoded, so U+D7FF steps to U+E000, and a trailing
+    # U+10FFFF carries into the character before it.
+    while prefix:
+        code = ord(prefix[-1]) + 1
+        if 0xD800 <= code <= 0xDFFF:
+            code = 0xE000
+        if code <= 0x10FFFF:
+            return prefix[:-1] + chr(code)
+        prefix = prefix[:-1]
+    return None
+
+
+def resolve_page(
+    page_size, last_token, cursor=None
+) -> Tuple[Optional[int], int]:
+    page_size = parse_int("page_size", page_size, minimum=1)
+    if cursor:
+        after = decode_cursor(cursor)
     else:
-        last_item = int(last_token) + (
-            int(page_size) if page_size else DEFAULT_PAGE_SIZE
+        after = parse_int("last_token", last_token)
+    if page_size is None:
+        page_size = DEFAULT_PAGE_SIZE if after is not None else MAX_PAGE_SIZE
+    return after, min(page_size, MAX_PAGE_SIZE)
+
+
+def query_catalog(
+    page_size, last_token, cursor=None, filters=None
+) -> Dict[str, Any]:
+    after, page_size = resolve_page(page_size, last_token, cursor)
+    rows, has_more = _query_rows(after, page_size, filters)
+    page = _page_summary(rows, has_more)
+    page["results"] = [dict(zip(CATALOG_FIELDS, row)) for row in rows]
+    return page
+
+
+def _query_rows(
+    after: Optional[int], page_size: int, filters: Optional[Dict[str, Any]]
+) -> Tuple[List[tuple], bool]:
+    photos = filter_catalog(Catalog.objects.order_by("id"), filters)
+    if after is not None:
+        photos = photos.filter(id__gt=after)
+    rows = list(photos.values_list(*CATALOG_FIELDS)[: page_size + 1])
+    return rows[:page_size], len(rows) > page_size
+
+
+def _page_summary(rows: List[tuple], has_more: bool) -> Dict[str, Any]:
+    last_token = rows[-1][0] if rows else None
+    return {
+        "count": len(rows),
+        "last_token": last_token,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(last_token) if has_more else None,
+    }
+
+
+def encode_row(row: tuple, cache: bool = True) -> bytes:
+    # The fetched row doubles as the fragment's version: a fragment is
+    # only reused while the row it was encoded from is unchanged.
+    cached = row_fragments.get(row[0])
+    if cached is not None and cached[0] == row:
+        if cache:
+            try:
+                row_fragments.move_to_end(row[0])
+            except KeyError:
+                pass
+        return cached[1]
+    fragment = json.dumps(dict(zip(CATALOG_FIELDS, row))).encode()
+    if cache:
+        while len(row_fragments) >= MAX_ROW_FRAGMENTS:
+            try:
+                row_fragments.popitem(last=False)
+            except KeyError:
+                break
+        row_fragments[row[0]] = (row, fragment)
+    return fragment
+
+
+def forget_row(row_id: int) -> None:
+    row_fragments.pop(row_id, None)
+
+
+def render_page(summary: Dict[str, Any], fragments: List[bytes]) -> bytes:
+    head = json.dumps(summary)[:-1].encode()
+    return head + b', "results": [' + b", ".join(fragments) + b"]}"
+
+
+def catalog_version() -> str:
+    # An edit bumps the stamp before it reaches the replica, so pages built
+    # in between are stale; the replica's generation retires them once the
+    # refreshed copy is in place.
+    stamp = versions.current(CATALOG_VERSION_KEY)
+    return f"{stamp}-{replica_generation()}"
+
+
+def bump_catalog_version() -> None:
+    versions.bump(CATALOG_VERSION_KEY)
+
+
+def page_cache_key(
+    version: str,
+    after: Optional[int],
+    page_size: int,
+    filters: Optional[Dict[str, Any]],
+) -> str:
+    params = json.dumps([after, page_size, filters or {}], sort_keys=True)
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return f"catalog:page:{version}:{digest}"
+
+
+def catalog_etag(query: str) -> str:
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return f'"catalog-{catalog_version()}-{digest}"'
+
+
+def get_cached_page(key: str) -> Optional[bytes]:
+    page = caches[CATALOG_CACHE].get(key)
+    page_cache_stats["hits" if page is not None else "misses"] += 1
+    return page
+
+
+def build_catalog_page(
+    key: str,
+    after: Optional[int],
+    page_size: int,
+    filters: Optional[Dict[str, Any]],
+) -> bytes:
+    rows, has_more = _query_rows(after, page_size, filters)
+    with metrics.serializing():
+        page = render_page(
+            _page_summary(rows, has_more), [encode_row(row) for row in rows]
         )
-        photos = Catalog.objects.filter(
-            id__gt=int(last_token), id__lte=last_item
+    caches[CATALOG_CACHE].set(key, page)
+    return page
+
+
+def cached_catalog_page(
+    after, page_size, filters=None
+) -> Tuple[str, Optional[bytes]]:
+    key = page_cache_key(catalog_version(), after, page_size, filters)
+    return key, get_cached_page(key)
+
+
+def lookups_block() -> bool:
+    # File caches read and unpickle from disk, and the replica's generation
+    # is a stat call; only local memory lookups are cheap enough for a loop.
+    return (
+        bool(settings.CATALOG_REPLICA)
+        or versions.is_shared()
+        or not isinstance(caches[CATALOG_CACHE], LocMemCache)
+    )
+
+
+def render_catalog_page(
+    page_size, last_token, cursor=None, filters=None
+) -> bytes:
+    after, page_size = resolve_page(page_size, last_token, cursor)
+    key, page = cached_catalog_page(after, page_size, filters)
+    if page is None:
+        page = build_catalog_page(key, after, page_size, filters)
+    return page
+
+
+def stream_catalog(last_token, cursor=None, filters=None) -> Iterator[bytes]:
+    after, _ = resolve_page(None, last_token, cursor)
+    photos = Catalog.objects.order_by("id").values_list(*CATALOG_FIELDS)
+    photos = filter_catalog(photos, filters)
+    if after is not None:
+        photos = photos.filter(id__gt=after)
+    return _stream_rows(photos.iterator(chunk_size=STREAM_CHUNK_SIZE))
+
+
+def _stream_rows(rows) -> Iterator[bytes]:
+    count = 0
+    last_token = None
+    yield b'{"results": ['
+    for row in rows:
+        # A full export would only flush the pages' hot rows out.
+        yield (b", " if count else b"") + encode_row(row, cache=False)
+        count += 1
+        last_token = row[0]
+    summary = json.dumps(
+        {
+            "count": count,
+            "last_token": last_token,
+            "has_more": False,
+            "next_cursor": None,
+        }
+    )
+    # Splice the summary keys into the object opened by the first chunk.
+    yield b"], " + summary[1:].encode()
+
+
+def parse_search_query(q) -> str:
+    terms = (q or "").split()
+    if not terms:
+        raise ValidationError(
+            {"q": ["This field is required."]}, code="required"
+        )
+    # Quote every term so user input is never parsed as FTS5 syntax.
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        rank, last_id = signing.loads(cursor, salt=SEARCH_CURSOR_SALT)
+        return float(rank), int(last_id)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise ValidationError({"cursor": ["Invalid cursor."]}, code="invalid")
+
+
+def search_catalog(q, page_size, cursor=None) -> Dict[str, Any]:
+    match = parse_search_query(q)
+    page_size = parse_int("page_size", page_size, minimum=1)
+    page_size = min(page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    columns = ", ".join(f"c.{field}" for field in CATALOG_FIELDS)
+    sql = (
+        f"SELECT {columns}, s.rank FROM {SEARCH_TABLE} s "
+        "JOIN photos_catalog c ON c.id = s.rowid "
+        f"WHERE {SEARCH_TABLE} MATCH %s"
+    )
+    params: list = [match]
+    if cursor:
+        rank, last_id = decode_search_cursor(cursor)
+        sql += " AND (s.rank > %s OR (s.rank = %s AND s.rowid > %s))"
+        params += [rank, rank, last_id]
+    sql += " ORDER BY s.rank, s.rowid LIMIT %s"
+    params.append(page_size + 1)
+    with connections[router.db_for_read(Catalog)].cursor() as db:
+        db.execute(sql, params)
+        rows = db.fetchall()
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if has_more:
+        next_cursor = signing.dumps(
+            [rows[-1][-1], rows[-1][0]], salt=SEARCH_CURSOR_SALT
         )
-    last_token = None if not photos else photos[len(photos) - 1].id
     return {
-        "count": len(photos),
-        "last_token": last_token,
-        "results": [
-            {
-                "id": p.id,
-                "title": p.title,
-                "location": p.location,
-                "year": p.year,
-                "path": p.path,
-            }
-            for p in photos
-        ],
+        "count": len(rows),
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "results": [dict(zip(CATALOG_FIELDS, row)) for row in rows],
     }
+
+
+def export_catalog_chunks(
+    since_id: Optional[int], chunk_size: int
+) -> Iterator[List[tuple]]:
+    photos = Catalog.objects.order_by("id")
+    if since_id is not None:
+        photos = photos.filter(id__gt=since_id)
+    return exports.keyset_chunks(
+        photos,
+        CATALOG_FIELDS,
+        lambda row: photos.filter(id__gt=row[0]),
+        chunk_size,
+    )
+
+
+def rebuild_search_index(optimize: bool = False) -> None:
+    commands = ["rebuild", "optimize"] if optimize else ["rebuild"]
+    with connection.cursor() as db:
+        for command in commands:
+            db.execute(
+                f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES (%s)",
+                [command],
+            )
+
+
+def facet_bucket(
+    location: Optional[str], year: Optional[int]
+) -> Tuple[Optional[str], Optional[int]]:
+    return location, None if year is None else year // 10 * 10
+
+
+def adjust_facet(location: Optional[str], decade: Optional[int], delta: int):
+    updated = CatalogFacet.objects.filter(
+        location=location, decade=decade
+    ).update(count=F("count") + delta)
+    if not updated:
+        CatalogFacet.objects.create(
+            location=location, decade=decade, count=delta
+        )
+
+
+def count_facet_buckets(photos):
+    decade = ExpressionWrapper(
+        F("year") / 10 * 10, output_field=IntegerField()
+    )
+    return (
+        photos.annotate(decade=decade)
+        .values("location", "decade")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+
+
+def rebuild_facets() -> int:
+    with transaction.atomic():
+        buckets = [
+            CatalogFacet(**bucket)
+            for bucket in count_facet_buckets(Catalog.objects.all())
+        ]
+        CatalogFacet.objects.all().delete()
+        CatalogFacet.objects.bulk_create(buckets)
+    return len(buckets)
+
+
+def _facets_from_rollup(filters: Dict[str, Any]):
+    buckets = CatalogFacet.objects.filter(count__gt=0)
+    if "location" in filters:
+        buckets = buckets.filter(location=filters["location"])
+    if "year_min" in filters:
+        buckets = buckets.filter(decade__gte=filters["year_min"])
+    if "year_max" in filters:
+        buckets = buckets.filter(decade__lte=filters["year_max"])
+    return buckets.values("location", "decade", "count")
+
+
+def _is_rollup_query(filters: Dict[str, Any]) -> bool:
+    # The rollup holds (location, decade) buckets, so it can only answer
+    # year bounds that fall on whole decades.
+    if not set(filters) <= {"location", "year_min", "year_max"}:
+        return False
+    year_min = filters.get("year_min", 0)
+    year_max = filters.get("year_max", 9)
+    return year_min % 10 == 0 and year_max % 10 == 9
+
+
+def query_facets(filters=None) -> Dict[str, Any]:
+    filters = filters or {}
+    if _is_rollup_query(filters):
+        buckets = _facets_from_rollup(filters)
+    else:
+        photos = filter_catalog(Catalog.objects.all(), filters)
+        buckets = count_facet_buckets(photos)
+    locations: Counter = Counter()
+    decades: Counter = Counter()
+    for bucket in buckets:
+        locations[bucket["location"]] += bucket["count"]
+        decades[bucket["decade"]] += bucket["count"]
+    return {
+        "location": _facet_values(locations),
+        "decade": _facet_values(decades),
+    }
+
+
+def _facet_values(counts: Counter):
+    return [
+        {"value": value, "count": count}
+        for value, count in sorted(
+            counts.items(), key=lambda item: (item[0] is None, item[0])
+        )
+    ]
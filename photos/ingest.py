@@ -0,0 +1,215 @@
+import csv
+import itertools
+import json
+import os
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from django.db import transaction
+
+from . import data
+from .models import Catalog
+
+FORMATS = ("csv", "jsonl")
+UPDATE_FIELDS = ["title", "location", "year"]
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_TRANSACTION_BATCHES = 10
+
+
+class ImportStats(NamedTuple):
+    records: int
+    created: int
+    updated: int
+    skipped: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.created + self.updated) / max(self.seconds, 1e-9)
+
+
+def guess_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    return "jsonl" if extension in ("jsonl", "ndjson") else "csv"
+
+
+def read_records(source, fmt: str, fieldnames=None) -> Iterator[Any]:
+    # readline() rather than iteration keeps source.tell() usable, which
+    # is what checkpoints record.
+    lines = iter(source.readline, "")
+    if fmt == "csv":
+        yield from csv.DictReader(lines, fieldnames=fieldnames)
+    else:
+        yield from (line for line in lines if line.strip())
+
+
+def clean_text(record: Dict[str, Any], name: str) -> Optional[str]:
+    value = record.get(name)
+    if value in (None, ""):
+        return None
+    value = str(value).strip()
+    max_length = Catalog._meta.get_field(name).max_length
+    if len(value) > max_length:
+        raise ValueError(f"{name} is longer than {max_length} characters")
+    return value or None
+
+
+def clean_record(record: Any) -> Catalog:
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError("expected an object")
+    path = clean_text(record, "path")
+    if path is None:
+        raise ValueError("path is required")
+    year = record.get("year")
+    if year in (None, ""):
+        year = None
+    else:
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            raise ValueError(f"year {year!r} is not a whole number")
+    return Catalog(
+        title=clean_text(record, "title"),
+        location=clean_text(record, "location"),
+        year=year,
+        path=path,
+    )
+
+
+def clean_records(
+    records: Iterator[Any],
+    counts: Counter,
+    on_error: Callable[[int, str], None],
+) -> Iterator[Catalog]:
+    for record in records:
+        counts["records"] += 1
+        try:
+            yield clean_record(record)
+        except ValueError as error:
+            counts["skipped"] += 1
+            on_error(counts["records"], str(error))
+
+
+def batched(items: Iterator[Any], size: int) -> Iterator[List[Any]]:
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_batch(photos: List[Catalog], upsert: bool) -> Counter:
+    facets: Counter = Counter()
+    existing: Dict[str, List[tuple]] = {}
+    if upsert:
+        # The last row for a path wins, as it would row by row.
+        photos = list({photo.path: photo for photo in photos}.values())
+        rows = Catalog.objects.filter(
+            path__in=[photo.path for photo in photos]
+        ).values_list("path", "id", "location", "year")
+        for path, photo_id, location, year in rows:
+            existing.setdefault(path, []).append((photo_id, location, year))
+    created, updated = [], []
+    for photo in photos:
+        bucket = data.facet_bucket(photo.location, photo.year)
+        for photo_id, location, year in existing.get(photo.path, ()):
+            updated.append(
+                Catalog(
+                    id=photo_id,
+                    title=photo.title,
+                    location=photo.location,
+                    year=photo.year,
+                    path=photo.path,
+                )
+            )
+            facets[data.facet_bucket(location, year)] -= 1
+            facets[bucket] += 1
+        if photo.path not in existing:
+            created.append(photo)
+            facets[bucket] += 1
+    Catalog.objects.bulk_create(created)
+    Catalog.objects.bulk_update(updated, UPDATE_FIELDS)
+    # Bulk writes send no signals, so keep the facet rollup in step here.
+    for (location, decade), delta in facets.items():
+        if delta:
+            data.adjust_facet(location, decade, delta)
+    for photo in updated:
+        data.forget_row(photo.id)
+    return Counter(created=len(created), updated=len(updated))
+
+
+def load_checkpoint(checkpoint: Optional[str], source: str) -> Dict[str, Any]:
+    if not checkpoint or not os.path.exists(checkpoint):
+        return {"source": source, "offset": None, "records": 0}
+    with open(checkpoint) as state:
+        progress = json.load(state)
+    if progress.get("source") != source:
+        raise ValueError(
+            f"Checkpoint {checkpoint} belongs to {progress.get('source')}."
+        )
+    return progress
+
+
+def save_checkpoint(checkpoint: str, progress: Dict[str, Any]) -> None:
+    partial = f"{checkpoint}.partial"
+    with open(partial, "w") as state:
+        json.dump(progress, state)
+    os.replace(partial, checkpoint)
+
+
+def import_catalog(
+    path: str,
+    fmt: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    transaction_batches: int = DEFAULT_TRANSACTION_BATCHES,
+    upsert: bool = False,
+    checkpoint: Optional[str] = None,
+    on_progress: Optional[Callable[[ImportStats], None]] = None,
+    on_error: Optional[Callable[[int, str], None]] = None,
+) -> ImportStats:
+    fmt = fmt or guess_format(path)
+    progress = load_checkpoint(checkpoint, os.path.abspath(path))
+    counts: Counter = Counter(records=progress["records"])
+    start = time.perf_counter()
+
+    def stats() -> ImportStats:
+        return ImportStats(
+            records=counts["records"],
+            created=counts["created"],
+            updated=counts["updated"],
+            skipped=counts["skipped"],
+            seconds=time.perf_counter() - start,
+        )
+
+    with open(path, newline="", encoding="utf-8") as source:
+        fieldnames = None
+        if fmt == "csv":
+            fieldnames = next(csv.reader([source.readline()]), None)
+        if progress["offset"] is not None:
+            source.seek(progress["offset"])
+        photos = clean_records(
+            read_records(source, fmt, fieldnames),
+            counts,
+            on_error or (lambda number, message: None),
+        )
+        # Batches are pulled lazily, so once a chunk is committed the file
+        # position is exactly where the next chunk starts.
+        for chunk in batched(batched(photos, batch_size), transaction_batches):
+            with transaction.atomic():
+                for batch in chunk:
+                    counts.update(write_batch(batch, upsert))
+            data.bump_catalog_version()
+            if checkpoint:
+                progress.update(
+                    offset=source.tell(), records=counts["records"]
+                )
+                save_checkpoint(checkpoint, progress)
+            if on_progress:
+                on_progress(stats())
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return stats()
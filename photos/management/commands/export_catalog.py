@@ -0,0 +1,23 @@
+from photocatalog.exports import ExportCommand
+from photos import data
+
+
+class Command(ExportCommand):
+    help = "Export the catalog as CSV or JSON lines in id order."
+    fields = data.CATALOG_FIELDS
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--since-id",
+            type=int,
+            help="Only export photos with a greater id.",
+        )
+
+    def chunks(self, options):
+        return data.export_catalog_chunks(
+            options["since_id"], options["chunk_size"]
+        )
+
+    def describe_last(self, row):
+        return f"id {row[0]}"
@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from photocatalog import versions
+from photos import ingest
+
+
+class Command(BaseCommand):
+    help = "Bulk load catalog rows from a CSV or JSON lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON lines file to load.")
+        parser.add_argument(
+            "--format",
+            choices=ingest.FORMATS,
+            help="File format, guessed from the extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ingest.DEFAULT_BATCH_SIZE,
+            help="Rows written per bulk insert.",
+        )
+        parser.add_argument(
+            "--transaction-batches",
+            type=int,
+            default=ingest.DEFAULT_TRANSACTION_BATCHES,
+            help="Batches committed per transaction.",
+        )
+        parser.add_argument(
+            "--upsert",
+            action="store_true",
+            help="Update rows whose path is already in the catalog.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File recording progress, resumed from if it exists.",
+        )
+        parser.add_argument(
+            "--allow-local-cache",
+            action="store_true",
+            help="Import even though running servers will not see the new "
+            "catalog version; restart them afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        if not versions.is_shared() and not options["allow_local_cache"]:
+            raise CommandError(
+                "The catalog version is kept in this process only, so running "
+                "servers would keep serving their cached pages. Set "
+                "CATALOG_CACHE_DIR as the servers do, or pass "
+                "--allow-local-cache and restart them."
+            )
+        try:
+            stats = ingest.import_catalog(
+                options["path"],
+                fmt=options["format"],
+                batch_size=options["batch_size"],
+                transaction_batches=options["transaction_batches"],
+                upsert=options["upsert"],
+                checkpoint=options["checkpoint"],
+                on_progress=self.report,
+                on_error=self.report_error,
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {stats.created} and updated {stats.updated} "
+                f"rows, skipped {stats.skipped} "
+                f"({stats.rows_per_second:.0f} rows/s)."
+            )
+        )
+
+    def report(self, stats):
+        self.stdout.write(
+            f"{stats.records} records read, "
+            f"{stats.created + stats.updated} rows written "
+            f"({stats.rows_per_second:.0f} rows/s)"
+        )
+
+    def report_error(self, number, message):
+        self.stderr.write(f"Skipped record {number}: {message}")
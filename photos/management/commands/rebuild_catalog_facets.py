@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from photos import data
+
+
+class Command(BaseCommand):
+    help = "Recount the catalog facet rollup from the catalog table."
+
+    def handle(self, *args, **options):
+        buckets = data.rebuild_facets()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {buckets} catalog facet buckets.")
+        )
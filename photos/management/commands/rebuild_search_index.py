@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from photos import data
+
+
+class Command(BaseCommand):
+    help = "Rebuild the catalog full-text search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--optimize",
+            action="store_true",
+            help="Merge the index into a single b-tree after rebuilding.",
+        )
+
+    def handle(self, *args, **options):
+        data.rebuild_search_index(optimize=options["optimize"])
+        self.stdout.write(self.style.SUCCESS("Rebuilt catalog search index."))
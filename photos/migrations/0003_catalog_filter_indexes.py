@@ -0,0 +1,29 @@
+# Generated by Django 3.0.3 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("photos", "0002_import_sample_data"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="catalog",
+            index=models.Index(
+                fields=["location", "id"], name="catalog_location_id"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="catalog",
+            index=models.Index(fields=["year", "id"], name="catalog_year_id"),
+        ),
+        migrations.AddIndex(
+            model_name="catalog",
+            index=models.Index(
+                fields=["title", "id"], name="catalog_title_id"
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations
+
+SEARCH_TABLE = "photos_catalog_search"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("photos", "0003_catalog_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                f"""
+                CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+                    title,
+                    location,
+                    content='photos_catalog',
+                    content_rowid='id'
+                )
+                """,
+                f"""
+                CREATE TRIGGER {SEARCH_TABLE}_insert
+                AFTER INSERT ON photos_catalog BEGIN
+                    INSERT INTO {SEARCH_TABLE}(rowid, title, location)
+                    VALUES (new.id, new.title, new.location);
+                END
+                """,
+                f"""
+                CREATE TRIGGER {SEARCH_TABLE}_delete
+                AFTER DELETE ON photos_catalog BEGIN
+                    INSERT INTO {SEARCH_TABLE}(
+                        {SEARCH_TABLE}, rowid, title, location
+                    )
+                    VALUES ('delete', old.id, old.title, old.location);
+                END
+                """,
+                f"""
+                CREATE TRIGGER {SEARCH_TABLE}_update
+                AFTER UPDATE OF title, location ON photos_catalog BEGIN
+                    INSERT INTO {SEARCH_TABLE}(
+                        {SEARCH_TABLE}, rowid, title, location
+                    )
+                    VALUES ('delete', old.id, old.title, old.location);
+                    INSERT INTO {SEARCH_TABLE}(rowid, title, location)
+                    VALUES (new.id, new.title, new.location);
+                END
+                """,
+                f"""
+                INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')
+                """,
+            ],
+            reverse_sql=[
+                f"DROP TRIGGER {SEARCH_TABLE}_update",
+                f"DROP TRIGGER {SEARCH_TABLE}_delete",
+                f"DROP TRIGGER {SEARCH_TABLE}_insert",
+                f"DROP TABLE {SEARCH_TABLE}",
+            ],
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.0.3 on 2026-10-18 16:42
+
+from django.db import migrations, models
+from django.db.models import Count, ExpressionWrapper, F, IntegerField
+
+
+def populate_facets(apps, schema_editor):
+    Catalog = apps.get_model("photos", "Catalog")
+    CatalogFacet = apps.get_model("photos", "CatalogFacet")
+    decade = ExpressionWrapper(
+        F("year") / 10 * 10, output_field=IntegerField()
+    )
+    buckets = (
+        Catalog.objects.annotate(decade=decade)
+        .values("location", "decade")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    CatalogFacet.objects.bulk_create(
+        CatalogFacet(**bucket) for bucket in buckets
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("photos", "0004_catalog_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogFacet",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "location",
+                    models.CharField(
+                        max_length=50, null=True, verbose_name="location taken"
+                    ),
+                ),
+                (
+                    "decade",
+                    models.IntegerField(
+                        null=True, verbose_name="decade taken"
+                    ),
+                ),
+                (
+                    "count",
+                    models.IntegerField(
+                        default=0, verbose_name="number of photos"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="catalogfacet",
+            constraint=models.UniqueConstraint(
+                fields=("location", "decade"), name="catalog_facet_bucket"
+            ),
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
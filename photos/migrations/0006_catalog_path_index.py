@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("photos", "0005_catalog_facets"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="catalog",
+            index=models.Index(fields=["path"], name="catalog_path"),
+        ),
+    ]
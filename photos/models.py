@@ -19,3 +19,29 @@ class Catalog(models.Model):
         null=False,
         default=IMAGE_NOT_AVAILABLE_PATH,
     )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["location", "id"], name="catalog_location_id"
+            ),
+            models.Index(fields=["year", "id"], name="catalog_year_id"),
+            models.Index(fields=["title", "id"], name="catalog_title_id"),
+            models.Index(fields=["path"], name="catalog_path"),
+        ]
+
+
+class CatalogFacet(models.Model):
+    def __str__(self) -> str:
+        return f"{self.location}, {self.decade}s: {self.count}"
+
+    location = models.CharField("location taken", max_length=50, null=True)
+    decade = models.IntegerField("decade taken", null=True)
+    count = models.IntegerField("number of photos", default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["location", "decade"], name="catalog_facet_bucket"
+            ),
+        ]
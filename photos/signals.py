@@ -0,0 +1,46 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import data
+from .models import Catalog
+
+
+@receiver(post_save, sender=Catalog)
+@receiver(post_delete, sender=Catalog)
+def invalidate_catalog_pages(sender, instance, **kwargs):
+    data.bump_catalog_version()
+    data.forget_row(instance.pk)
+
+
+@receiver(pre_save, sender=Catalog)
+def remember_facet_bucket(sender, instance, raw=False, using=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    before = (
+        Catalog.objects.using(using)
+        .filter(pk=instance.pk)
+        .values_list("location", "year")
+        .first()
+    )
+    instance._facet_bucket = data.facet_bucket(*before) if before else None
+
+
+@receiver(post_save, sender=Catalog)
+def update_facet_counts(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, "_facet_bucket", None)
+    after = data.facet_bucket(instance.location, instance.year)
+    instance._facet_bucket = None
+    if before == after:
+        return
+    if before:
+        data.adjust_facet(*before, delta=-1)
+    data.adjust_facet(*after, delta=1)
+
+
+@receiver(post_delete, sender=Catalog)
+def remove_from_facet_counts(sender, instance, **kwargs):
+    data.adjust_facet(
+        *data.facet_bucket(instance.location, instance.year), delta=-1
+    )
@@ -1,12 +1,24 @@
+import csv
+import gzip
+import io
 import json
+import os
+import urllib.parse
+from collections import OrderedDict
 
 import pytest
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 
-from photocatalog import CURRENT_VERSION
+from photocatalog import CURRENT_VERSION, versions
 
+from . import data, ingest
 from .data import DEFAULT_PAGE_SIZE
-from .models import Catalog
+from .models import Catalog, CatalogFacet
 
 
 @pytest.fixture
@@ -36,7 +48,13 @@ def test_list_catalog_returns_200_status_code():
 @pytest.mark.usefixtures("clear_catalog")
 def test_list_catalog_empty_catalog_returns_empty_result_set():
     client = Client()
-    expected = {"count": 0, "last_token": None, "results": []}
+    expected = {
+        "count": 0,
+        "last_token": None,
+        "has_more": False,
+        "next_cursor": None,
+        "results": [],
+    }
 
     response = client.get(f"/{CURRENT_VERSION}/catalog/")
 
@@ -155,3 +173,1158 @@ def test_list_catalog_pagination_returns_all_results():
         last_token = response["last_token"]
 
     assert expected == len(results)
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_catalog")
+def test_list_catalog_pages_are_full_when_ids_have_gaps():
+    for _ in range(10):
+        item = Catalog()
+        item.save()
+    Catalog.objects.filter(
+        id__in=Catalog.objects.values_list("id", flat=True)[::2]
+    ).delete()
+    first_id = Catalog.objects.order_by("id").first().id
+    client = Client()
+    page_size = 2
+
+    response = client.get(
+        f"/{CURRENT_VERSION}/catalog/?"
+        f"page_size={page_size}&last_token={first_id - 1}"
+    )
+
+    response = json.loads(response.content)
+    assert page_size == len(response["results"]) == response["count"]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_catalog")
+def test_list_catalog_has_more_is_false_on_last_page():
+    for _ in range(4):
+        item = Catalog()
+        item.save()
+    client = Client()
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?page_size=4")
+
+    response = json.loads(response.content)
+    assert response["has_more"] is False
+    assert response["next_cursor"] is None
+
+
+@pytest.mark.django_db
+def test_list_catalog_has_more_is_true_when_rows_remain():
+    client = Client()
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?page_size=5")
+
+    response = json.loads(response.content)
+    assert response["has_more"] is True
+    assert response["next_cursor"]
+
+
+@pytest.mark.django_db
+def test_list_catalog_cursor_pagination_returns_all_results():
+    client = Client()
+    expected = [row.id for row in Catalog.objects.order_by("id")]
+    response = json.loads(
+        client.get(f"/{CURRENT_VERSION}/catalog/?page_size=7").content
+    )
+    results = response["results"]
+    while response["has_more"]:
+        response = json.loads(
+            client.get(
+                f"/{CURRENT_VERSION}/catalog/?"
+                f"page_size=7&cursor={response['next_cursor']}"
+            ).content
+        )
+        results += response["results"]
+
+    assert expected == [item["id"] for item in results]
+
+
+@pytest.mark.django_db
+def test_list_catalog_page_is_a_single_query(django_assert_num_queries):
+    client = Client()
+
+    with django_assert_num_queries(1):
+        client.get(f"/{CURRENT_VERSION}/catalog/?page_size=10&last_token=5")
+
+
+@pytest.mark.django_db
+def test_list_catalog_cursor_is_not_a_plain_id():
+    client = Client()
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?page_size=5")
+
+    response = json.loads(response.content)
+    assert response["next_cursor"] != str(response["last_token"])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "query",
+    [
+        "cursor=not-a-cursor",
+        "cursor=MjA:tampered",
+        "page_size=zero",
+        "page_size=0",
+        "last_token=-1",
+    ],
+)
+def test_list_catalog_invalid_query_returns_400(query):
+    client = Client()
+    expected = 400
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?{query}")
+
+    assert expected == response.status_code
+
+
+def test_decode_cursor_round_trips():
+    expected = 42
+
+    actual = data.decode_cursor(data.encode_cursor(expected))
+
+    assert expected == actual
+
+
+@pytest.mark.django_db
+def test_list_catalog_no_params_is_capped_at_max_page_size(monkeypatch):
+    monkeypatch.setattr(data, "MAX_PAGE_SIZE", 10)
+    client = Client()
+    expected = 10
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/")
+
+    response = json.loads(response.content)
+    assert expected == len(response["results"]) == response["count"]
+    assert response["has_more"] is True
+
+
+@pytest.mark.django_db
+def test_list_catalog_page_size_is_capped_at_max_page_size(monkeypatch):
+    monkeypatch.setattr(data, "MAX_PAGE_SIZE", 10)
+    client = Client()
+    expected = 10
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?page_size=50")
+
+    response = json.loads(response.content)
+    assert expected == len(response["results"]) == response["count"]
+
+
+@pytest.mark.django_db
+def test_list_catalog_stream_returns_streaming_response():
+    client = Client()
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?stream=true")
+
+    assert response.streaming
+    assert "application/json" == response["Content-Type"]
+
+
+@pytest.mark.django_db
+def test_list_catalog_stream_returns_all_results(monkeypatch):
+    monkeypatch.setattr(data, "MAX_PAGE_SIZE", 10)
+    monkeypatch.setattr(data, "STREAM_CHUNK_SIZE", 7)
+    client = Client()
+    expected = [
+        {
+            "id": row.id,
+            "title": row.title,
+            "location": row.location,
+            "year": row.year,
+            "path": row.path,
+        }
+        for row in Catalog.objects.order_by("id")
+    ]
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?stream=true")
+
+    response = json.loads(b"".join(response.streaming_content))
+    assert expected == response["results"]
+    assert len(expected) == response["count"]
+    assert expected[-1]["id"] == response["last_token"]
+    assert response["has_more"] is False
+
+
+@pytest.mark.django_db
+def test_list_catalog_stream_starts_after_last_token():
+    client = Client()
+    last_token = 90
+
+    response = client.get(
+        f"/{CURRENT_VERSION}/catalog/?stream=1&last_token={last_token}"
+    )
+
+    response = json.loads(b"".join(response.streaming_content))
+    assert all(item["id"] > last_token for item in response["results"])
+    assert (
+        Catalog.objects.filter(id__gt=last_token).count() == response["count"]
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_catalog")
+def test_list_catalog_stream_empty_catalog_returns_empty_result_set():
+    client = Client()
+    expected = {
+        "count": 0,
+        "last_token": None,
+        "has_more": False,
+        "next_cursor": None,
+        "results": [],
+    }
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?stream=true")
+
+    assert expected == json.loads(b"".join(response.streaming_content))
+
+
+def test_list_catalog_stream_invalid_cursor_returns_400():
+    client = Client()
+    expected = 400
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?stream=1&cursor=bad")
+
+    assert expected == response.status_code
+
+
+@pytest.mark.django_db
+def test_list_catalog_repeated_page_is_served_from_cache(
+    django_assert_num_queries,
+):
+    client = Client()
+    url = f"/{CURRENT_VERSION}/catalog/?page_size=10&last_token=5"
+    expected = json.loads(client.get(url).content)
+
+    with django_assert_num_queries(0):
+        response = client.get(url)
+
+    assert expected == json.loads(response.content)
+
+
+@pytest.mark.django_db
+def test_render_catalog_page_counts_hits_and_misses():
+    hits = data.page_cache_stats["hits"]
+    misses = data.page_cache_stats["misses"]
+
+    data.render_catalog_page(10, None)
+    data.render_catalog_page(10, None)
+
+    assert hits + 1 == data.page_cache_stats["hits"]
+    assert misses + 1 == data.page_cache_stats["misses"]
+
+
+@pytest.mark.django_db
+def test_render_catalog_page_last_token_and_cursor_share_cache_entry(
+    django_assert_num_queries,
+):
+    data.render_catalog_page(10, 20)
+
+    with django_assert_num_queries(0):
+        data.render_catalog_page(10, None, data.encode_cursor(20))
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_catalog")
+def test_list_catalog_saved_row_invalidates_cached_pages():
+    client = Client()
+    url = f"/{CURRENT_VERSION}/catalog/"
+    client.get(url)
+    item = Catalog(title="New photo")
+    item.save()
+
+    response = client.get(url)
+
+    response = json.loads(response.content)
+    assert ["New photo"] == [row["title"] for row in response["results"]]
+
+
+@pytest.mark.django_db
+def test_list_catalog_deleted_row_invalidates_cached_pages():
+    client = Client()
+    url = f"/{CURRENT_VERSION}/catalog/?page_size=5"
+    first = json.loads(client.get(url).content)["results"][0]
+    Catalog.objects.get(id=first["id"]).delete()
+
+    response = client.get(url)
+
+    response = json.loads(response.content)
+    assert first["id"] not in [row["id"] for row in response["results"]]
+
+
+@pytest.mark.django_db
+def test_catalog_version_changes_on_save():
+    version = data.catalog_version()
+
+    Catalog().save()
+
+    assert version != data.catalog_version()
+
+
+def test_catalog_version_is_reseeded_after_eviction():
+    version = data.catalog_version()
+    caches[versions.VERSIONS_CACHE].delete(data.CATALOG_VERSION_KEY)
+
+    assert version != data.catalog_version()
+
+
+@pytest.mark.django_db
+def test_list_catalog_sends_etag():
+    client = Client()
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/")
+
+    assert response["ETag"].startswith('"catalog-')
+
+
+@pytest.mark.django_db
+def test_list_catalog_matching_etag_returns_304_without_queries(
+    django_assert_num_queries,
+):
+    client = Client()
+    url = f"/{CURRENT_VERSION}/catalog/?page_size=10"
+    tag = client.get(url)["ETag"]
+    expected = 304
+
+    with django_assert_num_queries(0):
+        response = client.get(url, HTTP_IF_NONE_MATCH=tag)
+
+    assert expected == response.status_code
+    assert b"" == response.content
+
+
+@pytest.mark.django_db
+def test_list_catalog_etag_differs_per_query():
+    client = Client()
+
+    first = client.get(f"/{CURRENT_VERSION}/catalog/?page_size=10")
+    second = client.get(f"/{CURRENT_VERSION}/catalog/?page_size=11")
+
+    assert first["ETag"] != second["ETag"]
+
+
+@pytest.mark.django_db
+def test_list_catalog_etag_changes_when_catalog_changes():
+    client = Client()
+    url = f"/{CURRENT_VERSION}/catalog/"
+    tag = client.get(url)["ETag"]
+    Catalog().save()
+    expected = 200
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=tag)
+
+    assert expected == response.status_code
+    assert tag != response["ETag"]
+
+
+@pytest.mark.django_db
+def test_list_catalog_pages_are_rebuilt_after_replica_refresh(
+    settings, tmp_path
+):
+    settings.CATALOG_REPLICA = str(tmp_path / "replica.sqlite3")
+    (tmp_path / "replica.sqlite3").write_bytes(b"old")
+    item = Catalog.objects.order_by("id").first()
+    client = Client()
+    url = f"/{CURRENT_VERSION}/catalog/?page_size=1"
+    tag = client.get(url)["ETag"]
+    # The refreshed copy carries an edit the version stamp has not seen.
+    Catalog.objects.filter(id=item.id).update(title="Refreshed")
+    (tmp_path / "replica.partial").write_bytes(b"new")
+    os.replace(tmp_path / "replica.partial", tmp_path / "replica.sqlite3")
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=tag)
+
+    assert 200 == response.status_code
+    assert tag != response["ETag"]
+    assert "Refreshed" == json.loads(response.content)["results"][0]["title"]
+
+
+@pytest.mark.django_db
+def test_list_catalog_filters_by_location():
+    client = Client()
+    expected = list(
+        Catalog.objects.filter(location="Paris")
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?location=Paris")
+
+    response = json.loads(response.content)
+    assert expected == [item["id"] for item in response["results"]]
+
+
+@pytest.mark.django_db
+def test_list_catalog_filters_by_year_range():
+    client = Client()
+    expected = list(
+        Catalog.objects.filter(year__gte=1950, year__lte=1980)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+    response = client.get(
+        f"/{CURRENT_VERSION}/catalog/?year_min=1950&year_max=1980"
+    )
+
+    response = json.loads(response.content)
+    assert expected == [item["id"] for item in response["results"]]
+
+
+@pytest.mark.django_db
+def test_list_catalog_filters_by_title_prefix():
+    client = Client()
+    expected = ["Photo1"] + [f"Photo1{i}" for i in range(10)]
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?title_prefix=Photo1")
+
+    response = json.loads(response.content)
+    assert expected == [item["title"] for item in response["results"]]
+
+
+@pytest.mark.parametrize(
+    "prefix, upper",
+    [
+        ("ab", "ac"),
+        ("a\ud7ff", "a\ue000"),
+        ("a\U0010ffff", "b"),
+        ("\U0010ffff\U0010ffff", None),
+    ],
+)
+def test_prefix_upper_bound_skips_surrogates_and_carries(prefix, upper):
+    assert upper == data.prefix_upper_bound(prefix)
+
+
+@pytest.mark.parametrize("prefix", ["%ED%9F%BF", "%F4%8F%BF%BF"])
+@pytest.mark.parametrize("path", ["", "facets"])
+@pytest.mark.django_db
+def test_list_catalog_accepts_prefixes_at_the_end_of_unicode(prefix, path):
+    client = Client()
+    title = urllib.parse.unquote(prefix) + "x"
+    Catalog.objects.create(title=title)
+
+    response = client.get(
+        f"/{CURRENT_VERSION}/catalog/{path}?title_prefix={prefix}"
+    )
+
+    assert 200 == response.status_code
+    if not path:
+        results = json.loads(response.content)["results"]
+        assert [title] == [item["title"] for item in results]
+
+
+@pytest.mark.django_db
+def test_list_catalog_filters_compose_with_cursor_pagination():
+    client = Client()
+    query = "location=London&year_min=1960&page_size=3"
+    expected = list(
+        Catalog.objects.filter(location="London", year__gte=1960)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    response = json.loads(
+        client.get(f"/{CURRENT_VERSION}/catalog/?{query}").content
+    )
+    results = response["results"]
+    while response["has_more"]:
+        response = json.loads(
+            client.get(
+                f"/{CURRENT_VERSION}/catalog/?"
+                f"{query}&cursor={response['next_cursor']}"
+            ).content
+        )
+        results += response["results"]
+
+    assert expected == [item["id"] for item in results]
+
+
+@pytest.mark.django_db
+def test_list_catalog_stream_applies_filters():
+    client = Client()
+    expected = Catalog.objects.filter(location="New York").count()
+
+    response = client.get(
+        f"/{CURRENT_VERSION}/catalog/?stream=true&location=New+York"
+    )
+
+    response = json.loads(b"".join(response.streaming_content))
+    assert expected == response["count"]
+    assert {"New York"} == {item["location"] for item in response["results"]}
+
+
+@pytest.mark.django_db
+def test_render_catalog_page_caches_pages_per_filter():
+    paris = json.loads(
+        data.render_catalog_page(10, None, filters={"location": "Paris"})
+    )
+    london = json.loads(
+        data.render_catalog_page(10, None, filters={"location": "London"})
+    )
+
+    assert {"Paris"} == {item["location"] for item in paris["results"]}
+    assert {"London"} == {item["location"] for item in london["results"]}
+
+
+@pytest.mark.parametrize(
+    "filters,index",
+    [
+        ({"location": "Paris"}, "catalog_location_id"),
+        ({"title_prefix": "Photo1"}, "catalog_title_id"),
+    ],
+)
+@pytest.mark.django_db
+def test_filter_catalog_uses_index(filters, index):
+    photos = data.filter_catalog(Catalog.objects.order_by("id"), filters)
+
+    assert index in photos.explain()
+
+
+def test_list_catalog_invalid_year_returns_400():
+    client = Client()
+    expected = 400
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?year_min=old")
+
+    assert expected == response.status_code
+
+
+@pytest.fixture
+def searchable_catalog(clear_catalog):
+    rows = [
+        ("Harbour at dawn", "Sydney"),
+        ("Dawn over the harbour bridge", "Sydney"),
+        ("Bridge at night", "London"),
+        ("Street market", "Paris"),
+    ]
+    return [
+        Catalog.objects.create(title=title, location=location)
+        for title, location in rows
+    ]
+
+
+@pytest.mark.django_db
+def test_search_catalog_matches_title_and_location(searchable_catalog):
+    client = Client()
+    expected = {row.id for row in searchable_catalog[:2]}
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/search?q=sydney")
+
+    response = json.loads(response.content)
+    assert expected == {item["id"] for item in response["results"]}
+
+
+@pytest.mark.django_db
+def test_search_catalog_requires_every_term(searchable_catalog):
+    client = Client()
+    expected = [searchable_catalog[1].id]
+
+    response = client.get(
+        f"/{CURRENT_VERSION}/catalog/search?q=harbour+bridge"
+    )
+
+    response = json.loads(response.content)
+    assert expected == [item["id"] for item in response["results"]]
+
+
+@pytest.mark.django_db
+def test_search_catalog_ranks_best_match_first(searchable_catalog):
+    Catalog.objects.create(title="Sydney", location="Sydney")
+    client = Client()
+    expected = "Sydney"
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/search?q=sydney")
+
+    response = json.loads(response.content)
+    assert expected == response["results"][0]["title"]
+
+
+@pytest.mark.django_db
+def test_search_catalog_cursor_pagination_returns_all_matches():
+    client = Client()
+    expected = sorted(
+        Catalog.objects.filter(location="Paris").values_list("id", flat=True)
+    )
+    url = f"/{CURRENT_VERSION}/catalog/search?q=paris&page_size=4"
+    response = json.loads(client.get(url).content)
+    results = response["results"]
+    while response["has_more"]:
+        response = json.loads(
+            client.get(f"{url}&cursor={response['next_cursor']}").content
+        )
+        results += response["results"]
+
+    assert expected == sorted(item["id"] for item in results)
+
+
+@pytest.mark.django_db
+def test_search_catalog_follows_updates_and_deletes(searchable_catalog):
+    client = Client()
+    renamed, deleted = searchable_catalog[2], searchable_catalog[3]
+    renamed.title = "Lantern festival"
+    renamed.save()
+    deleted.delete()
+
+    bridge = client.get(f"/{CURRENT_VERSION}/catalog/search?q=night")
+    lantern = client.get(f"/{CURRENT_VERSION}/catalog/search?q=lantern")
+    market = client.get(f"/{CURRENT_VERSION}/catalog/search?q=market")
+
+    assert [] == json.loads(bridge.content)["results"]
+    assert [renamed.id] == [
+        item["id"] for item in json.loads(lantern.content)["results"]
+    ]
+    assert [] == json.loads(market.content)["results"]
+
+
+@pytest.mark.django_db
+def test_search_catalog_treats_query_syntax_as_text(searchable_catalog):
+    client = Client()
+    expected = 200
+
+    response = client.get(
+        f"/{CURRENT_VERSION}/catalog/search?q=%22dawn+OR+NEAR(*"
+    )
+
+    assert expected == response.status_code
+
+
+@pytest.mark.parametrize("query", ["", "q=", "q=+", "q=dawn&cursor=bad"])
+def test_search_catalog_invalid_query_returns_400(query):
+    client = Client()
+    expected = 400
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/search?{query}")
+
+    assert expected == response.status_code
+
+
+@pytest.mark.django_db
+def test_rebuild_search_index_restores_missing_rows(searchable_catalog):
+    client = Client()
+    with connection.cursor() as db:
+        db.execute(
+            f"INSERT INTO {data.SEARCH_TABLE}({data.SEARCH_TABLE}) "
+            "VALUES ('delete-all')"
+        )
+    expected = {row.id for row in searchable_catalog[:2]}
+
+    call_command("rebuild_search_index", "--optimize", stdout=io.StringIO())
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/search?q=sydney")
+    response = json.loads(response.content)
+    assert expected == {item["id"] for item in response["results"]}
+
+
+def live_facets(**filters):
+    photos = data.filter_catalog(Catalog.objects.all(), filters)
+    locations = {}
+    decades = {}
+    for location, year in photos.values_list("location", "year"):
+        _, decade = data.facet_bucket(location, year)
+        locations[location] = locations.get(location, 0) + 1
+        decades[decade] = decades.get(decade, 0) + 1
+    return {
+        "location": sorted(locations.items()),
+        "decade": sorted(decades.items()),
+    }
+
+
+def as_pairs(facets):
+    return {
+        name: [(item["value"], item["count"]) for item in values]
+        for name, values in facets.items()
+    }
+
+
+@pytest.mark.django_db
+def test_list_facets_returns_counts_by_location_and_decade():
+    client = Client()
+    expected = live_facets()
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/facets")
+
+    assert expected == as_pairs(json.loads(response.content))
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"location": "Paris"},
+        {"year_min": 1950, "year_max": 1979},
+        {"location": "London", "year_min": 1960},
+        {"year_min": 1955},
+        {"title_prefix": "Photo1"},
+    ],
+)
+@pytest.mark.django_db
+def test_query_facets_applies_listing_filters(filters):
+    expected = live_facets(**filters)
+
+    actual = data.query_facets(filters)
+
+    assert expected == as_pairs(actual)
+
+
+@pytest.mark.django_db
+def test_query_facets_reads_rollup_in_one_query(django_assert_num_queries):
+    with django_assert_num_queries(1) as captured:
+        data.query_facets({"location": "Paris", "year_min": 1950})
+
+    assert "photos_catalogfacet" in captured.captured_queries[0]["sql"]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_catalog")
+def test_facets_follow_catalog_saves_and_deletes():
+    kept = Catalog.objects.create(location="Paris", year=1991)
+    moved = Catalog.objects.create(location="Paris", year=1985)
+    removed = Catalog.objects.create(location="Oslo", year=2001)
+    moved.location = "Rome"
+    moved.year = 1979
+    moved.save()
+    kept.title = "Unchanged bucket"
+    kept.save()
+    removed.delete()
+    expected = {
+        "location": [("Paris", 1), ("Rome", 1)],
+        "decade": [(1970, 1), (1990, 1)],
+    }
+
+    actual = data.query_facets()
+
+    assert expected == as_pairs(actual)
+
+
+@pytest.mark.django_db
+def test_rebuild_catalog_facets_command_recounts_rollup():
+    expected = data.query_facets()
+    CatalogFacet.objects.update(count=0)
+
+    call_command("rebuild_catalog_facets", stdout=io.StringIO())
+
+    assert expected == data.query_facets()
+
+
+def test_list_facets_invalid_filter_returns_400():
+    client = Client()
+    expected = 400
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/facets?year_max=new")
+
+    assert expected == response.status_code
+
+
+@pytest.mark.django_db
+def test_render_catalog_page_matches_query_catalog():
+    expected = data.query_catalog(10, 20, filters={"location": "Paris"})
+
+    actual = data.render_catalog_page(10, 20, filters={"location": "Paris"})
+
+    assert expected == json.loads(actual)
+
+
+@pytest.mark.django_db
+def test_encode_row_reuses_fragment_for_unchanged_row():
+    row = Catalog.objects.values_list(*data.CATALOG_FIELDS).first()
+    expected = data.encode_row(row)
+
+    actual = data.encode_row(tuple(row))
+
+    assert expected is actual
+
+
+@pytest.mark.django_db
+def test_encode_row_reencodes_row_changed_without_signals():
+    item = Catalog.objects.order_by("id").first()
+    client = Client()
+    url = f"/{CURRENT_VERSION}/catalog/?page_size=1"
+    client.get(url)
+    Catalog.objects.filter(id=item.id).update(title="Renamed")
+    data.bump_catalog_version()
+
+    response = client.get(url)
+
+    assert "Renamed" == json.loads(response.content)["results"][0]["title"]
+
+
+@pytest.mark.django_db
+def test_saving_a_row_drops_its_fragment():
+    item = Catalog.objects.order_by("id").first()
+    data.encode_row(
+        Catalog.objects.values_list(*data.CATALOG_FIELDS).get(id=item.id)
+    )
+
+    item.save()
+
+    assert item.id not in data.row_fragments
+
+
+@pytest.mark.django_db
+def test_row_fragments_are_bounded(monkeypatch):
+    monkeypatch.setattr(data, "MAX_ROW_FRAGMENTS", 5)
+    monkeypatch.setattr(data, "row_fragments", OrderedDict())
+
+    data.render_catalog_page(20, None)
+
+    assert 5 == len(data.row_fragments)
+
+
+@pytest.mark.django_db
+def test_row_fragments_evict_least_recently_used(monkeypatch):
+    monkeypatch.setattr(data, "MAX_ROW_FRAGMENTS", 3)
+    monkeypatch.setattr(data, "row_fragments", OrderedDict())
+    rows = list(
+        Catalog.objects.order_by("id").values_list(*data.CATALOG_FIELDS)[:4]
+    )
+    for row in rows[:3]:
+        data.encode_row(row)
+
+    data.encode_row(rows[0])
+    data.encode_row(rows[3])
+
+    assert [rows[0][0], rows[2][0], rows[3][0]] == sorted(data.row_fragments)
+
+
+@pytest.mark.django_db
+def test_streamed_rows_are_not_cached(monkeypatch):
+    monkeypatch.setattr(data, "row_fragments", OrderedDict())
+    client = Client()
+
+    response = client.get(f"/{CURRENT_VERSION}/catalog/?stream=true")
+
+    assert b"".join(response.streaming_content)
+    assert not data.row_fragments
+
+
+def write_csv(path, rows):
+    lines = ["title,location,year,path"] + [",".join(row) for row in rows]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def archive_rows(count, start=0):
+    return [
+        (f"Archive{i}", "Sydney", str(1900 + i), f"archive/{i}.png")
+        for i in range(start, start + count)
+    ]
+
+
+@pytest.mark.django_db
+def test_import_catalog_loads_csv_rows(tmp_path):
+    source = write_csv(tmp_path / "catalog.csv", archive_rows(25))
+    version = data.catalog_version()
+
+    stats = ingest.import_catalog(source, batch_size=10)
+
+    assert (25, 25, 0, 0) == (
+        stats.records,
+        stats.created,
+        stats.updated,
+        stats.skipped,
+    )
+    assert 25 == Catalog.objects.filter(path__startswith="archive/").count()
+    assert version != data.catalog_version()
+    assert live_facets() == as_pairs(data.query_facets())
+    results = data.search_catalog("archive7", None)["results"]
+    assert ["Archive7"] == [photo["title"] for photo in results]
+
+
+@pytest.mark.django_db
+def test_import_catalog_skips_invalid_jsonl_records(tmp_path):
+    source = tmp_path / "catalog.jsonl"
+    source.write_text(
+        "\n".join(
+            [
+                json.dumps({"title": "Good", "year": 1990, "path": "a.png"}),
+                json.dumps({"title": "No path"}),
+                "{not json",
+                json.dumps({"year": "old", "path": "b.png"}),
+                json.dumps({"title": "x" * 51, "path": "c.png"}),
+                json.dumps({"location": "Paris", "path": "d.png"}),
+            ]
+        )
+    )
+    errors = []
+
+    stats = ingest.import_catalog(
+        str(source), on_error=lambda number, message: errors.append(number)
+    )
+
+    assert (6, 2, 4) == (stats.records, stats.created, stats.skipped)
+    assert [2, 3, 4, 5] == errors
+
+
+@pytest.mark.django_db
+def test_import_catalog_upsert_updates_rows_by_path(tmp_path):
+    ingest.import_catalog(write_csv(tmp_path / "a.csv", archive_rows(5)))
+    changed = [
+        (title, "Paris", "1955", path)
+        for title, _, _, path in archive_rows(3, start=3)
+    ]
+
+    stats = ingest.import_catalog(
+        write_csv(tmp_path / "b.csv", changed), upsert=True
+    )
+
+    assert (1, 2) == (stats.created, stats.updated)
+    photos = Catalog.objects.filter(path__startswith="archive/")
+    assert 6 == photos.count()
+    assert 3 == photos.filter(location="Paris", year=1955).count()
+    assert live_facets() == as_pairs(data.query_facets())
+
+
+@pytest.mark.django_db
+def test_import_catalog_without_upsert_appends_rows(tmp_path):
+    source = write_csv(tmp_path / "a.csv", archive_rows(5))
+    ingest.import_catalog(source)
+
+    ingest.import_catalog(source)
+
+    assert 10 == Catalog.objects.filter(path__startswith="archive/").count()
+
+
+@pytest.mark.django_db
+def test_import_catalog_resumes_from_checkpoint(tmp_path, monkeypatch):
+    source = write_csv(tmp_path / "catalog.csv", archive_rows(30))
+    checkpoint = str(tmp_path / "catalog.checkpoint")
+    write_batch = ingest.write_batch
+    calls = []
+
+    def fail_on_third_chunk(photos, upsert):
+        calls.append(1)
+        if len(calls) == 5:
+            raise RuntimeError("interrupted")
+        return write_batch(photos, upsert)
+
+    monkeypatch.setattr(ingest, "write_batch", fail_on_third_chunk)
+    with pytest.raises(RuntimeError):
+        ingest.import_catalog(
+            source, batch_size=5, transaction_batches=2, checkpoint=checkpoint
+        )
+    assert 20 == Catalog.objects.filter(path__startswith="archive/").count()
+    monkeypatch.setattr(ingest, "write_batch", write_batch)
+
+    stats = ingest.import_catalog(
+        source, batch_size=5, transaction_batches=2, checkpoint=checkpoint
+    )
+
+    assert (30, 10) == (stats.records, stats.created)
+    titles = Catalog.objects.filter(path__startswith="archive/").values_list(
+        "title", flat=True
+    )
+    assert sorted(title for title, *_ in archive_rows(30)) == sorted(titles)
+    assert not os.path.exists(checkpoint)
+
+
+@pytest.mark.django_db
+def test_import_catalog_rejects_checkpoint_for_other_file(tmp_path):
+    checkpoint = tmp_path / "catalog.checkpoint"
+    checkpoint.write_text(json.dumps({"source": "/other.csv", "offset": 10}))
+
+    with pytest.raises(CommandError):
+        call_command(
+            "import_catalog",
+            write_csv(tmp_path / "catalog.csv", archive_rows(1)),
+            "--checkpoint",
+            str(checkpoint),
+            "--allow-local-cache",
+            stdout=io.StringIO(),
+        )
+
+
+@pytest.mark.django_db
+def test_import_catalog_command_reports_rows_per_second(tmp_path):
+    output = io.StringIO()
+
+    call_command(
+        "import_catalog",
+        write_csv(tmp_path / "catalog.csv", archive_rows(12)),
+        "--batch-size",
+        "5",
+        "--transaction-batches",
+        "1",
+        "--allow-local-cache",
+        stdout=output,
+    )
+
+    lines = output.getvalue().splitlines()
+    assert 4 == len(lines)
+    assert all("rows/s" in line for line in lines)
+    assert lines[-1].startswith("Imported 12 and updated 0 rows")
+
+
+@pytest.mark.django_db
+def test_import_catalog_refuses_a_process_local_version(tmp_path):
+    with pytest.raises(CommandError, match="CATALOG_CACHE_DIR"):
+        call_command(
+            "import_catalog",
+            write_csv(tmp_path / "catalog.csv", archive_rows(1)),
+            stdout=io.StringIO(),
+        )
+
+    assert not Catalog.objects.filter(title="Archive0").exists()
+
+
+@pytest.mark.django_db
+def test_import_catalog_bumps_the_shared_version(settings, tmp_path):
+    location = str(tmp_path / "versions")
+    settings.CACHES = dict(
+        settings.CACHES,
+        versions={
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": location,
+            "TIMEOUT": None,
+        },
+    )
+    server = FileBasedCache(location, {"TIMEOUT": None})
+    version = data.catalog_version()
+
+    call_command(
+        "import_catalog",
+        write_csv(tmp_path / "catalog.csv", archive_rows(1)),
+        stdout=io.StringIO(),
+    )
+
+    assert version != server.get(data.CATALOG_VERSION_KEY)
+
+
+def read_jsonl(path):
+    with open(path) as export:
+        return [json.loads(line) for line in export]
+
+
+@pytest.mark.django_db
+def test_export_catalog_writes_every_row_in_chunks(tmp_path):
+    output = tmp_path / "catalog.jsonl"
+    expected = list(
+        Catalog.objects.order_by("id").values(*data.CATALOG_FIELDS)
+    )
+    chunks = -(-len(expected) // 30)
+
+    with CaptureQueriesContext(connection) as queries:
+        call_command(
+            "export_catalog",
+            str(output),
+            "--chunk-size",
+            "30",
+            stdout=io.StringIO(),
+        )
+
+    assert expected == read_jsonl(output)
+    assert chunks == len(queries)
+    assert all("LIMIT 30" in query["sql"] for query in queries)
+
+
+@pytest.mark.django_db
+def test_export_catalog_since_id_exports_newer_rows(tmp_path):
+    output = tmp_path / "catalog.jsonl"
+    last_id = Catalog.objects.order_by("id").values_list("id", flat=True)[50]
+    expected = list(
+        Catalog.objects.filter(id__gt=last_id)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    report = io.StringIO()
+
+    call_command(
+        "export_catalog",
+        str(output),
+        "--since-id",
+        str(last_id),
+        stdout=report,
+    )
+
+    assert expected == [photo["id"] for photo in read_jsonl(output)]
+    assert (
+        f"Exported {len(expected)} rows up to id {expected[-1]}."
+        in report.getvalue()
+    )
+
+
+@pytest.mark.django_db
+def test_export_catalog_writes_gzipped_csv(tmp_path):
+    output = tmp_path / "catalog.csv.gz"
+    expected = [
+        [str(value) for value in row]
+        for row in Catalog.objects.order_by("id").values_list(
+            *data.CATALOG_FIELDS
+        )
+    ]
+
+    call_command("export_catalog", str(output), stdout=io.StringIO())
+
+    with gzip.open(output, "rt", newline="") as export:
+        rows = list(csv.reader(export))
+    assert list(data.CATALOG_FIELDS) == rows[0]
+    assert expected == rows[1:]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("clear_catalog")
+def test_export_catalog_to_stdout():
+    Catalog.objects.create(title="Only", path="only.png")
+    output = io.StringIO()
+
+    call_command("export_catalog", "-", "--format", "jsonl", stdout=output)
+
+    assert ["Only"] == [
+        json.loads(line)["title"] for line in output.getvalue().splitlines()
+    ]
+
+
+def test_export_catalog_refuses_compressed_stdout():
+    with pytest.raises(CommandError):
+        call_command("export_catalog", "-", "--gzip", stdout=io.StringIO())
+
+
+def test_catalog_page_within_budget(budget, large_catalog):
+    client = Client()
+
+    with budget("catalog-page"):
+        response = client.get(
+            f"/{CURRENT_VERSION}/catalog/?page_size=100&last_token=2500"
+        )
+
+    assert 100 == json.loads(response.content)["count"]
+
+
+def test_cached_catalog_page_within_budget(budget, large_catalog):
+    client = Client()
+    url = f"/{CURRENT_VERSION}/catalog/?page_size=100&last_token=2500"
+    client.get(url)
+
+    with budget("catalog-page-cached"):
+        response = client.get(url)
+
+    assert 100 == json.loads(response.content)["count"]
+
+
+def test_filtered_catalog_page_within_budget(budget, large_catalog):
+    client = Client()
+
+    with budget("catalog-page-filtered"):
+        response = client.get(
+            f"/{CURRENT_VERSION}/catalog/"
+            "?page_size=100&location=Paris&year_min=1950&year_max=1999"
+        )
+
+    assert 100 == json.loads(response.content)["count"]
+
+
+def test_catalog_paging_within_budget(budget, large_catalog):
+    client = Client()
+    url = f"/{CURRENT_VERSION}/catalog/?page_size=100"
+    seen = 0
+
+    with budget("catalog-paging"):
+        while url:
+            page = json.loads(client.get(url).content)
+            seen += page["count"]
+            url = page["next_cursor"] and (
+                f"/{CURRENT_VERSION}/catalog/?page_size=100"
+                f"&cursor={page['next_cursor']}"
+            )
+
+    assert large_catalog == seen
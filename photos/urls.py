@@ -4,4 +4,6 @@ from . import views
 
 urlpatterns = [
     path("", views.list_catalog, name="catalog"),
+    path("search", views.search_catalog, name="search-catalog"),
+    path("facets", views.list_facets, name="catalog-facets"),
 ]
@@ -1,12 +1,90 @@
-from django.http import JsonResponse
-from django.views.decorators.http import require_GET
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseNotAllowed
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import etag, require_GET
+
+from photocatalog import executors
 
 from . import data
 
 
+def catalog_etag(request):
+    return data.catalog_etag(request.GET.urlencode())
+
+
 @require_GET
+@etag(catalog_etag)
 def list_catalog(request):
     page_size = request.GET.get("page_size")
     last_token = request.GET.get("last_token")
-    catalog = data.query_catalog(page_size, last_token)
-    return JsonResponse(status=200, data=catalog)
+    cursor = request.GET.get("cursor")
+    stream = request.GET.get("stream") in ("1", "true")
+    try:
+        filters = data.parse_filters(request.GET)
+        if stream:
+            return StreamingHttpResponse(
+                data.stream_catalog(last_token, cursor, filters),
+                content_type="application/json",
+            )
+        catalog = data.render_catalog_page(
+            page_size, last_token, cursor, filters
+        )
+    except ValidationError as error:
+        return JsonResponse(status=400, data=error.message_dict)
+    return HttpResponse(catalog, status=200, content_type="application/json")
+
+
+async def list_catalog_async(request):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    blocks = data.lookups_block()
+    tag = await executors.run_lookup(blocks, catalog_etag, request)
+    response = get_conditional_response(request, etag=tag)
+    if response is not None:
+        return response
+    try:
+        filters = data.parse_filters(request.GET)
+        after, page_size = data.resolve_page(
+            request.GET.get("page_size"),
+            request.GET.get("last_token"),
+            request.GET.get("cursor"),
+        )
+    except ValidationError as error:
+        return JsonResponse(status=400, data=error.message_dict)
+    key, catalog = await executors.run_lookup(
+        blocks, data.cached_catalog_page, after, page_size, filters
+    )
+    if catalog is None:
+        catalog = await executors.run_in_db_executor(
+            data.build_catalog_page, key, after, page_size, filters
+        )
+    response = HttpResponse(
+        catalog, status=200, content_type="application/json"
+    )
+    response["ETag"] = tag
+    return response
+
+
+@require_GET
+@etag(catalog_etag)
+def search_catalog(request):
+    try:
+        results = data.search_catalog(
+            request.GET.get("q"),
+            request.GET.get("page_size"),
+            request.GET.get("cursor"),
+        )
+    except ValidationError as error:
+        return JsonResponse(status=400, data=error.message_dict)
+    return JsonResponse(status=200, data=results)
+
+
+@require_GET
+@etag(catalog_etag)
+def list_facets(request):
+    try:
+        facets = data.query_facets(data.parse_filters(request.GET))
+    except ValidationError as error:
+        return JsonResponse(status=400, data=error.message_dict)
+    return JsonResponse(status=200, data=facets)